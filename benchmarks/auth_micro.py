@@ -0,0 +1,258 @@
+"""
+认证热点函数的微基准测试
+
+测量 create_access_token、JWT解码、get_password_hash、verify_password、authenticate_user
+在不同bcrypt成本、令牌大小和JWT库下的单次耗时，并与保存的基线对比：
+任何一项比基线慢超过阈值（默认25%）时以非零状态退出，修改认证代码前后运行即可看到每次调用的代价。
+
+每项测试自动确定每轮调用次数（每轮至少 --min-time 秒），重复 --rounds 轮取最快一轮的平均值，
+减少其他进程干扰带来的抖动。基线与机器相关，换机器或升级依赖后请重新保存。
+
+未安装的JWT库（PyJWT、joserfc）会被跳过。
+
+用法:
+    python benchmarks/auth_micro.py                    # 运行并与基线对比
+    python benchmarks/auth_micro.py --check            # 有回退时退出码为1（用于CI）
+    python benchmarks/auth_micro.py --save-baseline    # 把本次结果保存为基线
+    python benchmarks/auth_micro.py --filter bcrypt-4 --json result.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_auth.json")
+
+# 比较的bcrypt成本因子
+BCRYPT_ROUNDS = (4, 10, 12)
+PASSWORD = "benchmark-password"
+
+
+def measure(func: Callable[[], object], rounds: int, min_time: float) -> Tuple[float, int]:
+    """
+    测量单次调用耗时
+
+    Returns:
+        (最快一轮的平均单次耗时秒数, 每轮调用次数)
+    """
+    func()
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+    best = elapsed / number
+    for _ in range(rounds - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best, number
+
+
+def _claims(size: str) -> dict:
+    """不同大小的令牌声明"""
+    claims = {"sub": "12345", "ver": 3}
+    if size in ("embedded", "large"):
+        claims.update({"act": True, "roles": ["user"]})
+    if size == "large":
+        claims["profile"] = {"name": "压测用户" * 16, "tags": [f"tag-{i}" for i in range(64)]}
+    return claims
+
+
+def build_cases(loop: asyncio.AbstractEventLoop, token_bytes: Dict[str, int]) -> Dict[str, Callable[[], object]]:
+    """
+    所有测试项：名称 -> 无参函数
+
+    Args:
+        loop: 运行异步测试项的事件循环
+        token_bytes: 输出参数，记录各大小令牌的字节数
+    """
+    from jose import jwt as jose_jwt
+    from db import config
+    from db.auth import authenticate_user, create_access_token, decode_access_token
+    from db.cache import token_cache
+    from db.database import engine, session_scope
+    from db.hashing import build_crypt_context
+    from db.keys import key_ring
+    from db.migrations import migrate
+    from db.model import UserModel
+
+    cases: Dict[str, Callable[[], object]] = {}
+
+    # ---- 令牌签发和解码 ----
+    for size in ("small", "embedded", "large"):
+        claims = _claims(size)
+        token = create_access_token(claims)
+        token_bytes[size] = len(token)
+        cases[f"create_access_token[{size}]"] = lambda claims=claims: create_access_token(claims)
+        cases[f"key_ring.decode[{size}]"] = lambda token=token: key_ring.decode(token)
+
+    token = create_access_token(_claims("small"))
+    token_cache.clear()
+    decode_access_token(token)
+    cases["decode_access_token[cached]"] = lambda: decode_access_token(token)
+
+    # ---- 不同JWT库（HS256，相同密钥和声明） ----
+    secret = config.JWT_SECRET_KEY
+    claims = dict(_claims("small"), exp=int(time.time()) + 3600)
+    jose_token = jose_jwt.encode(claims, secret, algorithm="HS256")
+    cases["jwt.encode[python-jose]"] = lambda: jose_jwt.encode(claims, secret, algorithm="HS256")
+    cases["jwt.decode[python-jose]"] = lambda: jose_jwt.decode(jose_token, secret, algorithms=["HS256"])
+    try:
+        import jwt as pyjwt
+        if hasattr(pyjwt, "PyJWT"):
+            cases["jwt.encode[pyjwt]"] = lambda: pyjwt.encode(claims, secret, algorithm="HS256")
+            cases["jwt.decode[pyjwt]"] = lambda: pyjwt.decode(jose_token, secret, algorithms=["HS256"])
+    except ImportError:
+        pass
+    try:
+        from joserfc import jwt as rfc_jwt
+        from joserfc.jwk import OctKey
+        oct_key = OctKey.import_key(secret)
+        cases["jwt.encode[joserfc]"] = lambda: rfc_jwt.encode({"alg": "HS256"}, claims, oct_key)
+        cases["jwt.decode[joserfc]"] = lambda: rfc_jwt.decode(jose_token, oct_key)
+    except ImportError:
+        pass
+
+    # ---- 密码哈希 ----
+    hashes = {}
+    for rounds in BCRYPT_ROUNDS:
+        context = build_crypt_context(["bcrypt"], bcrypt_rounds=rounds)
+        hashes[rounds] = context.hash(PASSWORD)
+        cases[f"get_password_hash[bcrypt-{rounds}]"] = lambda context=context: context.hash(PASSWORD)
+        cases[f"verify_password[bcrypt-{rounds}]"] = (
+            lambda context=context, hashed=hashes[rounds]: context.verify(PASSWORD, hashed)
+        )
+
+    # ---- authenticate_user（查询 + 校验，哈希成本由存储的哈希决定） ----
+    migrate(engine)
+
+    async def seed():
+        async with session_scope() as db:
+            for rounds, hashed in hashes.items():
+                db.add(UserModel(
+                    name="基准", email=f"bench-{rounds}@example.com", password_hash=hashed, is_active=True
+                ))
+            await db.commit()
+
+    loop.run_until_complete(seed())
+
+    async def authenticate(email: str):
+        async with session_scope() as db:
+            user = await authenticate_user(db, email, PASSWORD)
+            assert user is not None
+            return user
+
+    for rounds in BCRYPT_ROUNDS:
+        email = f"bench-{rounds}@example.com"
+        cases[f"authenticate_user[bcrypt-{rounds}]"] = (
+            lambda email=email: loop.run_until_complete(authenticate(email))
+        )
+
+    return cases
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    """返回比基线慢超过阈值的测试项"""
+    return [
+        name for name, seconds in results.items()
+        if name in baseline and baseline[name] > 0 and seconds > baseline[name] * (1 + threshold)
+    ]
+
+
+def _format(seconds: float) -> str:
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.2f} µs"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="认证热点函数微基准测试")
+    parser.add_argument("--rounds", type=int, default=5, help="每项重复的轮数")
+    parser.add_argument("--min-time", type=float, default=0.2, help="每轮最少运行秒数")
+    parser.add_argument("--filter", help="只运行名称包含该字符串的测试项")
+    parser.add_argument("--threshold", type=float, default=0.25, help="允许比基线慢的比例")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--check", action="store_true", help="有回退时以状态码1退出")
+    parser.add_argument("--json", dest="json_path", help="本次结果另存为JSON文件")
+    args = parser.parse_args()
+
+    # 必须在导入应用模块之前设置：使用临时数据库，关闭请求级指标
+    workdir = tempfile.mkdtemp(prefix="fastapi-user-bench-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ.setdefault("METRICS_ENABLED", "0")
+    sys.path.insert(0, ROOT)
+
+    from db.hashing import password_hasher
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        token_bytes: Dict[str, int] = {}
+        cases = build_cases(loop, token_bytes)
+        if args.filter:
+            cases = {name: func for name, func in cases.items() if args.filter in name}
+
+        baseline: Dict[str, float] = {}
+        if os.path.exists(args.baseline) and not args.save_baseline:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)["results"]
+
+        results: Dict[str, float] = {}
+        print(f"{'测试项':<44}{'单次耗时':>14}{'基线':>14}{'变化':>10}")
+        for name, func in cases.items():
+            seconds, _ = measure(func, args.rounds, args.min_time)
+            results[name] = seconds
+            old: Optional[float] = baseline.get(name)
+            change = f"{(seconds - old) / old * 100:+.1f}%" if old else "-"
+            flag = "  ⚠️ 回退" if old and seconds > old * (1 + args.threshold) else ""
+            print(f"{name:<44}{_format(seconds):>14}{(_format(old) if old else '-'):>14}{change:>10}{flag}", flush=True)
+    finally:
+        password_hasher.shutdown()
+        loop.close()
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "rounds": args.rounds,
+            "min_time": args.min_time,
+            "token_bytes": token_bytes,
+        },
+        "results": results,
+    }
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到 {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} 项比基线慢超过 {args.threshold:.0%}: {', '.join(regressions)}")
+        if args.check:
+            sys.exit(1)
+    elif baseline:
+        print(f"\n没有超过 {args.threshold:.0%} 的回退")
+
+
+if __name__ == "__main__":
+    main()
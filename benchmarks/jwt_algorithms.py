@@ -0,0 +1,100 @@
+"""
+JWT签名算法基准测试
+
+比较 HS256、RS256、ES256 等算法的签发和验签耗时、令牌长度，
+以及验签时使用密钥环中缓存的密钥对象与每次从PEM解析密钥的差别。
+
+用法:
+    python benchmarks/jwt_algorithms.py
+    python benchmarks/jwt_algorithms.py --iterations 5000 --json jwt_algorithms.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwt
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.keys import KeyRing, pem_key, secret_key
+
+
+def _private_pem(private_key) -> bytes:
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+
+def build_keys() -> dict:
+    """生成各算法的临时密钥：算法 -> (SigningKey, 验签用的原始密钥材料)"""
+    keys = {}
+    secret = os.urandom(32).hex()
+    keys["HS256"] = (secret_key(secret, "HS256"), secret)
+    for bits in (2048, 3072):
+        private = rsa.generate_private_key(public_exponent=65537, key_size=bits)
+        name = f"RS256-{bits}"
+        key = pem_key(_private_pem(private), "RS256")
+        keys[name] = (key, key.verify_key.to_pem())
+    for curve, algorithm in ((ec.SECP256R1(), "ES256"), (ec.SECP384R1(), "ES384")):
+        private = ec.generate_private_key(curve)
+        key = pem_key(_private_pem(private))
+        keys[algorithm] = (key, key.verify_key.to_pem())
+    return keys
+
+
+def _per_call(func, iterations: int) -> float:
+    """单次调用的平均耗时（微秒）"""
+    func()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def run(iterations: int) -> list:
+    claims = {"sub": "12345", "ver": 0, "exp": int(time.time()) + 900, "iat": time.time(), "jti": "0" * 32}
+    results = []
+    for name, (key, raw) in build_keys().items():
+        ring = KeyRing([key], key.kid)
+        token = ring.encode(claims)
+        # 签名比验签慢得多的算法（RSA）少跑一些
+        sign_iterations = max(iterations // 10, 50) if key.algorithm.startswith("RS") else iterations
+        results.append({
+            "algorithm": name,
+            "token_bytes": len(token),
+            "sign_us": round(_per_call(lambda: ring.encode(claims), sign_iterations), 2),
+            "verify_cached_us": round(_per_call(lambda: ring.decode(token), iterations), 2),
+            "verify_raw_key_us": round(
+                _per_call(lambda: jwt.decode(token, raw, algorithms=[key.algorithm]), iterations), 2
+            ),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JWT签名算法基准测试")
+    parser.add_argument("--iterations", type=int, default=2000, help="每项测试的调用次数")
+    parser.add_argument("--json", dest="json_path", help="结果另存为JSON文件")
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+
+    print(f"{'算法':<12}{'令牌字节':>10}{'签发µs':>12}{'验签µs(缓存密钥)':>20}{'验签µs(每次解析)':>20}")
+    for row in results:
+        print(f"{row['algorithm']:<12}{row['token_bytes']:>10}{row['sign_us']:>12}"
+              f"{row['verify_cached_us']:>20}{row['verify_raw_key_us']:>20}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"iterations": args.iterations, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+接口压测
+
+默认在进程内通过 httpx.ASGITransport 直接调用应用（不经过网络和uvicorn），
+使用临时SQLite数据库，不会修改 users.db；指定 --url 时压测已启动的服务，
+此时可以用 --processes 启动多个进程一起发请求。
+
+场景:
+    login     登录风暴（bcrypt校验 + 签发令牌）
+    me        GET /users/me（令牌校验 + 用户缓存）
+    list      GET /users/page 游标分页
+    register  注册突发（查重 + bcrypt哈希 + 插入）
+
+每个场景输出请求数、错误数、RPS 以及 p50/p95/p99 延迟，可保存为JSON并与上一次的结果对比。
+
+用法:
+    python benchmarks/load.py
+    python benchmarks/load.py --scenarios login,me --concurrency 32 --duration 10 --output after.json --compare before.json
+    python benchmarks/load.py --url http://localhost:8000 --processes 4
+
+进程内压测时默认关闭登录限流（RATE_LIMIT_ENABLED=0），压测已启动的服务时需要在服务端关闭。
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ("login", "me", "list", "register")
+PASSWORD = "benchmark-password"
+
+
+# ============ 场景 ============
+
+async def _login(client: httpx.AsyncClient, context: dict) -> httpx.Response:
+    email = random.choice(context["emails"])
+    return await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+
+
+async def _me(client: httpx.AsyncClient, context: dict) -> httpx.Response:
+    token = random.choice(context["tokens"])
+    return await client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+
+
+async def _list(client: httpx.AsyncClient, context: dict) -> httpx.Response:
+    # 每个并发任务沿着游标往后翻页，翻到底后从头开始
+    params = {"limit": 50}
+    if context.get("cursor"):
+        params["cursor"] = context["cursor"]
+    response = await client.get("/users/page", params=params, headers=context["auth"])
+    if response.status_code == 200:
+        context["cursor"] = response.json().get("next_cursor")
+    return response
+
+
+async def _register(client: httpx.AsyncClient, context: dict) -> httpx.Response:
+    email = f"bench-{context['prefix']}-{next(context['counter'])}@example.com"
+    return await client.post("/auth/register", json={"name": "压测用户", "email": email, "password": PASSWORD})
+
+
+SCENARIO_FUNCS = {"login": _login, "me": _me, "list": _list, "register": _register}
+
+
+# ============ 统计 ============
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """
+    最近秩百分位数（输入须已排序）：第 ceil(fraction × n) 个值
+
+    先把 fraction × n 舍入到9位小数，避免 0.07 × 100 = 7.000000000000001 这类浮点误差多进一位
+    """
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(round(fraction * len(sorted_values), 9))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def summarize(latencies: List[float], statuses: Dict[str, int], elapsed: float) -> dict:
+    """汇总一个场景的结果（延迟单位毫秒）"""
+    values = sorted(latency * 1000 for latency in latencies)
+    errors = sum(count for code, count in statuses.items() if not code.startswith("2"))
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(values) / elapsed, 1) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(values, 0.50), 3),
+            "p95": round(percentile(values, 0.95), 3),
+            "p99": round(percentile(values, 0.99), 3),
+            "mean": round(sum(values) / len(values), 3) if values else 0.0,
+            "max": round(values[-1], 3) if values else 0.0,
+        },
+        "status": dict(sorted(statuses.items())),
+    }
+
+
+# ============ 运行 ============
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    name: str,
+    context: dict,
+    concurrency: int,
+    duration: float,
+    max_requests: Optional[int] = None
+) -> tuple:
+    """
+    用concurrency个并发任务持续请求duration秒（或达到max_requests次）
+
+    Returns:
+        (每次请求的耗时列表, 状态码计数, 实际耗时秒数)
+    """
+    func = SCENARIO_FUNCS[name]
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    issued = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        # 每个任务有自己的上下文（游标分页各翻各的）
+        local = dict(context)
+        while time.perf_counter() < deadline:
+            if max_requests is not None and next(issued) >= max_requests:
+                return
+            started = time.perf_counter()
+            try:
+                response = await func(client, local)
+                code = str(response.status_code)
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+async def prepare(client: httpx.AsyncClient, users: int) -> dict:
+    """注册压测用户并登录，返回各场景共用的上下文"""
+    prefix = uuid.uuid4().hex[:8]
+    emails = [f"bench-{prefix}-user{i}@example.com" for i in range(users)]
+
+    async def register_and_login(email: str) -> str:
+        response = await client.post("/auth/register", json={"name": "压测用户", "email": email, "password": PASSWORD})
+        if response.status_code != 201:
+            raise RuntimeError(f"注册压测用户失败: {response.status_code} {response.text}")
+        response = await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+        if response.status_code != 200:
+            raise RuntimeError(f"登录压测用户失败: {response.status_code} {response.text}")
+        return response.json()["access_token"]
+
+    tokens = await asyncio.gather(*(register_and_login(email) for email in emails))
+    return {
+        "emails": emails,
+        "tokens": list(tokens),
+        "auth": {"Authorization": f"Bearer {tokens[0]}"},
+        "prefix": prefix,
+    }
+
+
+async def seed_rows(rows: int) -> None:
+    """进程内压测时直接插入额外的用户行（共用一个密码哈希，供分页场景使用）"""
+    from sqlalchemy import insert
+    from db.database import session_scope
+    from db.hashing import password_hasher
+    from db.model import UserModel, normalize_email
+
+    password_hash = await password_hasher.hash(PASSWORD)
+    prefix = uuid.uuid4().hex[:8]
+    batch = 1000
+    async with session_scope() as db:
+        for start in range(0, rows, batch):
+            emails = [f"seed-{prefix}-{i}@example.com" for i in range(start, min(start + batch, rows))]
+            values = [
+                {
+                    "name": f"种子用户{start + offset}",
+                    "email": email,
+                    "email_normalized": normalize_email(email),
+                    "password_hash": password_hash,
+                    "age": 18 + (start + offset) % 60,
+                    "is_active": True,
+                }
+                for offset, email in enumerate(emails)
+            ]
+            await db.execute(insert(UserModel), values)
+        await db.commit()
+
+
+async def run_in_process(args) -> dict:
+    """进程内通过ASGITransport压测"""
+    sys.path.insert(0, os.path.join(ROOT, "fastapi-user-main"))
+    sys.path.insert(0, ROOT)
+    import main
+
+    results = {}
+    async with main.app.router.lifespan_context(main.app):
+        if args.seed_rows:
+            await seed_rows(args.seed_rows)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            context = await prepare(client, args.users)
+            context["counter"] = itertools.count()
+            for name in args.scenarios:
+                print(f"运行场景 {name} ...", flush=True)
+                latencies, statuses, elapsed = await run_scenario(
+                    client, name, context, args.concurrency, args.duration, args.requests
+                )
+                results[name] = summarize(latencies, statuses, elapsed)
+    return results
+
+
+def _remote_worker(url: str, name: str, context: dict, concurrency: int, duration: float,
+                   max_requests: Optional[int], index: int) -> tuple:
+    """多进程压测时每个子进程执行的函数"""
+    async def go():
+        local = dict(context, prefix=f"{context['prefix']}p{index}", counter=itertools.count())
+        async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+            return await run_scenario(client, name, local, concurrency, duration, max_requests)
+    return asyncio.run(go())
+
+
+def run_remote(args) -> dict:
+    """压测已启动的服务，可用多个进程发请求"""
+    async def setup():
+        async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+            return await prepare(client, args.users)
+
+    context = asyncio.run(setup())
+    results = {}
+    per_process = None if args.requests is None else max(1, args.requests // args.processes)
+    with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+        for name in args.scenarios:
+            print(f"运行场景 {name}（{args.processes} 个进程）...", flush=True)
+            parts = pool.starmap(_remote_worker, [
+                (args.url, name, context, args.concurrency, args.duration, per_process, index)
+                for index in range(args.processes)
+            ])
+            # 各进程同时开始，取最慢的进程耗时（不含进程启动时间）
+            elapsed = max(part[2] for part in parts)
+            latencies: List[float] = []
+            statuses: Dict[str, int] = {}
+            for part_latencies, part_statuses, _ in parts:
+                latencies.extend(part_latencies)
+                for code, count in part_statuses.items():
+                    statuses[code] = statuses.get(code, 0) + count
+            results[name] = summarize(latencies, statuses, elapsed)
+    return results
+
+
+# ============ 输出 ============
+
+def print_results(results: dict, baseline: Optional[dict] = None) -> None:
+    print(f"\n{'场景':<10}{'请求数':>8}{'错误':>6}{'RPS':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, row in results.items():
+        latency = row["latency_ms"]
+        print(f"{name:<10}{row['requests']:>8}{row['errors']:>6}{row['rps']:>10}"
+              f"{latency['p50']:>10}{latency['p95']:>10}{latency['p99']:>10}")
+        old = (baseline or {}).get(name)
+        if old:
+            def change(new_value, old_value):
+                return f"{(new_value - old_value) / old_value * 100:+.1f}%" if old_value else "n/a"
+            print(f"{'  对比':<10}{'':>8}{'':>6}{change(row['rps'], old['rps']):>10}"
+                  f"{change(latency['p50'], old['latency_ms']['p50']):>10}"
+                  f"{change(latency['p95'], old['latency_ms']['p95']):>10}"
+                  f"{change(latency['p99'], old['latency_ms']['p99']):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接口压测")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"逗号分隔，可选 {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=16, help="每个进程的并发请求数")
+    parser.add_argument("--duration", type=float, default=5.0, help="每个场景持续秒数")
+    parser.add_argument("--requests", type=int, help="每个场景最多请求数（与duration先到为准）")
+    parser.add_argument("--users", type=int, default=20, help="预先注册并登录的压测用户数")
+    parser.add_argument("--seed-rows", type=int, default=1000, help="进程内压测时额外插入的用户行数")
+    parser.add_argument("--url", help="压测已启动的服务（不指定时进程内压测）")
+    parser.add_argument("--processes", type=int, default=1, help="发请求的进程数（需要 --url）")
+    parser.add_argument("--output", help="结果保存为JSON文件")
+    parser.add_argument("--compare", help="与之前保存的JSON结果对比")
+    args = parser.parse_args()
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+    if args.processes > 1 and not args.url:
+        parser.error("--processes 需要同时指定 --url")
+
+    if args.url:
+        results = run_remote(args)
+    else:
+        # 必须在导入应用之前设置
+        workdir = tempfile.mkdtemp(prefix="fastapi-user-bench-")
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+        results = asyncio.run(run_in_process(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["scenarios"]
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "meta": {
+                "transport": args.url or "asgi",
+                "processes": args.processes,
+                "concurrency": args.concurrency,
+                "duration": args.duration,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "env": {name: os.environ[name] for name in sorted(os.environ)
+                        if name.startswith(("DB_", "PASSWORD_", "BCRYPT_", "TOKEN_", "USER_CACHE", "JWT_ALGORITHM"))},
+            },
+            "scenarios": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+列表接口响应序列化基准测试
+
+对比 /users 返回N个用户时每个用户的平均耗时（微秒）：
+- orm+response_model: 查询ORM对象，按 List[UserResponse] 校验（from_attributes）后由Pydantic输出JSON
+- orm+json.dumps: 同上，但用 jsonable_encoder + 标准库json输出（旧版本FastAPI的做法，仅作参考）
+- rows+response_model: 只查询响应需要的列，行转字典后按 List[UserResponse] 校验并输出（默认路径）
+- rows+orjson: 只查询响应需要的列，行转字典后用orjson编码（FAST_JSON_RESPONSES=1）
+
+"查询"列包含从数据库读取和构造对象/字典的耗时，"序列化"列只包含校验和编码，"合计"为两者之和。
+使用临时SQLite数据库，不影响 users.db。
+
+用法:
+    python benchmarks/serialization.py
+    python benchmarks/serialization.py --items 100 1000 --json serialization.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _per_call(func, min_time: float) -> float:
+    """单次调用的平均耗时（秒），至少运行 min_time 秒，取3轮中最快的一轮"""
+    func()
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(2):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def seed(session_factory, rows: int) -> None:
+    """插入测试用户（姓名含中文，部分用户没有年龄）"""
+    from sqlalchemy import insert
+    from db.model import UserModel
+
+    with session_factory() as db:
+        db.execute(insert(UserModel), [
+            {
+                "name": f"测试用户{i}",
+                "email": f"user{i}@example.com",
+                "email_normalized": f"user{i}@example.com",
+                "password_hash": "x" * 60,
+                "age": None if i % 10 == 0 else 18 + i % 50,
+                "is_active": i % 20 != 0,
+            }
+            for i in range(rows)
+        ])
+        db.commit()
+
+
+def run(items_list: List[int], min_time: float) -> list:
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+    from db.database import SessionLocal, engine
+    from db.migrations import migrate
+    from db.model import UserModel
+    from db.serialization import USER_RESPONSE_COLUMNS, orjson, user_rows_to_dicts
+    from schemas import UserResponse
+
+    migrate(engine)
+    seed(SessionLocal, max(items_list))
+    adapter = TypeAdapter(List[UserResponse])
+
+    results = []
+    with SessionLocal() as db:
+        for items in items_list:
+            query = select(UserModel).order_by(UserModel.id).limit(items)
+            column_query = query.with_only_columns(*USER_RESPONSE_COLUMNS)
+
+            def fetch_orm():
+                users = db.scalars(query).all()
+                # 与请求结束时一样释放ORM对象，下一次查询重新构造
+                db.expunge_all()
+                return users
+
+            def fetch_rows():
+                return user_rows_to_dicts(db.execute(column_query).all())
+
+            users = fetch_orm()
+            dicts = fetch_rows()
+
+            def response_model():
+                return adapter.dump_json(adapter.validate_python(users, from_attributes=True))
+
+            def rows_response_model():
+                return adapter.dump_json(adapter.validate_python(dicts))
+
+            def stdlib_json():
+                value = adapter.validate_python(users, from_attributes=True)
+                return json.dumps(jsonable_encoder(value), ensure_ascii=False).encode()
+
+            def fast_json():
+                return orjson.dumps(dicts)
+
+            assert response_model() == rows_response_model() == fast_json(), "各路径的输出不一致"
+
+            fetch_orm_cost = _per_call(fetch_orm, min_time)
+            fetch_rows_cost = _per_call(fetch_rows, min_time)
+            for name, fetch_cost, serialize in (
+                ("orm+response_model", fetch_orm_cost, response_model),
+                ("orm+json.dumps", fetch_orm_cost, stdlib_json),
+                ("rows+response_model", fetch_rows_cost, rows_response_model),
+                ("rows+orjson", fetch_rows_cost, fast_json),
+            ):
+                serialize_cost = _per_call(serialize, min_time)
+                results.append({
+                    "items": items,
+                    "path": name,
+                    "fetch_us_per_item": round(fetch_cost / items * 1e6, 3),
+                    "serialize_us_per_item": round(serialize_cost / items * 1e6, 3),
+                    "total_us_per_item": round((fetch_cost + serialize_cost) / items * 1e6, 3),
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列表接口响应序列化基准测试")
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 100, 1000], help="每次返回的用户数")
+    parser.add_argument("--min-time", type=float, default=0.2, help="每项每轮最少运行秒数")
+    parser.add_argument("--json", dest="json_path", help="结果另存为JSON文件")
+    args = parser.parse_args()
+
+    # 必须在导入应用模块之前设置
+    workdir = tempfile.mkdtemp(prefix="fastapi-user-bench-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ.setdefault("METRICS_ENABLED", "0")
+    sys.path.insert(0, ROOT)
+
+    results = run(args.items, args.min_time)
+
+    print(f"{'条数':>6}  {'路径':<22}{'查询µs/条':>12}{'序列化µs/条':>14}{'合计µs/条':>12}")
+    for row in results:
+        print(f"{row['items']:>6}  {row['path']:<22}{row['fetch_us_per_item']:>12}"
+              f"{row['serialize_us_per_item']:>14}{row['total_us_per_item']:>12}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,48 @@
 """
 数据库模块
 """
-from .database import Base, engine, get_db, SessionLocal
-from .model import UserModel
+from .database import (
+    Base,
+    engine,
+    get_db,
+    SessionLocal,
+    async_engine,
+    AsyncSessionLocal,
+    get_async_db,
+    get_read_db,
+    read_router,
+    session_scope,
+    read_session
+)
+from .model import UserModel, UserSnapshot
+from .cache import TTLCache, user_cache, token_cache, token_version_cache
+from .hashing import PasswordHasher, password_hasher
 from .auth import (
     get_password_hash,
     verify_password,
+    get_password_hash_async,
+    verify_password_async,
     create_access_token,
+    decode_access_token,
     authenticate_user,
+    Principal,
+    get_current_principal,
     get_current_user,
-    get_current_active_user
+    get_current_active_user,
+    get_user_snapshot
 )
 
 __all__ = [
-    "Base", "engine", "get_db", "SessionLocal", "UserModel",
-    "get_password_hash", "verify_password", "create_access_token",
-    "authenticate_user", "get_current_user", "get_current_active_user"
+    "Base", "engine", "get_db", "SessionLocal",
+    "async_engine", "AsyncSessionLocal", "get_async_db",
+    "get_read_db", "read_router", "session_scope", "read_session",
+    "UserModel", "UserSnapshot",
+    "TTLCache", "user_cache", "token_cache", "token_version_cache",
+    "PasswordHasher", "password_hasher",
+    "get_password_hash", "verify_password",
+    "get_password_hash_async", "verify_password_async",
+    "create_access_token", "decode_access_token",
+    "authenticate_user", "Principal", "get_current_principal",
+    "get_current_user", "get_current_active_user", "get_user_snapshot"
 ]
 
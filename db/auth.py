@@ -1,28 +1,60 @@
 """
 JWT认证和密码加密工具
 """
+import hashlib
+import logging
+import time
+import uuid
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from typing import Optional, Tuple
+from jose import JWTError
+from fastapi import BackgroundTasks, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from .database import get_db
-from .model import UserModel
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import config
+from .database import current_principal_id, get_async_db, session_scope
+from .model import USER_SNAPSHOT_COLUMNS, UserModel, UserSnapshot, normalize_email
+from .cache import user_cache, token_cache, token_version_cache
+from .hashing import pwd_context, password_hasher
+from .metrics import record_timing
+from .keys import key_ring
+from .revocation import revocation_list
 
-# JWT配置
-SECRET_KEY = "your-secret-key-here-change-in-production-09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24小时
+logger = logging.getLogger(__name__)
 
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# JWT配置（签名和验签使用 db/keys.py 中的密钥环，这两个名称保留给直接调用jose的旧代码）
+SECRET_KEY = config.JWT_SECRET_KEY
+ALGORITHM = config.JWT_ALGORITHM
+ACCESS_TOKEN_EXPIRE_MINUTES = config.ACCESS_TOKEN_EXPIRE_MINUTES  # 短有效期，过期后用刷新令牌换新
+
+# 项目还没有角色模型，所有用户都是普通用户
+DEFAULT_ROLES = ("user",)
 
 # OAuth2密码流
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
+@dataclass(frozen=True)
+class Principal:
+    """
+    当前请求的认证主体
+
+    只包含身份信息，不包含用户资料；只需要知道"是谁"的接口依赖它，
+    令牌自带声明时不需要加载用户行
+    """
+    id: int
+    is_active: bool
+    token_version: int
+    roles: Tuple[str, ...] = DEFAULT_ROLES
+
+    @classmethod
+    def from_snapshot(cls, user: UserSnapshot) -> "Principal":
+        """从用户快照创建"""
+        return cls(id=user.id, is_active=user.is_active, token_version=user.token_version)
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -33,10 +65,22 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """验证密码（在哈希线程池中执行，不阻塞事件循环）"""
+    return await password_hasher.verify(plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """获取密码哈希（在哈希线程池中执行，不阻塞事件循环）"""
+    return await password_hasher.hash(password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     创建JWT访问令牌
     
+    除了调用方传入的数据，还会写入 exp、iat（签发时间戳）和 jti（令牌ID，用于吊销）
+    
     Args:
         data: 要编码到token中的数据
         expires_delta: 过期时间增量
@@ -50,68 +94,239 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.update({"exp": expire, "iat": time.time(), "jti": uuid.uuid4().hex})
+    encoded_jwt = key_ring.encode(to_encode)
     return encoded_jwt
 
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[UserModel]:
+def decode_access_token(token: str) -> dict:
+    """
+    解码并验证JWT访问令牌
+
+    验证通过的payload按token的sha256摘要缓存到exp时刻，
+    同一个token重复请求时不再重复验签和解析JSON
+    
+    Args:
+        token: JWT token字符串
+        
+    Returns:
+        token的payload（只读，不要修改）
+        
+    Raises:
+        JWTError: token无效或已过期
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is None:
+        started = time.perf_counter()
+        try:
+            payload = key_ring.decode(token)
+        finally:
+            record_timing("jwt_decode", time.perf_counter() - started)
+        exp = payload.get("exp")
+        ttl = exp - time.time() if isinstance(exp, (int, float)) else None
+        token_cache.set(key, payload, ttl)
+    return payload
+
+
+def access_token_claims(user) -> dict:
+    """
+    访问令牌中要写入的用户声明
+
+    总是包含 sub 和 ver（令牌版本）；开启 TOKEN_EMBED_CLAIMS 时还包含 act（是否激活）和 roles
+    
+    Args:
+        user: 用户对象或快照
+        
+    Returns:
+        传给 create_access_token 的数据
+    """
+    claims = {"sub": str(user.id), "ver": user.token_version}
+    if config.TOKEN_EMBED_CLAIMS:
+        claims["act"] = bool(user.is_active)
+        claims["roles"] = list(DEFAULT_ROLES)
+    return claims
+
+
+async def authenticate_user(
+    db: AsyncSession,
+    email: str,
+    password: str,
+    background_tasks: Optional[BackgroundTasks] = None
+) -> Optional[UserSnapshot]:
     """
     验证用户凭证
     
+    这是唯一读取密码哈希的地方：只查询快照需要的列和密码哈希，
+    返回的快照不包含哈希，不会被意外写入响应或缓存。
+    密码哈希的算法或成本参数已过时时，在响应发送后由background_tasks重新哈希并写回，
+    不增加登录耗时；不传background_tasks时不升级
+    
     Args:
         db: 数据库会话
         email: 用户邮箱
         password: 密码
+        background_tasks: 请求的后台任务
         
     Returns:
-        用户对象或None
+        用户快照或None
     """
-    user = db.query(UserModel).filter(UserModel.email == email).first()
-    if not user:
+    row = (await db.execute(
+        select(*USER_SNAPSHOT_COLUMNS, UserModel.password_hash)
+        .where(UserModel.email_normalized == normalize_email(email))
+    )).first()
+    if row is None:
         return None
-    if not verify_password(password, user.password_hash):
+    verified, needs_update = await password_hasher.verify_needs_update(password, row.password_hash)
+    if not verified:
         return None
-    return user
+    if needs_update and background_tasks is not None and config.PASSWORD_REHASH_ON_LOGIN:
+        background_tasks.add_task(rehash_password, row.id, row.password_hash, password)
+    return UserSnapshot.from_row(row)
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> UserModel:
+async def rehash_password(user_id: int, old_hash: str, password: str) -> bool:
     """
-    从JWT token获取当前用户（依赖注入）
+    用当前的算法和参数重新哈希密码并写回（后台任务）
+
+    只在数据库中仍是old_hash时写入（比较并交换），期间修改过密码则放弃。
+    语句直接在连接上执行，不触发Session事件，也不修改updated_at
     
     Args:
-        token: JWT token
-        db: 数据库会话
+        user_id: 用户ID
+        old_hash: 校验通过的旧哈希
+        password: 明文密码
         
     Returns:
-        当前用户对象
-        
-    Raises:
-        HTTPException: 认证失败
+        是否写入
     """
-    credentials_exception = HTTPException(
+    try:
+        new_hash = await password_hasher.hash(password)
+        users = UserModel.__table__
+        statement = (
+            update(users)
+            .where(users.c.id == user_id, users.c.password_hash == old_hash)
+            .values(password_hash=new_hash, updated_at=users.c.updated_at)
+        )
+        async with session_scope() as db:
+            rowcount = await db.run_sync(lambda session: session.connection().execute(statement).rowcount)
+            await db.commit()
+        return rowcount == 1
+    except HTTPException:
+        # 哈希队列已满，下次登录时再升级
+        return False
+    except Exception:
+        logger.exception("用户 %s 的密码哈希升级失败", user_id)
+        return False
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无法验证凭证",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+async def get_access_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    解码访问令牌并检查是否已被吊销（依赖注入）
+
+    吊销检查只查内存中的吊销列表，不访问数据库
     
+    Args:
+        token: JWT token
+        
+    Returns:
+        token的payload（只读，不要修改）
+        
+    Raises:
+        HTTPException: 令牌无效、已过期或已被吊销
+    """
     try:
-        # 解码JWT token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id_str: str = payload.get("sub")
-        if user_id_str is None:
-            raise credentials_exception
-        user_id = int(user_id_str)  # 将字符串转换为整数
-    except (JWTError, ValueError, TypeError):
-        raise credentials_exception
+        payload = decode_access_token(token)
+    except JWTError:
+        raise _credentials_exception()
+    if revocation_list.is_revoked(payload):
+        raise _credentials_exception()
+    return payload
+
+
+def _token_subject(payload: dict) -> int:
+    """从payload中取出用户ID"""
+    try:
+        return int(payload["sub"])
+    except (KeyError, ValueError, TypeError):
+        raise _credentials_exception()
+
+
+async def get_user_snapshot(db: AsyncSession, user_id: int) -> Optional[UserSnapshot]:
+    """
+    从数据库读取用户快照（只查询快照需要的列，不创建ORM对象，不读取密码哈希）
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+
+    Returns:
+        用户快照，用户不存在时返回None
+    """
+    row = (await db.execute(
+        select(*USER_SNAPSHOT_COLUMNS).where(UserModel.id == user_id)
+    )).first()
+    return UserSnapshot.from_row(row) if row is not None else None
+
+
+async def _load_user_snapshot(db: AsyncSession, user_id: int) -> Optional[UserSnapshot]:
+    """优先从缓存获取用户快照，未命中再查数据库"""
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await get_user_snapshot(db, user_id)
+        if user is None:
+            return None
+        user_cache.set(user_id, user)
+    return user
+
+
+async def _current_token_version(db: AsyncSession, user_id: int) -> Optional[int]:
+    """用户当前的令牌版本，用户不存在时返回None（只查询一列）"""
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user.token_version
+    version = token_version_cache.get(user_id)
+    if version is None:
+        version = await db.scalar(select(UserModel.token_version).where(UserModel.id == user_id))
+        if version is None:
+            return None
+        token_version_cache.set(user_id, version)
+    return version
+
+
+async def get_current_user(
+    payload: dict = Depends(get_access_token_payload),
+    db: AsyncSession = Depends(get_async_db)
+) -> UserSnapshot:
+    """
+    从JWT token获取当前用户（依赖注入）
+
+    用户快照会被缓存，缓存命中时不访问数据库。
+    只需要用户ID的接口请使用 get_current_principal
     
-    # 从数据库获取用户
-    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    Args:
+        payload: 已验证的token payload
+        db: 数据库会话
+        
+    Returns:
+        当前用户快照
+        
+    Raises:
+        HTTPException: 认证失败，或令牌版本已过时
+    """
+    user = await _load_user_snapshot(db, _token_subject(payload))
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    if "ver" in payload and payload["ver"] != user.token_version:
+        raise _credentials_exception()
     
     if not user.is_active:
         raise HTTPException(
@@ -119,12 +334,55 @@ async def get_current_user(
             detail="用户账号已被禁用"
         )
     
+    # 本请求的写入和读取都归到该用户（写后读粘滞）
+    current_principal_id.set(user.id)
     return user
 
 
+async def get_current_principal(
+    payload: dict = Depends(get_access_token_payload),
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    """
+    获取当前认证主体（依赖注入）
+
+    令牌自带声明（act）时直接使用令牌中的激活状态和角色，只核对令牌版本
+    （缓存未命中时查询一列）；否则回退到 get_current_user 加载用户快照
+    
+    Args:
+        payload: 已验证的token payload
+        db: 数据库会话
+        
+    Returns:
+        当前认证主体
+        
+    Raises:
+        HTTPException: 认证失败、令牌版本已过时或用户已被禁用
+    """
+    if "act" not in payload:
+        return Principal.from_snapshot(await get_current_user(payload, db))
+    
+    user_id = _token_subject(payload)
+    version = await _current_token_version(db, user_id)
+    if version is None or payload.get("ver") != version:
+        raise _credentials_exception()
+    if not payload["act"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="用户账号已被禁用"
+        )
+    current_principal_id.set(user_id)
+    return Principal(
+        id=user_id,
+        is_active=True,
+        token_version=version,
+        roles=tuple(payload.get("roles") or DEFAULT_ROLES),
+    )
+
+
 async def get_current_active_user(
-    current_user: UserModel = Depends(get_current_user)
-) -> UserModel:
+    current_user: UserSnapshot = Depends(get_current_user)
+) -> UserSnapshot:
     """
     获取当前激活的用户（额外的依赖层）
     
@@ -0,0 +1,243 @@
+"""
+已注册邮箱的布隆过滤器
+
+注册和修改邮箱时先查过滤器：判定"一定不存在"时跳过查重SQL，
+判定"可能存在"时再查数据库确认。
+
+- 启动时从 users 表构建，构建完成前所有检查都回退到数据库
+- 通过Session事件在flush时加入新邮箱（早于提交，不会漏判）
+- 删除用户或修改邮箱无法从布隆过滤器中移除，旧邮箱只会变成误判，
+  累计过多或条目超出容量时在后台重建
+
+注意：过滤器是进程内的，多进程部署时其他进程注册的邮箱可能被判为不存在，
+这种情况由 email_normalized 的唯一索引兜底（插入时IntegrityError）
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+from typing import Iterable, List, Optional
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+from . import config
+from .database import session_scope
+from .model import UserModel
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    布隆过滤器（双重哈希生成k个位置）
+
+    Args:
+        capacity: 预计元素个数
+        error_rate: 元素个数不超过capacity时的误判率
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate 必须在0和1之间")
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str) -> None:
+        """加入一个元素"""
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def memory_bytes(self) -> int:
+        """位数组占用的字节数"""
+        return len(self._bits)
+
+    def current_error_rate(self) -> float:
+        """按当前元素个数估算的误判率"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class EmailFilter:
+    """
+    规范化邮箱的布隆过滤器，支持后台重建
+
+    Args:
+        error_rate: 目标误判率
+        min_capacity: 最小容量，重建时容量取 max(min_capacity, 2 × 当前用户数)
+    """
+
+    def __init__(self, error_rate: float, min_capacity: int):
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self.checks = 0
+        self.negatives = 0
+        self.stale = 0
+        self._filter: Optional[BloomFilter] = None
+        self._pending: Optional[List[str]] = None
+        self._rebuild_requested = False
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """过滤器是否已构建"""
+        return self._filter is not None
+
+    @property
+    def needs_rebuild(self) -> bool:
+        """未构建、超出容量、过期条目过多或无法增量维护时需要重建"""
+        bloom = self._filter
+        if bloom is None or self._rebuild_requested:
+            return True
+        return bloom.count > bloom.capacity or self.stale > bloom.capacity // 10
+
+    def might_contain(self, email_normalized: str) -> bool:
+        """
+        邮箱是否可能已注册
+
+        返回False表示一定未注册，可以跳过数据库查询；返回True时需要查数据库确认
+        """
+        self.checks += 1
+        bloom = self._filter
+        if bloom is None or email_normalized in bloom:
+            return True
+        self.negatives += 1
+        return False
+
+    def add(self, email_normalized: str) -> None:
+        """加入一个已注册邮箱"""
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(email_normalized)
+            if self._pending is not None:
+                self._pending.append(email_normalized)
+
+    def discard(self) -> None:
+        """记录一个邮箱已不再使用（布隆过滤器无法删除，只计数）"""
+        with self._lock:
+            self.stale += 1
+
+    def request_rebuild(self) -> None:
+        """标记需要重建（发生了无法增量维护的批量修改）"""
+        self._rebuild_requested = True
+
+    def rebuild(self, db: Session) -> None:
+        """
+        从数据库重建过滤器（同步函数，可通过 run_sync 调用）
+
+        扫描期间加入的邮箱会先记下，扫描结束后补进新过滤器
+
+        Args:
+            db: 同步数据库会话
+        """
+        with self._lock:
+            self._pending = []
+            self._rebuild_requested = False
+        try:
+            total = db.scalar(select(func.count()).select_from(UserModel)) or 0
+            bloom = BloomFilter(max(self.min_capacity, 2 * total), self.error_rate)
+            emails = db.execute(
+                select(UserModel.email_normalized).execution_options(yield_per=config.EXPORT_BATCH_SIZE)
+            ).scalars()
+            for email in emails:
+                bloom.add(email)
+            with self._lock:
+                for email in self._pending:
+                    bloom.add(email)
+                self._filter = bloom
+                self.stale = 0
+        finally:
+            with self._lock:
+                self._pending = None
+
+    async def maintain_forever(self, interval: float) -> None:
+        """后台任务：立即构建一次，之后每隔interval秒检查是否需要重建"""
+        while True:
+            if self.needs_rebuild:
+                try:
+                    async with session_scope() as db:
+                        await db.run_sync(self.rebuild)
+                except Exception:
+                    logger.exception("邮箱布隆过滤器构建失败")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        """过滤器统计信息（包括内存占用估算）"""
+        bloom = self._filter
+        return {
+            "ready": bloom is not None,
+            "capacity": bloom.capacity if bloom else 0,
+            "count": bloom.count if bloom else 0,
+            "stale": self.stale,
+            "target_error_rate": self.error_rate,
+            "estimated_error_rate": bloom.current_error_rate() if bloom else 0.0,
+            "num_bits": bloom.num_bits if bloom else 0,
+            "num_hashes": bloom.num_hashes if bloom else 0,
+            "memory_bytes": bloom.memory_bytes if bloom else 0,
+            "checks": self.checks,
+            "negatives": self.negatives,
+        }
+
+
+# 全局邮箱过滤器
+email_filter = EmailFilter(
+    error_rate=config.EMAIL_FILTER_ERROR_RATE,
+    min_capacity=config.EMAIL_FILTER_MIN_CAPACITY,
+)
+
+
+# ============ Session事件：flush时加入新邮箱 ============
+
+def _collect_flush(session: Session, flush_context) -> None:
+    for obj in session.new:
+        if isinstance(obj, UserModel) and obj.email_normalized:
+            email_filter.add(obj.email_normalized)
+
+    for obj in session.dirty:
+        if isinstance(obj, UserModel):
+            history = inspect(obj).attrs.email_normalized.history
+            if history.added:
+                email_filter.add(history.added[0])
+            if history.deleted:
+                email_filter.discard()
+
+    for obj in session.deleted:
+        if isinstance(obj, UserModel):
+            email_filter.discard()
+
+
+def _collect_orm_dml(orm_execute_state) -> None:
+    """session.execute(insert(UserModel), rows) 这类批量语句不经过flush，单独处理"""
+    statement = orm_execute_state.statement
+    if getattr(getattr(statement, "table", None), "name", None) != UserModel.__tablename__:
+        return
+    if orm_execute_state.is_insert:
+        params = orm_execute_state.parameters
+        rows = params if isinstance(params, list) else [params or {}]
+        for row in rows:
+            if row.get("email_normalized"):
+                email_filter.add(row["email_normalized"])
+    elif orm_execute_state.is_update:
+        # 批量UPDATE可能修改了邮箱，无法增量维护
+        email_filter.request_rebuild()
+
+
+if config.EMAIL_FILTER_ENABLED:
+    event.listen(Session, "after_flush", _collect_flush)
+    event.listen(Session, "do_orm_execute", _collect_orm_dml)
@@ -0,0 +1,154 @@
+"""
+批量导入用户
+
+内存中去重 + 布隆过滤器和每批一次 IN 查询查重 + 并行哈希 + executemany 分批插入，
+每一行的失败原因都会单独记录，不影响其他行
+"""
+import json
+from typing import Any, Iterable, List, Type
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import config
+from .bloom import email_filter
+from .hashing import password_hasher
+from .model import UserModel, normalize_email
+
+
+def parse_ndjson(data: bytes) -> List[Any]:
+    """
+    解析NDJSON（每行一个JSON对象），忽略空行
+
+    无法解析的行原样保留为字符串，后续校验时会作为该行的错误返回
+
+    Raises:
+        UnicodeDecodeError: 数据不是UTF-8编码
+    """
+    records: List[Any] = []
+    for line in data.decode("utf-8").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            records.append(line)
+    return records
+
+
+def _chunks(items: list, size: int) -> Iterable[list]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _validation_message(exc: ValidationError) -> str:
+    error = exc.errors()[0]
+    location = ".".join(str(part) for part in error["loc"])
+    return f"{location}: {error['msg']}" if location else error["msg"]
+
+
+async def _insert_rows(db: AsyncSession, rows: List[dict], errors: List[dict]) -> int:
+    """插入一批行；与并发写入冲突时回退为逐行插入，返回成功行数"""
+    values = [row["values"] for row in rows]
+    try:
+        await db.execute(insert(UserModel), values)
+        await db.commit()
+        return len(rows)
+    except IntegrityError:
+        await db.rollback()
+
+    created = 0
+    for row in rows:
+        try:
+            await db.execute(insert(UserModel), [row["values"]])
+            await db.commit()
+            created += 1
+        except IntegrityError:
+            await db.rollback()
+            errors.append({"index": row["index"], "email": row["values"]["email"], "detail": "该邮箱已被注册"})
+    return created
+
+
+async def import_users(
+    db: AsyncSession,
+    records: List[Any],
+    schema: Type[BaseModel],
+    chunk_size: int = config.BULK_IMPORT_CHUNK_SIZE
+) -> dict:
+    """
+    批量导入用户
+
+    Args:
+        db: 数据库会话
+        records: 原始记录列表（通常来自JSON数组或NDJSON）
+        schema: 用于校验每条记录的Pydantic模型（如UserRegister）
+        chunk_size: 每批查重和插入的行数
+
+    Returns:
+        导入结果：total、created、failed、errors（每项包含index、email、detail）
+    """
+    errors: List[dict] = []
+    rows: List[dict] = []
+    seen = set()
+
+    # 1. 逐行校验，并在内存中去掉批次内的重复邮箱
+    for index, record in enumerate(records):
+        try:
+            user = schema.model_validate(record)
+        except ValidationError as exc:
+            email = record.get("email") if isinstance(record, dict) else None
+            # 原样回显的邮箱必须是字符串（错误明细的 email 字段是 Optional[str]）
+            if not isinstance(email, str):
+                email = None
+            errors.append({"index": index, "email": email, "detail": _validation_message(exc)})
+            continue
+        email_normalized = normalize_email(user.email)
+        if email_normalized in seen:
+            errors.append({"index": index, "email": user.email, "detail": "批次内邮箱重复"})
+            continue
+        seen.add(email_normalized)
+        rows.append({"index": index, "user": user, "email_normalized": email_normalized})
+
+    created = 0
+    for chunk in _chunks(rows, chunk_size):
+        # 2. 每批一次 IN 查询找出已注册的邮箱（只查布隆过滤器判定可能已注册的）
+        emails = [row["email_normalized"] for row in chunk
+                  if email_filter.might_contain(row["email_normalized"])]
+        existing = set()
+        if emails:
+            existing = set((await db.scalars(
+                select(UserModel.email_normalized).where(UserModel.email_normalized.in_(emails))
+            )).all())
+        pending = []
+        for row in chunk:
+            if row["email_normalized"] in existing:
+                errors.append({"index": row["index"], "email": row["user"].email, "detail": "该邮箱已被注册"})
+            else:
+                pending.append(row)
+        if not pending:
+            continue
+
+        # 3. 并行计算密码哈希
+        hashes = await password_hasher.hash_many([row["user"].password for row in pending])
+
+        # 4. executemany 批量插入
+        for row, password_hash in zip(pending, hashes):
+            user = row["user"]
+            row["values"] = {
+                "name": user.name,
+                "email": user.email,
+                "email_normalized": row["email_normalized"],
+                "password_hash": password_hash,
+                "age": user.age,
+                "is_active": True,
+            }
+        created += await _insert_rows(db, pending, errors)
+
+    errors.sort(key=lambda error: error["index"])
+    return {
+        "total": len(records),
+        "created": created,
+        "failed": len(errors),
+        "errors": errors,
+    }
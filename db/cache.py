@@ -0,0 +1,105 @@
+"""
+进程内缓存（TTL + LRU）
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from . import config
+
+
+class TTLCache:
+    """
+    线程安全的TTL + LRU缓存
+
+    Args:
+        max_size: 最大条目数，超过后淘汰最久未使用的条目
+        ttl: 默认存活秒数
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，过期或不存在时返回default"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 本条目的存活秒数，不传则使用默认值
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if self.max_size <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """删除指定条目"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+# 已验证用户缓存：user_id -> UserSnapshot
+user_cache = TTLCache(
+    max_size=config.USER_CACHE_MAX_SIZE,
+    ttl=config.USER_CACHE_TTL_SECONDS,
+)
+
+# 已解码JWT缓存：sha256(token) -> 已验证的payload，在token的exp时刻过期
+token_cache = TTLCache(
+    max_size=config.TOKEN_CACHE_MAX_SIZE,
+    ttl=config.TOKEN_CACHE_TTL_SECONDS,
+)
+
+# 令牌版本缓存：用户ID -> 当前token_version，令牌自带声明时只需核对版本，不加载整行
+token_version_cache = TTLCache(
+    max_size=config.USER_CACHE_MAX_SIZE,
+    ttl=config.USER_CACHE_TTL_SECONDS,
+)
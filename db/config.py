@@ -0,0 +1,203 @@
+"""
+运行配置（从环境变量读取）
+"""
+import os
+
+
+def _env_str(name: str, default: str) -> str:
+    """读取字符串配置"""
+    return os.getenv(name, default)
+
+
+def _env_int(name: str, default: int) -> int:
+    """读取整数配置"""
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+
+def _env_float(name: str, default: float) -> float:
+    """读取浮点数配置"""
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return float(value)
+
+
+def _env_list(name: str) -> list:
+    """读取逗号分隔的列表配置"""
+    value = os.getenv(name, "")
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """读取布尔配置（1/true/yes/on 视为真）"""
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# ============ 密码哈希线程池/进程池 ============
+
+# 执行器类型：thread（bcrypt在C层释放GIL，线程即可用满多核）或 process
+PASSWORD_HASH_POOL = _env_str("PASSWORD_HASH_POOL", "thread")
+# 工作线程/进程数量，默认等于CPU核数
+PASSWORD_HASH_WORKERS = _env_int("PASSWORD_HASH_WORKERS", os.cpu_count() or 1)
+# 允许排队+执行中的最大任务数，超过后直接返回503
+PASSWORD_HASH_MAX_PENDING = _env_int("PASSWORD_HASH_MAX_PENDING", PASSWORD_HASH_WORKERS * 8)
+
+# ============ 密码哈希算法 ============
+
+# 接受的哈希算法（逗号分隔，bcrypt 或 argon2），第一个用于新密码，其余的旧哈希在登录时升级
+PASSWORD_SCHEMES = _env_list("PASSWORD_SCHEMES") or ["bcrypt"]
+# bcrypt 成本因子（2^rounds 轮），与旧哈希不一致时登录后重新哈希
+BCRYPT_ROUNDS = _env_int("BCRYPT_ROUNDS", 12)
+# argon2id 内存（KiB）、迭代次数、并行度，默认值参考OWASP建议（需要安装 argon2-cffi）
+ARGON2_MEMORY_COST = _env_int("ARGON2_MEMORY_COST", 19456)
+ARGON2_TIME_COST = _env_int("ARGON2_TIME_COST", 2)
+ARGON2_PARALLELISM = _env_int("ARGON2_PARALLELISM", 1)
+# 登录成功后在后台把过时的哈希升级为当前算法和参数
+PASSWORD_REHASH_ON_LOGIN = _env_bool("PASSWORD_REHASH_ON_LOGIN", True)
+
+# ============ 已验证用户缓存 ============
+
+# 缓存条目存活秒数（0 表示关闭缓存）
+USER_CACHE_TTL_SECONDS = _env_int("USER_CACHE_TTL_SECONDS", 60)
+# 最多缓存的用户数
+USER_CACHE_MAX_SIZE = _env_int("USER_CACHE_MAX_SIZE", 10000)
+
+# ============ 已解码JWT缓存 ============
+
+# 最多缓存的token数
+TOKEN_CACHE_MAX_SIZE = _env_int("TOKEN_CACHE_MAX_SIZE", 10000)
+# 条目存活秒数上限，实际在token的exp时刻过期（0 表示关闭缓存）
+TOKEN_CACHE_TTL_SECONDS = _env_int("TOKEN_CACHE_TTL_SECONDS", 60 * 60 * 24)
+
+# ============ 认证令牌 ============
+
+# 访问令牌有效分钟数（短有效期，过期后用刷新令牌换新）
+ACCESS_TOKEN_EXPIRE_MINUTES = _env_int("ACCESS_TOKEN_EXPIRE_MINUTES", 15)
+# 刷新令牌有效天数（每次刷新都会轮换）
+REFRESH_TOKEN_EXPIRE_DAYS = _env_int("REFRESH_TOKEN_EXPIRE_DAYS", 30)
+# 签名算法：HS256/HS384/HS512（共享密钥），RS256/RS384/RS512、ES256/ES384/ES512（非对称，验签只需要公钥）
+JWT_ALGORITHM = _env_str("JWT_ALGORITHM", "HS256")
+# HS*算法的签名密钥（生产环境务必修改）
+JWT_SECRET_KEY = _env_str(
+    "JWT_SECRET_KEY",
+    "your-secret-key-here-change-in-production-09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
+)
+# 轮换HS密钥时仍然接受的旧密钥（逗号分隔，只验签）
+JWT_PREVIOUS_SECRET_KEYS = _env_list("JWT_PREVIOUS_SECRET_KEYS")
+# 非对称算法的签名私钥文件（PEM），只负责验签的节点不配置
+JWT_PRIVATE_KEY_FILE = _env_str("JWT_PRIVATE_KEY_FILE", "")
+# 只用于验签的公钥文件（PEM，逗号分隔）：轮换期间的旧公钥，或验签节点上的全部公钥
+JWT_PUBLIC_KEY_FILES = _env_list("JWT_PUBLIC_KEY_FILES")
+# 在访问令牌中写入激活状态和角色，只需要身份信息的接口不再加载用户行
+TOKEN_EMBED_CLAIMS = _env_bool("TOKEN_EMBED_CLAIMS", False)
+
+# ============ 数据库 ============
+
+# 调试模式（开启后默认打印SQL）
+DEBUG = _env_bool("DEBUG", False)
+
+# 同步连接串
+DATABASE_URL = _env_str("DATABASE_URL", "sqlite:///./users.db")
+# 异步连接串，默认由同步连接串换成aiosqlite驱动
+ASYNC_DATABASE_URL = _env_str(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+)
+# 只读副本连接串，多个用逗号分隔；为空时读请求也走主库
+DATABASE_READ_URLS = _env_list("DATABASE_READ_URLS")
+ASYNC_DATABASE_READ_URLS = _env_list("ASYNC_DATABASE_READ_URLS") or [
+    url.replace("sqlite://", "sqlite+aiosqlite://", 1) for url in DATABASE_READ_URLS
+]
+# 只读副本选择策略：round_robin 或 least_loaded
+DB_READ_BALANCE = _env_str("DB_READ_BALANCE", "round_robin")
+# 写入后多少秒内读请求仍走主库（避免读到副本的旧数据），0 表示不粘滞
+DB_READ_AFTER_WRITE_SECONDS = _env_int("DB_READ_AFTER_WRITE_SECONDS", 0)
+# 是否使用异步数据库模式（aiosqlite + AsyncSession）
+DB_ASYNC_MODE = _env_bool("DB_ASYNC_MODE", False)
+# 是否打印每条SQL（开销很大，仅调试时开启）
+DB_ECHO = _env_bool("DB_ECHO", DEBUG)
+
+# 连接池
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 20)
+DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+
+# SQLite PRAGMA（每个新连接建立时设置）
+SQLITE_JOURNAL_MODE = _env_str("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = _env_str("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE = _env_int("SQLITE_CACHE_SIZE", -64000)  # 负数表示KiB，约64MB
+SQLITE_MMAP_SIZE = _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+SQLITE_BUSY_TIMEOUT_MS = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+
+# ============ 批量导出 ============
+
+# 流式导出时每批从数据库读取的行数
+EXPORT_BATCH_SIZE = _env_int("EXPORT_BATCH_SIZE", 1000)
+
+# ============ 批量导入 ============
+
+# 每批查重和插入的行数
+BULK_IMPORT_CHUNK_SIZE = _env_int("BULK_IMPORT_CHUNK_SIZE", 1000)
+# /users/bulk 单次请求允许的最大行数
+BULK_IMPORT_MAX_ROWS = _env_int("BULK_IMPORT_MAX_ROWS", 100000)
+# /users/bulk 请求体的最大字节数（解析之前检查，限制内存占用）
+BULK_IMPORT_MAX_BYTES = _env_int("BULK_IMPORT_MAX_BYTES", 32 * 1024 * 1024)
+
+# ============ 用户统计 ============
+
+# 统计计数器的校准间隔秒数
+STATS_RECONCILE_SECONDS = _env_int("STATS_RECONCILE_SECONDS", 300)
+# /stats 返回最近多少天的每日注册数
+STATS_CREATED_DAYS = _env_int("STATS_CREATED_DAYS", 30)
+
+# ============ 用户搜索 ============
+
+# 是否为 /users/search 的关键字搜索建立SQLite FTS5三元组索引（迁移时自动建立并用触发器同步）
+USER_SEARCH_FTS = _env_bool("USER_SEARCH_FTS", False)
+
+# ============ 响应序列化 ============
+
+# 列表接口（/users、/users/page、/users/search）直接用orjson编码查询出的行字典，
+# 跳过逐条响应校验（需要安装orjson）
+FAST_JSON_RESPONSES = _env_bool("FAST_JSON_RESPONSES", False)
+
+# ============ 已注册邮箱布隆过滤器 ============
+
+# 是否启用（关闭后注册和修改邮箱时每次都查数据库）
+EMAIL_FILTER_ENABLED = _env_bool("EMAIL_FILTER_ENABLED", True)
+# 目标误判率（误判时只是多查一次数据库）
+EMAIL_FILTER_ERROR_RATE = _env_float("EMAIL_FILTER_ERROR_RATE", 0.001)
+# 最小容量，实际容量为 max(最小容量, 2 × 构建时的用户数)
+EMAIL_FILTER_MIN_CAPACITY = _env_int("EMAIL_FILTER_MIN_CAPACITY", 100000)
+# 后台检查是否需要重建的间隔秒数
+EMAIL_FILTER_CHECK_SECONDS = _env_int("EMAIL_FILTER_CHECK_SECONDS", 60)
+
+# ============ 监控指标 ============
+
+# 是否统计请求耗时、SQL条数和热点操作耗时，并在 /metrics 导出
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+# 是否在每个响应中添加 Server-Timing 头（会暴露内部耗时，建议只在内网或调试时开启）
+METRICS_SERVER_TIMING = _env_bool("METRICS_SERVER_TIMING", False)
+
+# ============ 登录限流 ============
+
+# 是否启用登录限流
+RATE_LIMIT_ENABLED = _env_bool("RATE_LIMIT_ENABLED", True)
+# 计数存储：memory（进程内，多实例部署时各自计数）
+RATE_LIMIT_BACKEND = _env_str("RATE_LIMIT_BACKEND", "memory")
+# 进程内存储最多保存的键数
+RATE_LIMIT_MAX_KEYS = _env_int("RATE_LIMIT_MAX_KEYS", 100000)
+# 每个IP每个窗口允许的登录请求数
+LOGIN_RATE_LIMIT_IP = _env_int("LOGIN_RATE_LIMIT_IP", 20)
+LOGIN_RATE_LIMIT_IP_WINDOW_SECONDS = _env_int("LOGIN_RATE_LIMIT_IP_WINDOW_SECONDS", 60)
+# 每个邮箱每个窗口允许的登录尝试次数（校验密码之前计入，登录成功后清零）
+LOGIN_RATE_LIMIT_EMAIL = _env_int("LOGIN_RATE_LIMIT_EMAIL", 5)
+LOGIN_RATE_LIMIT_EMAIL_WINDOW_SECONDS = _env_int("LOGIN_RATE_LIMIT_EMAIL_WINDOW_SECONDS", 900)
@@ -1,27 +1,362 @@
 """
 数据库连接配置
 """
-from sqlalchemy import create_engine
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Hashable, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+from . import config
+
+# 数据库连接串（可通过环境变量 DATABASE_URL / ASYNC_DATABASE_URL 修改）
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
+# 异步模式使用的连接串（aiosqlite驱动）
+ASYNC_DATABASE_URL = config.ASYNC_DATABASE_URL
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:" or "mode=memory" in url
+
+
+def _is_read_only_sqlite(url: str) -> bool:
+    return "mode=ro" in url
+
+
+def _sqlite_pragma_hook(read_only: bool = False):
+    """生成在新连接建立时设置SQLite性能相关PRAGMA的事件函数"""
+
+    def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            if not read_only:
+                # 只读连接不能修改日志模式
+                cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA cache_size={config.SQLITE_CACHE_SIZE:d}")
+            cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE:d}")
+            cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS:d}")
+        finally:
+            cursor.close()
+
+    return set_sqlite_pragmas
+
+
+def _engine_options(url: str) -> dict:
+    """根据配置生成create_engine参数"""
+    options = {
+        "echo": config.DB_ECHO,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+    }
+    if _is_sqlite(url):
+        # SQLite 特有的配置：允许连接在线程池的不同线程中使用
+        options["connect_args"] = {"check_same_thread": False}
+    if not (_is_sqlite(url) and _is_memory_sqlite(url)):
+        # 内存数据库使用单连接池，不支持以下参数
+        options.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+        )
+    return options
+
+
+def create_db_engine(url: str = SQLALCHEMY_DATABASE_URL) -> Engine:
+    """
+    创建同步数据库引擎
+
+    连接池参数和SQLite PRAGMA均来自 db/config.py
+    
+    Args:
+        url: 数据库连接串
+        
+    Returns:
+        数据库引擎
+    """
+    db_engine = create_engine(url, **_engine_options(url))
+    if _is_sqlite(url):
+        event.listen(db_engine, "connect", _sqlite_pragma_hook(_is_read_only_sqlite(url)))
+    return db_engine
+
+
+def create_async_db_engine(url: str = ASYNC_DATABASE_URL) -> AsyncEngine:
+    """
+    创建异步数据库引擎（参数同 create_db_engine）
+    """
+    db_engine = create_async_engine(url, **_engine_options(url))
+    if _is_sqlite(url):
+        event.listen(
+            db_engine.sync_engine, "connect", _sqlite_pragma_hook(_is_read_only_sqlite(url))
+        )
+    return db_engine
 
-# SQLite 数据库文件路径
-SQLALCHEMY_DATABASE_URL = "sqlite:///./users.db"
 
 # 创建数据库引擎
-# connect_args={"check_same_thread": False} 是 SQLite 特有的配置
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False},
-    echo=True  # 打印SQL语句，方便调试
-)
+engine = create_db_engine()
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步引擎和会话工厂（仅在 DB_ASYNC_MODE 开启时创建）
+async_engine = None
+AsyncSessionLocal = None
+if config.DB_ASYNC_MODE:
+    async_engine = create_async_db_engine()
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine,
+        autoflush=False,
+        expire_on_commit=False
+    )
+
+
+class ReadSessionRouter:
+    """
+    只读会话路由
+
+    在多个只读引擎之间按轮询（round_robin）或最少占用（least_loaded）选择。
+    写后读粘滞按写入者区分：某个用户提交写入后的 read_after_write_seconds 秒内，
+    只有该用户的读请求走主库，其他用户仍然读副本
+
+    Args:
+        factories: 各只读引擎的会话工厂
+        strategy: 选择策略
+        read_after_write_seconds: 写后读粘滞主库的秒数
+    """
+
+    def __init__(self, factories: list, strategy: str = "round_robin", read_after_write_seconds: float = 0):
+        if strategy not in ("round_robin", "least_loaded"):
+            raise ValueError(f"不支持的只读副本选择策略: {strategy}")
+        self.factories = factories
+        self.strategy = strategy
+        self.read_after_write_seconds = read_after_write_seconds
+        self._in_use = [0] * len(factories)
+        self._counter = itertools.count()
+        # 写入者 -> 最近一次写入提交的时间，按时间先后排列
+        self._last_writes: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def mark_write(self, writer: Optional[Hashable]) -> None:
+        """
+        记录一次写入提交
+
+        Args:
+            writer: 写入者（通常是用户ID）；为None时（脚本、注册等没有认证主体的写入）不粘滞
+        """
+        if writer is None or self.read_after_write_seconds <= 0 or not self.factories:
+            return
+        now = time.monotonic()
+        with self._lock:
+            last_writes = self._last_writes
+            last_writes[writer] = now
+            last_writes.move_to_end(writer)
+            # 最早的记录过了粘滞时间就不再需要
+            while last_writes:
+                oldest = next(iter(last_writes.values()))
+                if now - oldest < self.read_after_write_seconds:
+                    break
+                last_writes.popitem(last=False)
+
+    def use_primary(self, reader: Optional[Hashable] = None) -> bool:
+        """
+        是否应该使用主库处理读请求
+
+        Args:
+            reader: 发起读请求的用户，刚提交过写入时读主库
+        """
+        if not self.factories:
+            return True
+        if reader is None:
+            return False
+        last_write = self._last_writes.get(reader)
+        return last_write is not None and time.monotonic() - last_write < self.read_after_write_seconds
+
+    def acquire(self) -> int:
+        """选择一个只读引擎，返回其下标"""
+        with self._lock:
+            count = len(self.factories)
+            start = next(self._counter) % count
+            if self.strategy == "least_loaded":
+                # 从轮询位置开始找占用最少的，占用相同时依次轮换
+                order = [(start + i) % count for i in range(count)]
+                index = min(order, key=self._in_use.__getitem__)
+            else:
+                index = start
+            self._in_use[index] += 1
+            return index
+
+    def release(self, index: int) -> None:
+        """归还只读引擎"""
+        with self._lock:
+            self._in_use[index] -= 1
+
+
+# 只读副本引擎和会话路由（未配置 DATABASE_READ_URLS 时读请求走主库）
+if config.DB_ASYNC_MODE:
+    read_engines = [create_async_db_engine(url) for url in config.ASYNC_DATABASE_READ_URLS]
+    _read_factories = [
+        async_sessionmaker(read_engine, autoflush=False, expire_on_commit=False)
+        for read_engine in read_engines
+    ]
+else:
+    read_engines = [create_db_engine(url) for url in config.DATABASE_READ_URLS]
+    _read_factories = [
+        sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+        for read_engine in read_engines
+    ]
+read_router = ReadSessionRouter(
+    _read_factories,
+    strategy=config.DB_READ_BALANCE,
+    read_after_write_seconds=config.DB_READ_AFTER_WRITE_SECONDS,
+)
+
+
+# 当前请求的认证主体（用户ID），由认证依赖设置；写后读粘滞按它区分
+current_principal_id: ContextVar[Optional[int]] = ContextVar("current_principal_id", default=None)
+
+
+def _affects_reads(cls) -> bool:
+    """
+    该模型的写入是否需要写后读粘滞
+
+    模型类可以设置 __read_after_write__ = False 排除不会被只读接口读取的簿记数据（如刷新令牌）
+    """
+    return getattr(cls, "__read_after_write__", True)
+
+
+def _mark_session_writes(session: Session, flush_context) -> None:
+    """flush中包含需要粘滞的写操作时打标记（after_flush时 new/dirty/deleted 仍是flush前的状态）"""
+    if any(_affects_reads(type(instance)) for instance in (*session.new, *session.dirty, *session.deleted)):
+        session.info["has_writes"] = True
+
+
+def _mark_orm_dml(orm_execute_state) -> None:
+    """通过session.execute执行的INSERT/UPDATE/DELETE同样算写操作"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is None or _affects_reads(mapper.class_):
+            orm_execute_state.session.info["has_writes"] = True
+
+
+def _record_commit(session: Session) -> None:
+    """提交了写操作时通知只读路由（写入者取当前请求的认证主体）"""
+    if session.info.pop("has_writes", False):
+        read_router.mark_write(current_principal_id.get())
+
+
+def _discard_writes(session: Session) -> None:
+    session.info.pop("has_writes", None)
+
+
+event.listen(Session, "after_flush", _mark_session_writes)
+event.listen(Session, "do_orm_execute", _mark_orm_dml)
+event.listen(Session, "after_commit", _record_commit)
+event.listen(Session, "after_rollback", _discard_writes)
+
 # 创建基类
 Base = declarative_base()
 
+
+class ThreadPoolSession:
+    """
+    同步Session的异步适配器
+
+    提供与AsyncSession相同的常用方法，每次数据库I/O都放到线程池执行，
+    未开启异步模式时路由代码也不会阻塞事件循环
+    """
+
+    def __init__(self, sync_session: Session):
+        self.sync_session = sync_session
+
+    @property
+    def info(self) -> dict:
+        return self.sync_session.info
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, params=None, **kw):
+        # 预先取完所有行，结果对象在事件循环中使用时不再读游标
+        kw.setdefault("execution_options", {"prebuffer_rows": True})
+        return await run_in_threadpool(self.sync_session.execute, statement, params, **kw)
+
+    async def scalar(self, statement, params=None, **kw):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kw)
+
+    async def scalars(self, statement, params=None, **kw):
+        result = await self.execute(statement, params, **kw)
+        return result.scalars()
+
+    async def get(self, entity, ident, **kw):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kw)
+
+    async def delete(self, instance) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self) -> None:
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance, attribute_names=None) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def stream(self, statement, params=None, **kw) -> "ThreadPoolStreamResult":
+        """流式执行查询，配合 execution_options(yield_per=N) 使用服务端游标"""
+        result = await run_in_threadpool(self.sync_session.execute, statement, params, **kw)
+        return ThreadPoolStreamResult(result)
+
+    async def run_sync(self, fn, *args, **kw):
+        """在线程池中以同步Session调用fn(session, *args, **kw)"""
+        return await run_in_threadpool(fn, self.sync_session, *args, **kw)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+
+class ThreadPoolStreamResult:
+    """ThreadPoolSession.stream的返回值，每批行都在线程池中读取"""
+
+    def __init__(self, result):
+        self._result = result
+
+    async def partitions(self, size: Optional[int] = None) -> AsyncIterator[list]:
+        """按批异步迭代结果行"""
+        iterator = self._result.partitions(size)
+        while True:
+            rows = await run_in_threadpool(next, iterator, None)
+            if rows is None:
+                break
+            yield rows
+
+    async def close(self) -> None:
+        await run_in_threadpool(self._result.close)
+
+
 # 依赖注入：获取数据库会话
 def get_db():
     """
@@ -34,3 +369,73 @@ def get_db():
     finally:
         db.close()
 
+
+@asynccontextmanager
+async def _open_session(factory) -> AsyncIterator[AsyncSession]:
+    """用会话工厂打开异步会话（同步工厂会包装成ThreadPoolSession）"""
+    if isinstance(factory, async_sessionmaker):
+        async with factory() as db:
+            yield db
+    else:
+        db = ThreadPoolSession(factory())
+        try:
+            yield db
+        finally:
+            await db.close()
+
+
+def session_scope():
+    """
+    打开一个主库异步会话（脚本和后台任务中使用）
+
+    开启 DB_ASYNC_MODE 时返回基于aiosqlite的AsyncSession，
+    否则返回在线程池中执行的同步Session适配器，两者接口一致
+    """
+    return _open_session(AsyncSessionLocal or SessionLocal)
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """
+    异步依赖注入：获取数据库会话（会话类型见 session_scope）
+    """
+    async with session_scope() as db:
+        yield db
+
+
+@asynccontextmanager
+async def read_session() -> AsyncIterator[AsyncSession]:
+    """
+    打开一个只读会话
+
+    配置了只读副本时按 DB_READ_BALANCE 策略选择副本，
+    未配置副本或当前用户刚提交过写入时返回主库会话
+    """
+    if read_router.use_primary(current_principal_id.get()):
+        async with session_scope() as db:
+            yield db
+        return
+    index = read_router.acquire()
+    try:
+        async with _open_session(read_router.factories[index]) as db:
+            yield db
+    finally:
+        read_router.release(index)
+
+
+async def get_read_db() -> AsyncIterator[AsyncSession]:
+    """
+    异步依赖注入：获取只读数据库会话（选择规则见 read_session）
+
+    写后读粘滞依赖当前用户，接口中需要把认证依赖声明在它之前
+    """
+    async with read_session() as db:
+        yield db
+
+
+async def dispose_engines() -> None:
+    """释放所有引擎的连接池（应用退出时调用）"""
+    for db_engine in [async_engine, *read_engines]:
+        if isinstance(db_engine, AsyncEngine):
+            await db_engine.dispose()
+        elif db_engine is not None:
+            db_engine.dispose()
@@ -0,0 +1,91 @@
+"""
+用户数据流式导出（NDJSON / CSV）
+
+通过服务端游标分批读取，直接把行元组编码成文本，
+不创建ORM对象和Pydantic模型，内存占用与表大小无关
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Sequence
+from sqlalchemy import select
+from . import config
+from .database import read_session
+from .model import UserModel
+
+# 导出的列（不包含密码哈希）
+EXPORT_COLUMNS = (
+    UserModel.id,
+    UserModel.name,
+    UserModel.email,
+    UserModel.age,
+    UserModel.is_active,
+    UserModel.created_at,
+    UserModel.updated_at,
+)
+EXPORT_FIELDS = tuple(column.key for column in EXPORT_COLUMNS)
+
+# 支持的导出格式：格式 -> (media_type, 文件扩展名)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def _encode_ndjson(rows: Sequence[tuple]) -> bytes:
+    """把一批行编码为NDJSON，每行一个JSON对象"""
+    lines = [
+        json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False, default=_json_default)
+        for row in rows
+    ]
+    lines.append("")
+    return "\n".join(lines).encode()
+
+
+def _encode_csv(rows: Sequence[tuple]) -> bytes:
+    """把一批行编码为CSV"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        [value.isoformat() if isinstance(value, datetime) else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def export_users(fmt: str = "ndjson") -> AsyncIterator[bytes]:
+    """
+    按用户ID顺序流式导出所有用户
+
+    Args:
+        fmt: 导出格式，ndjson 或 csv
+
+    Yields:
+        编码后的数据块，每块对应一批数据库行
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    encode = _encode_ndjson if fmt == "ndjson" else _encode_csv
+    if fmt == "csv":
+        yield (",".join(EXPORT_FIELDS) + "\r\n").encode()
+
+    # 生成器自己持有会话，响应发送完毕后才关闭
+    async with read_session() as db:
+        query = (
+            select(*EXPORT_COLUMNS)
+            .order_by(UserModel.id)
+            .execution_options(yield_per=config.EXPORT_BATCH_SIZE)
+        )
+        result = await db.stream(query)
+        try:
+            async for rows in result.partitions():
+                yield encode(rows)
+        finally:
+            await result.close()
@@ -0,0 +1,201 @@
+"""
+密码哈希服务
+
+bcrypt是CPU密集型操作，直接在请求中调用会占满事件循环。
+这里把哈希/校验放到有界的线程池或进程池中执行，并提供可await的接口。
+
+哈希算法和成本由配置决定（PASSWORD_SCHEMES、BCRYPT_ROUNDS、ARGON2_*），
+算法或参数过时的旧哈希校验时会被标记，由调用方在登录后重新哈希。
+"""
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from . import config
+from .metrics import record_timing
+
+# 支持的哈希算法
+SUPPORTED_SCHEMES = ("bcrypt", "argon2")
+
+
+def build_crypt_context(
+    schemes: Sequence[str],
+    bcrypt_rounds: int = 12,
+    argon2_memory_cost: int = 19456,
+    argon2_time_cost: int = 2,
+    argon2_parallelism: int = 1
+) -> CryptContext:
+    """
+    创建密码加密上下文
+
+    第一个算法用于新哈希，其余算法的哈希标记为过时；成本参数与当前配置不一致的哈希同样视为过时
+    （最小和最大成本都设为当前值，调低成本也会触发重新哈希）
+
+    Args:
+        schemes: 接受的算法，bcrypt 或 argon2
+        bcrypt_rounds: bcrypt 成本因子
+        argon2_memory_cost / argon2_time_cost / argon2_parallelism: argon2id 参数
+
+    Raises:
+        ValueError: 算法不支持
+        RuntimeError: 使用argon2但没有安装 argon2-cffi
+    """
+    unknown = [scheme for scheme in schemes if scheme not in SUPPORTED_SCHEMES]
+    if not schemes or unknown:
+        raise ValueError(f"不支持的密码哈希算法: {', '.join(unknown) or '空'}，可选 {', '.join(SUPPORTED_SCHEMES)}")
+    context = CryptContext(
+        schemes=list(schemes),
+        default=schemes[0],
+        deprecated="auto",
+        bcrypt__default_rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        bcrypt__max_rounds=bcrypt_rounds,
+        argon2__type="ID",
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__default_rounds=argon2_time_cost,
+        argon2__min_rounds=argon2_time_cost,
+        argon2__max_rounds=argon2_time_cost,
+        argon2__parallelism=argon2_parallelism,
+    )
+    if "argon2" in schemes and not context.handler("argon2").has_backend():
+        raise RuntimeError("使用argon2需要先安装: pip install argon2-cffi")
+    return context
+
+
+# 密码加密上下文
+pwd_context = build_crypt_context(
+    config.PASSWORD_SCHEMES,
+    bcrypt_rounds=config.BCRYPT_ROUNDS,
+    argon2_memory_cost=config.ARGON2_MEMORY_COST,
+    argon2_time_cost=config.ARGON2_TIME_COST,
+    argon2_parallelism=config.ARGON2_PARALLELISM,
+)
+
+
+def _hash(password: str) -> str:
+    """在工作线程/进程中执行的哈希函数（模块级函数，进程池可序列化）"""
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    """在工作线程/进程中执行的校验函数"""
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def _verify_needs_update(plain_password: str, hashed_password: str) -> Tuple[bool, bool]:
+    """校验密码，并判断哈希是否过时（不在这里重新哈希，避免增加登录耗时）"""
+    if not pwd_context.verify(plain_password, hashed_password):
+        return False, False
+    return True, pwd_context.needs_update(hashed_password)
+
+
+class PasswordHasher:
+    """
+    带背压的密码哈希服务
+
+    Args:
+        pool: 执行器类型，thread 或 process
+        max_workers: 工作线程/进程数量
+        max_pending: 允许同时排队和执行的最大任务数，超过后返回503
+    """
+
+    def __init__(self, pool: str = "thread", max_workers: int = 1, max_pending: int = 8):
+        if pool not in ("thread", "process"):
+            raise ValueError(f"不支持的执行器类型: {pool}")
+        self.pool = pool
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """当前排队和执行中的任务数"""
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        """懒加载执行器（进程池在首次使用时才fork）"""
+        if self._executor is None:
+            if self.pool == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="password-hash"
+                )
+        return self._executor
+
+    async def _submit(self, operation: str, func, *args):
+        """提交任务到执行器，队列已满时拒绝；operation为记录耗时用的操作名（耗时包括排队时间）"""
+        if self._pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="服务繁忙，请稍后重试",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._pending -= 1
+            record_timing(operation, time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        """异步计算密码哈希"""
+        return await self._submit("password_hash", _hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """异步校验密码"""
+        return await self._submit("password_verify", _verify, plain_password, hashed_password)
+
+    async def verify_needs_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, bool]:
+        """
+        异步校验密码，同时判断哈希是否需要升级
+
+        Returns:
+            (密码是否正确, 密码正确且哈希算法或参数已过时)
+        """
+        return await self._submit("password_verify", _verify_needs_update, plain_password, hashed_password)
+
+    async def hash_many(self, passwords: Sequence[str]) -> List[str]:
+        """
+        并行计算一批密码哈希（批量导入用）
+
+        最多同时占用max_workers个工作线程/进程，任务不会因为队列满被拒绝，
+        其他请求的哈希任务最多只需等待一轮批量任务
+        """
+        results: List[str] = [""] * len(passwords)
+        indices = iter(range(len(passwords)))
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+
+        async def worker():
+            for index in indices:
+                self._pending += 1
+                started = time.perf_counter()
+                try:
+                    results[index] = await loop.run_in_executor(executor, _hash, passwords[index])
+                finally:
+                    self._pending -= 1
+                    record_timing("password_hash", time.perf_counter() - started)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.max_workers, len(passwords)))))
+        return results
+
+    def shutdown(self) -> None:
+        """关闭执行器（应用退出时调用）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局哈希服务实例
+password_hasher = PasswordHasher(
+    pool=config.PASSWORD_HASH_POOL,
+    max_workers=config.PASSWORD_HASH_WORKERS,
+    max_pending=config.PASSWORD_HASH_MAX_PENDING,
+)
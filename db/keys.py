@@ -0,0 +1,256 @@
+"""
+JWT签名密钥管理
+
+密钥环中可以同时有多把密钥，每把用 kid 标识，签发的令牌头部带上 kid：
+- 只有一把密钥用于签名（当前密钥），其余只用于验签（轮换期间仍接受旧密钥签发的令牌）
+- 非对称算法（RS*、ES*）的验签只需要公钥，公钥通过 /.well-known/jwks.json 公开，
+  新增验签节点时不需要分发签名密钥
+- 密钥在启动时解析一次并按 kid 放入字典，验签时只做一次字典查找，不重复解析PEM
+
+轮换非对称密钥：生成新私钥作为 JWT_PRIVATE_KEY_FILE，把旧公钥加入 JWT_PUBLIC_KEY_FILES，
+等旧令牌全部过期（一个访问令牌有效期）后再移除。
+轮换共享密钥：新密钥作为 JWT_SECRET_KEY，旧密钥放入 JWT_PREVIOUS_SECRET_KEYS。
+
+注意：python-jose 不支持 EdDSA（Ed25519），需要更小更快的非对称签名时使用 ES256
+"""
+import base64
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import ExpiredSignatureError, JWTError, jwk, jwt
+from jose.backends.base import Key
+from . import config
+
+# 支持的签名算法
+SYMMETRIC_ALGORITHMS = ("HS256", "HS384", "HS512")
+RSA_ALGORITHMS = ("RS256", "RS384", "RS512")
+EC_ALGORITHMS = ("ES256", "ES384", "ES512")
+SUPPORTED_ALGORITHMS = SYMMETRIC_ALGORITHMS + RSA_ALGORITHMS + EC_ALGORITHMS
+
+# 椭圆曲线 -> 对应的ES算法
+_CURVE_ALGORITHMS = {"secp256r1": "ES256", "secp384r1": "ES384", "secp521r1": "ES512"}
+# RFC 7638 计算指纹时使用的JWK成员
+_THUMBPRINT_MEMBERS = {"RSA": ("e", "kty", "n"), "EC": ("crv", "kty", "x", "y")}
+
+
+@dataclass(frozen=True)
+class SigningKey:
+    """
+    密钥环中的一把密钥
+
+    Attributes:
+        kid: 密钥ID
+        algorithm: 签名算法
+        verify_key: 验签用的密钥对象（共享密钥或公钥）
+        sign_key: 签名用的密钥对象，只用于验签的密钥为None
+    """
+    kid: str
+    algorithm: str
+    verify_key: Key
+    sign_key: Optional[Key] = None
+
+    @property
+    def is_symmetric(self) -> bool:
+        return self.algorithm in SYMMETRIC_ALGORITHMS
+
+    def public_jwk(self) -> Optional[dict]:
+        """公钥的JWK表示，共享密钥不能公开，返回None"""
+        if self.is_symmetric:
+            return None
+        return {**self.verify_key.to_dict(), "kid": self.kid, "use": "sig"}
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _thumbprint(public_key: Key) -> str:
+    """RFC 7638 JWK指纹，作为非对称密钥的kid"""
+    data = public_key.to_dict()
+    members = {name: data[name] for name in _THUMBPRINT_MEMBERS[data["kty"]]}
+    canonical = json.dumps(members, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return _b64url(hashlib.sha256(canonical).digest())
+
+
+def secret_key(secret: str, algorithm: str = "HS256") -> SigningKey:
+    """
+    由共享密钥创建密钥
+
+    kid 取密钥摘要的前16位，不能反推出密钥本身
+
+    Raises:
+        ValueError: 不是HS*算法
+    """
+    if algorithm not in SYMMETRIC_ALGORITHMS:
+        raise ValueError(f"共享密钥只能用于 {', '.join(SYMMETRIC_ALGORITHMS)}，不支持: {algorithm}")
+    key = jwk.construct(secret, algorithm)
+    kid = "hs-" + hashlib.sha256(b"kid:" + secret.encode("utf-8")).hexdigest()[:16]
+    return SigningKey(kid=kid, algorithm=algorithm, verify_key=key, sign_key=key)
+
+
+def _infer_algorithm(public_key, preferred: Optional[str]) -> str:
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return preferred if preferred in RSA_ALGORITHMS else "RS256"
+    if isinstance(public_key, ec.EllipticCurvePublicKey):
+        algorithm = _CURVE_ALGORITHMS.get(public_key.curve.name)
+        if algorithm is None:
+            raise ValueError(f"不支持的椭圆曲线: {public_key.curve.name}")
+        return algorithm
+    raise ValueError(f"不支持的密钥类型: {type(public_key).__name__}（仅支持RSA和EC）")
+
+
+def pem_key(pem: bytes, algorithm: Optional[str] = None) -> SigningKey:
+    """
+    由PEM格式的私钥或公钥创建密钥
+
+    私钥可用于签名和验签，公钥只用于验签；kid 为公钥的RFC 7638指纹，
+    同一把密钥在所有节点上的kid一致
+
+    Args:
+        pem: PEM内容
+        algorithm: 期望的算法，RSA密钥默认RS256，EC密钥由曲线决定
+
+    Raises:
+        ValueError: 无法解析或不支持的密钥
+    """
+    private = b"PRIVATE KEY" in pem
+    if private:
+        loaded = serialization.load_pem_private_key(pem, password=None)
+        public = loaded.public_key()
+    else:
+        public = serialization.load_pem_public_key(pem)
+    algorithm = _infer_algorithm(public, algorithm)
+
+    public_pem = public.public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    verify_key = jwk.construct(public_pem, algorithm)
+    sign_key = jwk.construct(pem, algorithm) if private else None
+    return SigningKey(kid=_thumbprint(verify_key), algorithm=algorithm, verify_key=verify_key, sign_key=sign_key)
+
+
+class KeyRing:
+    """
+    JWT密钥环
+
+    Args:
+        keys: 所有密钥（签名密钥和只验签的密钥）
+        signing_kid: 签名密钥的kid，为None时本节点只能验签
+    """
+
+    def __init__(self, keys: Iterable[SigningKey], signing_kid: Optional[str] = None):
+        self._keys: Dict[str, SigningKey] = {}
+        for key in keys:
+            self._keys.setdefault(key.kid, key)
+        self._signing: Optional[SigningKey] = None
+        if signing_kid is not None:
+            key = self._keys.get(signing_kid)
+            if key is None or key.sign_key is None:
+                raise ValueError(f"签名密钥 {signing_kid} 不存在或没有私钥")
+            self._signing = key
+
+    @property
+    def signing_key(self) -> SigningKey:
+        """
+        当前签名密钥
+
+        Raises:
+            RuntimeError: 本节点只配置了验签公钥
+        """
+        if self._signing is None:
+            raise RuntimeError("本节点没有配置签名密钥，只能验证令牌")
+        return self._signing
+
+    @property
+    def keys(self) -> List[SigningKey]:
+        return list(self._keys.values())
+
+    def get(self, kid: str) -> Optional[SigningKey]:
+        """按kid查找密钥"""
+        return self._keys.get(kid)
+
+    def encode(self, claims: dict) -> str:
+        """用当前签名密钥签发令牌，头部带上kid"""
+        key = self.signing_key
+        return jwt.encode(claims, key.sign_key, algorithm=key.algorithm, headers={"kid": key.kid})
+
+    def decode(self, token: str) -> dict:
+        """
+        验签并解码令牌
+
+        按头部的kid选择密钥，算法必须与该密钥一致（防止算法替换攻击）。
+        没有kid的旧令牌依次尝试相同算法的密钥
+
+        Raises:
+            JWTError: 令牌无效、已过期或kid未知
+        """
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg")
+        kid = header.get("kid")
+        if kid is not None:
+            key = self._keys.get(kid)
+            if key is None or key.algorithm != algorithm:
+                raise JWTError("未知的签名密钥")
+            return jwt.decode(token, key.verify_key, algorithms=[key.algorithm])
+
+        error = JWTError("未知的签名密钥")
+        for key in self._keys.values():
+            if key.algorithm != algorithm:
+                continue
+            try:
+                return jwt.decode(token, key.verify_key, algorithms=[key.algorithm])
+            except ExpiredSignatureError:
+                # 签名已匹配，只是过期了
+                raise
+            except JWTError as e:
+                error = e
+        raise error
+
+    def jwks(self) -> dict:
+        """公开的JWK Set（不包含共享密钥）"""
+        return {"keys": [key.public_jwk() for key in self._keys.values() if not key.is_symmetric]}
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def load_key_ring() -> KeyRing:
+    """
+    按配置创建密钥环
+
+    - HS*：JWT_SECRET_KEY 签名，JWT_PREVIOUS_SECRET_KEYS 只验签
+    - RS*/ES*：JWT_PRIVATE_KEY_FILE 签名（不配置则只验签），JWT_PUBLIC_KEY_FILES 只验签
+
+    Raises:
+        ValueError: 算法不支持或密钥配置不完整
+    """
+    algorithm = config.JWT_ALGORITHM
+    if algorithm not in SUPPORTED_ALGORITHMS:
+        raise ValueError(f"不支持的JWT算法: {algorithm}，可选 {', '.join(SUPPORTED_ALGORITHMS)}")
+
+    if algorithm in SYMMETRIC_ALGORITHMS:
+        signing = secret_key(config.JWT_SECRET_KEY, algorithm)
+        keys = [signing] + [secret_key(secret, algorithm) for secret in config.JWT_PREVIOUS_SECRET_KEYS]
+        return KeyRing(keys, signing.kid)
+
+    keys = []
+    signing_kid = None
+    if config.JWT_PRIVATE_KEY_FILE:
+        signing = pem_key(_read(config.JWT_PRIVATE_KEY_FILE), algorithm)
+        if signing.algorithm != algorithm:
+            raise ValueError(f"私钥类型与 JWT_ALGORITHM={algorithm} 不匹配")
+        keys.append(signing)
+        signing_kid = signing.kid
+    keys.extend(pem_key(_read(path), algorithm) for path in config.JWT_PUBLIC_KEY_FILES)
+    if not keys:
+        raise ValueError(f"{algorithm} 需要配置 JWT_PRIVATE_KEY_FILE 或 JWT_PUBLIC_KEY_FILES")
+    return KeyRing(keys, signing_kid)
+
+
+# 全局密钥环
+key_ring = load_key_ring()
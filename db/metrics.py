@@ -0,0 +1,250 @@
+"""
+请求耗时和SQL次数统计
+
+- MetricsMiddleware：按路由记录请求耗时直方图、每个请求的SQL条数和数据库耗时
+- 引擎的 before/after_cursor_execute 事件：统计每条SQL的耗时
+- record_timing：记录密码哈希、JWT解码等热点操作的耗时
+
+统计数据以Prometheus文本格式从 /metrics 导出；开启 METRICS_SERVER_TIMING 时
+每个响应还会带上 Server-Timing 头，浏览器开发者工具里可以直接看到各部分耗时。
+
+当前请求的统计对象放在contextvar中，线程池中执行的同步会话会复制上下文，
+修改的是同一个对象，因此SQL无论在事件循环还是线程池中执行都能计入所属请求。
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from . import config
+
+# 直方图的桶上限（秒 / 条）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# 未匹配到路由的请求统一记为这个标签，避免按原始路径产生大量时间序列
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Histogram:
+    """
+    带标签的直方图（线程安全）
+
+    Args:
+        name: 指标名
+        documentation: 指标说明
+        labels: 标签名
+        buckets: 桶上限（升序）
+    """
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """记录一个观测值"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # [各桶计数..., 总和, 总数]
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def expose(self) -> Iterable[str]:
+        """输出Prometheus文本格式的行"""
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = {key: list(value) for key, value in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(labels, le=bound)} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(labels, le='+Inf')} {series[-1]}"
+            yield f"{self.name}_sum{_format_labels(labels)} {series[-2]}"
+            yield f"{self.name}_count{_format_labels(labels)} {series[-1]}"
+
+
+def _format_labels(labels: dict, **extra) -> str:
+    items = {**labels, **extra}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# ============ 指标定义 ============
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "请求耗时（秒）",
+    ("method", "route", "status"), LATENCY_BUCKETS,
+)
+request_sql_statements = Histogram(
+    "http_request_sql_statements", "每个请求执行的SQL条数",
+    ("method", "route"), SQL_COUNT_BUCKETS,
+)
+request_db_duration = Histogram(
+    "http_request_db_seconds", "每个请求的数据库总耗时（秒）",
+    ("method", "route"), LATENCY_BUCKETS,
+)
+sql_duration = Histogram(
+    "db_statement_duration_seconds", "单条SQL耗时（秒，包括请求之外的后台任务）",
+    (), LATENCY_BUCKETS,
+)
+operation_duration = Histogram(
+    "operation_duration_seconds", "热点操作耗时（秒），operation为 password_hash、password_verify、jwt_decode 等",
+    ("operation",), LATENCY_BUCKETS,
+)
+
+ALL_METRICS = (request_duration, request_sql_statements, request_db_duration, sql_duration, operation_duration)
+
+
+class RequestStats:
+    """单个请求的统计"""
+    __slots__ = ("sql_count", "sql_seconds", "timings")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.timings: Dict[str, float] = {}
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def record_timing(operation: str, seconds: float) -> None:
+    """
+    记录一次热点操作的耗时
+
+    Args:
+        operation: 操作名，如 password_hash、jwt_decode
+        seconds: 耗时秒数
+    """
+    if not config.METRICS_ENABLED:
+        return
+    operation_duration.observe(seconds, operation)
+    stats = _current.get()
+    if stats is not None:
+        stats.timings[operation] = stats.timings.get(operation, 0.0) + seconds
+
+
+def render_metrics() -> str:
+    """所有指标的Prometheus文本格式"""
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+# ============ SQL计时 ============
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    sql_duration.observe(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += elapsed
+
+
+def _handle_error(exception_context):
+    # 执行失败时不会触发after_cursor_execute，丢弃对应的开始时间
+    conn = exception_context.connection
+    starts = conn.info.get("metrics_query_start") if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+if config.METRICS_ENABLED:
+    # 监听Engine类，主库、只读副本以及异步引擎内部的同步引擎都会计入
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+
+
+# ============ 中间件 ============
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def _server_timing(total: float, stats: RequestStats) -> str:
+    parts = [f"app;dur={total * 1000:.2f}",
+             f'db;dur={stats.sql_seconds * 1000:.2f};desc="{stats.sql_count} queries"']
+    parts.extend(f"{name};dur={seconds * 1000:.2f}" for name, seconds in stats.timings.items())
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    纯ASGI中间件：统计每个HTTP请求的耗时、SQL条数和数据库耗时
+
+    不使用BaseHTTPMiddleware，流式响应不会被缓冲
+
+    Args:
+        app: 下游ASGI应用
+        server_timing: 是否在响应中添加Server-Timing头
+    """
+
+    def __init__(self, app, server_timing: bool = config.METRICS_SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    value = _server_timing(time.perf_counter() - started, stats)
+                    headers.append((b"server-timing", value.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            method = scope["method"]
+            route = _route_label(scope)
+            request_duration.observe(elapsed, method, route, str(status_code))
+            request_sql_statements.observe(stats.sql_count, method, route)
+            request_db_duration.observe(stats.sql_seconds, method, route)
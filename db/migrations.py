@@ -0,0 +1,225 @@
+"""
+数据库结构迁移
+
+每个迁移有一个递增的版本号，已执行的版本记录在 schema_version 表中。
+应用启动和初始化脚本都调用 migrate()，只执行尚未执行过的迁移，不会删除数据。
+
+新增迁移时在 MIGRATIONS 末尾追加，已发布的迁移不要修改。
+
+用法:
+    python -m db.migrations          # 执行所有未执行的迁移
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, List
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import func
+from . import config
+from .database import Base
+from . import model  # noqa: F401  确保模型已注册到Base.metadata
+from .search import FTS_TABLE, ensure_fts_index
+
+# 迁移版本记录表（不属于业务模型，单独定义）
+_version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    _version_metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """一个迁移步骤"""
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def _v1_create_users(conn: Connection) -> None:
+    """创建最初版本的users表（与迁移体系引入前create_all生成的结构一致）"""
+    metadata = MetaData()
+    users = Table(
+        "users",
+        metadata,
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("name", String(100), nullable=False, comment="用户姓名"),
+        Column("email", String(255), nullable=False, comment="用户邮箱"),
+        Column("password_hash", String(255), nullable=False, comment="密码哈希"),
+        Column("age", Integer, nullable=True, comment="用户年龄"),
+        Column("is_active", Boolean, nullable=False, comment="是否激活"),
+        Column("created_at", DateTime(timezone=True), server_default=func.now(), comment="创建时间"),
+        Column("updated_at", DateTime(timezone=True), server_default=func.now(), comment="更新时间"),
+    )
+    Index("ix_users_id", users.c.id)
+    Index("ix_users_email", users.c.email, unique=True)
+    metadata.create_all(conn)
+
+
+def _v2_add_query_indexes(conn: Connection) -> None:
+    """为统计、按ID列出激活用户、按注册时间和年龄筛选添加索引"""
+    users = Table("users", MetaData(), autoload_with=conn)
+    Index("ix_users_is_active_id", users.c.is_active, users.c.id).create(conn)
+    Index("ix_users_created_at", users.c.created_at).create(conn)
+    Index("ix_users_age", users.c.age).create(conn)
+
+
+def _v3_add_email_normalized(conn: Connection) -> None:
+    """添加规范化邮箱列，回填已有数据并建立唯一索引"""
+    conn.execute(text(
+        "ALTER TABLE users ADD COLUMN email_normalized VARCHAR(255) NOT NULL DEFAULT ''"
+    ))
+    conn.execute(text("UPDATE users SET email_normalized = lower(trim(email))"))
+    duplicates = conn.execute(text(
+        "SELECT email_normalized FROM users GROUP BY email_normalized HAVING count(*) > 1"
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(
+            f"以下邮箱存在仅大小写不同的重复账号，请先手动合并: {', '.join(duplicates)}"
+        )
+    users = Table("users", MetaData(), autoload_with=conn)
+    Index("ix_users_email_normalized", users.c.email_normalized, unique=True).create(conn)
+
+
+def _v4_add_search_indexes(conn: Connection) -> None:
+    """为管理端搜索添加姓名索引和邮箱域名表达式索引"""
+    users = Table("users", MetaData(), autoload_with=conn)
+    Index("ix_users_name", users.c.name).create(conn)
+    # 表达式必须与 model.EMAIL_DOMAIN 保持一致
+    conn.execute(text(
+        "CREATE INDEX ix_users_email_domain ON users "
+        "(substr(email_normalized, instr(email_normalized, '@') + 1))"
+    ))
+
+
+def _v5_create_refresh_tokens(conn: Connection) -> None:
+    """创建刷新令牌表"""
+    metadata = MetaData()
+    # 只用于解析外键，不反射users表（表达式索引无法反射，会产生警告）
+    Table("users", metadata, Column("id", Integer, primary_key=True))
+    refresh_tokens = Table(
+        "refresh_tokens",
+        metadata,
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, comment="所属用户"),
+        Column("family_id", String(32), nullable=False, comment="同一次登录轮换出的令牌共用一个family"),
+        Column("token_hash", String(64), nullable=False, comment="令牌的sha256摘要"),
+        Column("expires_at", DateTime(timezone=True), nullable=False, comment="过期时间（UTC）"),
+        Column("created_at", DateTime(timezone=True), server_default=func.now(), comment="创建时间"),
+        Column("revoked_at", DateTime(timezone=True), nullable=True, comment="吊销时间（轮换、登出或修改密码）"),
+    )
+    Index("ix_refresh_tokens_user_id", refresh_tokens.c.user_id)
+    Index("ix_refresh_tokens_family_id", refresh_tokens.c.family_id)
+    Index("ix_refresh_tokens_token_hash", refresh_tokens.c.token_hash, unique=True)
+    refresh_tokens.create(conn)
+
+
+def _v6_add_token_version(conn: Connection) -> None:
+    """添加令牌版本列，已有用户从0开始"""
+    conn.execute(text(
+        "ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"
+    ))
+
+
+# 所有迁移，按版本号顺序执行
+MIGRATIONS: List[Migration] = [
+    Migration(1, "创建users表", _v1_create_users),
+    Migration(2, "添加 (is_active, id)、created_at、age 索引", _v2_add_query_indexes),
+    Migration(3, "添加规范化邮箱列 email_normalized", _v3_add_email_normalized),
+    Migration(4, "添加姓名索引和邮箱域名表达式索引", _v4_add_search_indexes),
+    Migration(5, "创建刷新令牌表 refresh_tokens", _v5_create_refresh_tokens),
+    Migration(6, "添加令牌版本列 token_version", _v6_add_token_version),
+]
+
+
+def current_version(conn: Connection) -> int:
+    """返回数据库当前的结构版本，未做过迁移时返回0"""
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def _record(conn: Connection, migration: Migration) -> None:
+    conn.execute(schema_version.insert().values(
+        version=migration.version,
+        description=migration.description,
+        applied_at=datetime.now(timezone.utc),
+    ))
+
+
+def migrate(bind: Engine) -> List[int]:
+    """
+    执行所有未执行的迁移
+
+    迁移体系引入前用create_all建好的数据库会被识别为版本1，不会重建users表。
+    开启 USER_SEARCH_FTS 时，迁移完成后还会建立（或补建）FTS5搜索索引
+
+    Args:
+        bind: 同步数据库引擎
+
+    Returns:
+        本次执行的迁移版本号列表
+    """
+    with bind.begin() as conn:
+        _version_metadata.create_all(conn)
+        version = current_version(conn)
+        if version == 0 and inspect(conn).has_table("users"):
+            _record(conn, MIGRATIONS[0])
+            version = MIGRATIONS[0].version
+
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        # 每个迁移单独一个事务，失败时只回滚当前这一步
+        with bind.begin() as conn:
+            migration.upgrade(conn)
+            _record(conn, migration)
+        applied.append(migration.version)
+
+    if config.USER_SEARCH_FTS and bind.dialect.name == "sqlite":
+        with bind.begin() as conn:
+            ensure_fts_index(conn)
+    return applied
+
+
+def reset_database(bind: Engine) -> List[int]:
+    """
+    删除所有表后从头迁移（仅用于初始化测试数据）
+
+    Args:
+        bind: 同步数据库引擎
+
+    Returns:
+        执行的迁移版本号列表
+    """
+    with bind.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+    Base.metadata.drop_all(bind=bind)
+    _version_metadata.drop_all(bind=bind)
+    return migrate(bind)
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    applied = migrate(engine)
+    with engine.connect() as connection:
+        print(f"当前数据库结构版本: {current_version(connection)}")
+    print(f"本次执行的迁移: {applied or '无'}")
@@ -1,10 +1,25 @@
 """
 数据库ORM模型
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index, literal_column
+from sqlalchemy.orm import validates
 from sqlalchemy.sql import func
 from .database import Base
 
+
+def normalize_email(email: str) -> str:
+    """
+    规范化邮箱：去掉首尾空白并转为小写
+    
+    所有按邮箱查找和查重的地方都应使用规范化后的值，
+    这样大小写不同的同一邮箱不会被重复注册
+    """
+    return email.strip().lower()
+
+
 class UserModel(Base):
     """用户数据库模型"""
     __tablename__ = "users"
@@ -12,12 +27,109 @@ class UserModel(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String(100), nullable=False, comment="用户姓名")
     email = Column(String(255), unique=True, nullable=False, index=True, comment="用户邮箱")
+    email_normalized = Column(String(255), unique=True, nullable=False, index=True, comment="规范化邮箱（去空白、小写），用于查找和查重")
     password_hash = Column(String(255), nullable=False, comment="密码哈希")
     age = Column(Integer, nullable=True, comment="用户年龄")
     is_active = Column(Boolean, default=True, nullable=False, comment="是否激活")
+    token_version = Column(Integer, default=0, server_default="0", nullable=False, comment="令牌版本，递增后此前签发的访问令牌全部失效")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
     
+    # 与 db/migrations.py 中的迁移保持一致
+    __table_args__ = (
+        Index("ix_users_is_active_id", "is_active", "id"),
+        Index("ix_users_created_at", "created_at"),
+        Index("ix_users_age", "age"),
+        Index("ix_users_name", "name"),
+    )
+    
+    @validates("email")
+    def _sync_email_normalized(self, key, value):
+        """设置email时同步更新email_normalized"""
+        self.email_normalized = normalize_email(value)
+        return value
+    
     def __repr__(self):
         return f"<User(id={self.id}, name='{self.name}', email='{self.email}')>"
 
+
+# 邮箱域名（@之后的部分）的SQL表达式
+# 常量必须以字面量写入SQL，按域名筛选的条件与索引表达式完全一致时SQLite才会使用索引
+EMAIL_DOMAIN = func.substr(
+    UserModel.email_normalized,
+    func.instr(UserModel.email_normalized, literal_column("'@'")) + literal_column("1")
+)
+Index("ix_users_email_domain", EMAIL_DOMAIN)
+
+
+class RefreshTokenModel(Base):
+    """
+    刷新令牌
+
+    只保存令牌的sha256摘要；每次刷新都会吊销旧令牌并在同一个family中签发新令牌，
+    已吊销的令牌再次出现说明被盗用，整个family随之吊销
+    """
+    __tablename__ = "refresh_tokens"
+    # 登录和刷新时的令牌簿记不是用户数据的写入，不触发写后读粘滞
+    __read_after_write__ = False
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True, comment="所属用户")
+    family_id = Column(String(32), nullable=False, index=True, comment="同一次登录轮换出的令牌共用一个family")
+    token_hash = Column(String(64), unique=True, nullable=False, index=True, comment="令牌的sha256摘要")
+    expires_at = Column(DateTime(timezone=True), nullable=False, comment="过期时间（UTC）")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    revoked_at = Column(DateTime(timezone=True), nullable=True, comment="吊销时间（轮换、登出或修改密码）")
+    
+    def __repr__(self):
+        return f"<RefreshToken(id={self.id}, user_id={self.user_id}, family_id='{self.family_id}')>"
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    用户只读快照
+
+    与数据库会话无关，可以安全地放入缓存并在请求之间共享
+    """
+    id: int
+    name: str
+    email: str
+    age: Optional[int]
+    is_active: bool
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    token_version: int = 0
+
+    @classmethod
+    def from_row(cls, row) -> "UserSnapshot":
+        """从按 USER_SNAPSHOT_COLUMNS 查询出的行创建快照（多出的列会被忽略）"""
+        return cls(*row[:len(USER_SNAPSHOT_COLUMNS)])
+
+    @classmethod
+    def from_model(cls, user: UserModel) -> "UserSnapshot":
+        """从ORM对象创建快照"""
+        return cls(
+            id=user.id,
+            name=user.name,
+            email=user.email,
+            age=user.age,
+            is_active=user.is_active,
+            created_at=user.created_at,
+            updated_at=user.updated_at,
+            token_version=user.token_version,
+        )
+
+
+# 创建快照需要的列，顺序与 UserSnapshot 的字段一致（不包含密码哈希）
+USER_SNAPSHOT_COLUMNS = (
+    UserModel.id,
+    UserModel.name,
+    UserModel.email,
+    UserModel.age,
+    UserModel.is_active,
+    UserModel.created_at,
+    UserModel.updated_at,
+    UserModel.token_version,
+)
+USER_SNAPSHOT_FIELDS = tuple(column.key for column in USER_SNAPSHOT_COLUMNS)
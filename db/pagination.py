@@ -0,0 +1,43 @@
+"""
+游标分页工具
+"""
+import base64
+import binascii
+import json
+
+
+def encode_cursor(values: dict) -> str:
+    """
+    把上一页最后一行的排序键编码成不透明的游标字符串
+    
+    Args:
+        values: 排序键，例如 {"id": 100}
+        
+    Returns:
+        URL安全的游标字符串
+    """
+    raw = json.dumps(values, separators=(",", ":"), sort_keys=True).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    解码游标字符串
+    
+    Args:
+        cursor: encode_cursor生成的游标
+        
+    Returns:
+        排序键字典
+        
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise ValueError("无效的分页游标") from exc
+    if not isinstance(values, dict):
+        raise ValueError("无效的分页游标")
+    return values
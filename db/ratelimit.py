@@ -0,0 +1,195 @@
+"""
+登录限流
+
+每次登录都要做一次bcrypt校验，撞库脚本很容易把CPU占满。
+这里在查询数据库和校验密码之前先检查两类计数：
+- 按客户端IP：每个窗口内的登录请求数（无论成功与否）
+- 按邮箱：每个窗口内的登录尝试次数，登录成功后清零
+
+邮箱的尝试在查询数据库之前就计入（原子的 hit），而不是等密码校验失败后再记录：
+否则同一邮箱的并发请求都能在第一次失败被记录之前通过检查，每个都做一次bcrypt校验。
+
+计数使用滑动窗口计数器（当前窗口计数 + 上一个窗口计数按剩余比例折算），每个键只占常数内存。
+存储通过 RateLimitBackend 接口抽象，默认是进程内的有界LRU存储；
+多进程或多实例部署时可以实现基于Redis等共享存储的后端并注册到 BACKENDS。
+"""
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional, Type
+from fastapi import HTTPException, status
+from . import config
+
+
+class RateLimitBackend(ABC):
+    """限流计数存储接口（方法都是异步的，便于接入网络存储）"""
+
+    @abstractmethod
+    async def hit(self, key: str, limit: int, window: float) -> Optional[float]:
+        """
+        计一次数并检查是否超限
+
+        Args:
+            key: 计数键
+            limit: 每个窗口允许的次数
+            window: 窗口秒数
+
+        Returns:
+            未超限返回None（并计入本次）；已超限返回建议等待的秒数（不计入）
+        """
+
+    @abstractmethod
+    async def reset(self, key: str) -> None:
+        """清零计数"""
+
+
+class MemoryBackend(RateLimitBackend):
+    """
+    进程内滑动窗口计数器（有界LRU，线程安全）
+
+    Args:
+        max_keys: 最多保存的键数，超过后淘汰最久未使用的键
+    """
+
+    def __init__(self, max_keys: int = config.RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        # key -> [当前窗口起点, 当前窗口计数, 上一个窗口计数]
+        self._data: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _slot(self, key: str, window: float, now: float) -> list:
+        start = math.floor(now / window) * window
+        slot = self._data.get(key)
+        if slot is None:
+            slot = self._data[key] = [start, 0, 0]
+            while len(self._data) > self.max_keys:
+                self._data.popitem(last=False)
+        elif slot[0] != start:
+            # 进入新窗口：紧邻的上一个窗口计数保留用于折算，更早的直接丢弃
+            slot[2] = slot[1] if start - slot[0] == window else 0
+            slot[0], slot[1] = start, 0
+        self._data.move_to_end(key)
+        return slot
+
+    @staticmethod
+    def _retry_after(slot: list, limit: int, window: float, now: float) -> Optional[float]:
+        elapsed = now - slot[0]
+        estimate = slot[2] * (1 - elapsed / window) + slot[1]
+        if estimate < limit:
+            return None
+        if slot[1] >= limit:
+            # 当前窗口已经用完，至少要等到下一个窗口
+            return window - elapsed
+        # 等上一个窗口的折算部分衰减到刚好低于上限
+        needed = (estimate - limit) / slot[2] * window if slot[2] else 0.0
+        return min(max(needed, 1.0), window - elapsed)
+
+    async def hit(self, key: str, limit: int, window: float) -> Optional[float]:
+        now = time.time()
+        with self._lock:
+            slot = self._slot(key, window, now)
+            retry_after = self._retry_after(slot, limit, window, now)
+            if retry_after is None:
+                slot[1] += 1
+            return retry_after
+
+    async def reset(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# 可用的存储后端：名称 -> 类（实现共享存储后端后在这里注册）
+BACKENDS: Dict[str, Type[RateLimitBackend]] = {
+    "memory": MemoryBackend,
+}
+
+
+def create_backend(name: str) -> RateLimitBackend:
+    """
+    按名称创建限流存储
+
+    Raises:
+        ValueError: 未注册的存储名称
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"不支持的限流存储: {name}")
+    return BACKENDS[name]()
+
+
+class LoginRateLimiter:
+    """
+    登录限流器
+
+    Args:
+        backend: 计数存储
+        ip_limit / ip_window: 每个IP每个窗口允许的登录请求数 / 窗口秒数
+        email_limit / email_window: 每个邮箱每个窗口允许的登录尝试次数 / 窗口秒数
+        enabled: 为False时不做任何限制
+    """
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        ip_limit: int,
+        ip_window: float,
+        email_limit: int,
+        email_window: float,
+        enabled: bool = True
+    ):
+        self.backend = backend
+        self.ip_limit = ip_limit
+        self.ip_window = ip_window
+        self.email_limit = email_limit
+        self.email_window = email_window
+        self.enabled = enabled
+
+    @staticmethod
+    def _reject(retry_after: float) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="登录尝试过于频繁，请稍后重试",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    async def check(self, ip: Optional[str], email_normalized: str) -> None:
+        """
+        登录前检查并计入本次尝试（在查询数据库和校验密码之前调用）
+
+        Args:
+            ip: 客户端IP，未知时为None
+            email_normalized: 规范化邮箱
+
+        Raises:
+            HTTPException: 429，超出IP请求数或邮箱尝试次数限制
+        """
+        if not self.enabled:
+            return
+        # 先按IP计数：被IP限流拒绝的请求不消耗该邮箱的次数
+        if ip is not None:
+            retry_after = await self.backend.hit(f"login:ip:{ip}", self.ip_limit, self.ip_window)
+            if retry_after is not None:
+                raise self._reject(retry_after)
+        retry_after = await self.backend.hit(f"login:email:{email_normalized}", self.email_limit, self.email_window)
+        if retry_after is not None:
+            raise self._reject(retry_after)
+
+    async def record_success(self, email_normalized: str) -> None:
+        """登录成功后清零该邮箱的尝试次数"""
+        if self.enabled:
+            await self.backend.reset(f"login:email:{email_normalized}")
+
+
+# 全局登录限流器
+login_rate_limiter = LoginRateLimiter(
+    backend=create_backend(config.RATE_LIMIT_BACKEND),
+    ip_limit=config.LOGIN_RATE_LIMIT_IP,
+    ip_window=config.LOGIN_RATE_LIMIT_IP_WINDOW_SECONDS,
+    email_limit=config.LOGIN_RATE_LIMIT_EMAIL,
+    email_window=config.LOGIN_RATE_LIMIT_EMAIL_WINDOW_SECONDS,
+    enabled=config.RATE_LIMIT_ENABLED,
+)
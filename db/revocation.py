@@ -0,0 +1,105 @@
+"""
+访问令牌吊销列表
+
+访问令牌有效期很短，吊销信息只需要保留到令牌自然过期为止，因此放在进程内存中：
+- 按 jti 吊销单个令牌（登出），条目在令牌的exp时刻淘汰
+- 按用户设置截止时间（修改密码），该时间之前签发的令牌全部失效，
+  条目保留一个访问令牌有效期后淘汰
+
+get_current_user 每个请求只做一次字典查找，不访问数据库。
+
+注意：吊销列表是进程内的，多进程部署时需要各进程共享（例如换成Redis），
+进程重启后列表清空，已吊销但未过期的访问令牌会重新生效到过期为止（最多一个访问令牌有效期）
+"""
+import heapq
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from . import config
+
+
+class RevocationList:
+    """
+    线程安全的令牌吊销列表
+
+    Args:
+        user_cutoff_ttl: 用户截止时间保留的秒数（应不小于访问令牌有效期）
+    """
+
+    def __init__(self, user_cutoff_ttl: float):
+        self.user_cutoff_ttl = user_cutoff_ttl
+        self._jtis: Dict[str, float] = {}
+        self._user_cutoffs: Dict[int, float] = {}
+        # (淘汰时间, 类型, 键)，按淘汰时间出堆
+        self._expiry: List[Tuple[float, str, object]] = []
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= now:
+            expires_at, kind, key = heapq.heappop(expiry)
+            if kind == "jti":
+                if self._jtis.get(key) == expires_at:
+                    del self._jtis[key]
+            else:
+                # 同一用户可能设置过多次截止时间，以最新的为准
+                cutoff = self._user_cutoffs.get(key)
+                if cutoff is not None and cutoff + self.user_cutoff_ttl <= now:
+                    del self._user_cutoffs[key]
+
+    def revoke(self, jti: str, exp: float) -> None:
+        """
+        吊销单个访问令牌
+
+        Args:
+            jti: 令牌ID
+            exp: 令牌过期时间戳，到期后条目自动淘汰
+        """
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            if exp <= now:
+                return
+            self._jtis[jti] = exp
+            heapq.heappush(self._expiry, (exp, "jti", jti))
+
+    def revoke_user(self, user_id: int, before: Optional[float] = None) -> None:
+        """
+        吊销用户在某个时间之前签发的所有访问令牌
+
+        Args:
+            user_id: 用户ID
+            before: 截止时间戳，默认为当前时间
+        """
+        now = time.time()
+        cutoff = now if before is None else before
+        with self._lock:
+            self._evict(now)
+            self._user_cutoffs[user_id] = max(cutoff, self._user_cutoffs.get(user_id, 0.0))
+            heapq.heappush(self._expiry, (cutoff + self.user_cutoff_ttl, "user", user_id))
+
+    def is_revoked(self, payload: dict) -> bool:
+        """
+        令牌是否已被吊销
+
+        Args:
+            payload: 已验签的令牌payload（使用 jti、sub、iat）
+        """
+        jti = payload.get("jti")
+        if jti is not None and jti in self._jtis:
+            return True
+        if self._user_cutoffs:
+            try:
+                cutoff = self._user_cutoffs.get(int(payload.get("sub")))
+            except (TypeError, ValueError):
+                return False
+            if cutoff is not None and float(payload.get("iat") or 0) <= cutoff:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._jtis) + len(self._user_cutoffs)
+
+
+# 全局吊销列表
+revocation_list = RevocationList(user_cutoff_ttl=config.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
@@ -0,0 +1,286 @@
+"""
+管理端用户搜索
+
+按条件组合查询，每个筛选条件和排序键都对应一个索引：
+- 姓名前缀：范围查询 name >= p AND name < p + U+10FFFF，使用 ix_users_name（区分大小写）
+- 邮箱域名：使用表达式索引 ix_users_email_domain
+- 年龄范围：ix_users_age；激活状态：ix_users_is_active_id；注册时间范围：ix_users_created_at
+- 关键字子串：启用 USER_SEARCH_FTS 时使用FTS5三元组索引 users_fts，否则退化为LIKE全表扫描
+
+分页使用 (排序键, id) 游标，翻页深度不影响性能
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional, Sequence
+from sqlalchemy import DateTime, Integer, String, and_, or_, select, text, type_coerce
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import config
+from .model import EMAIL_DOMAIN, UserModel, normalize_email
+from .pagination import encode_cursor, decode_cursor
+from .serialization import USER_RESPONSE_COLUMNS, user_rows_to_dicts
+
+# 允许的排序键：名称 -> 列
+SORT_KEYS = {
+    "id": UserModel.id,
+    "name": UserModel.name,
+    "age": UserModel.age,
+    "created_at": UserModel.created_at,
+}
+SORT_ORDERS = ("asc", "desc")
+
+# 比任何字符都大的码点，用于把前缀匹配改写成范围查询
+_PREFIX_UPPER_BOUND = "\U0010ffff"
+
+# FTS5三元组分词器至少需要3个字符才能走索引
+FTS_MIN_QUERY_LENGTH = 3
+FTS_TABLE = "users_fts"
+
+# FTS5外部内容表和同步触发器（users的增删改都会同步到users_fts）
+_FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, email_normalized, content='users', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, email_normalized) "
+    "VALUES (new.id, new.name, new.email_normalized); END",
+    f"CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, email_normalized) "
+    "VALUES ('delete', old.id, old.name, old.email_normalized); END",
+    f"CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF name, email_normalized ON users BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, email_normalized) "
+    "VALUES ('delete', old.id, old.name, old.email_normalized); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, email_normalized) "
+    "VALUES (new.id, new.name, new.email_normalized); END",
+)
+_FTS_TRIGGERS = ("users_fts_insert", "users_fts_delete", "users_fts_update")
+
+
+def ensure_fts_index(conn: Connection) -> bool:
+    """
+    建立FTS5索引和同步触发器（可重复执行）
+
+    触发器缺失（首次启用，或users表被重建过）时会用现有数据重建索引
+
+    Args:
+        conn: 同步数据库连接（需处于事务中）
+
+    Returns:
+        是否重建了索引
+    """
+    existing = set(conn.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'users'")
+    ).scalars())
+    for statement in _FTS_DDL:
+        conn.execute(text(statement))
+    if existing.issuperset(_FTS_TRIGGERS):
+        return False
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return True
+
+
+@dataclass(frozen=True)
+class UserSearchFilters:
+    """搜索条件，为None的条件不参与筛选"""
+    q: Optional[str] = None
+    name_prefix: Optional[str] = None
+    email_domain: Optional[str] = None
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    is_active: Optional[bool] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+
+def _keyword_condition(q: str, use_fts: bool):
+    """关键字子串匹配姓名或邮箱"""
+    if use_fts and len(q) >= FTS_MIN_QUERY_LENGTH:
+        # 整体作为一个短语匹配，短语内的双引号需要写两次
+        phrase = '"' + q.replace('"', '""') + '"'
+        matches = text(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_query"
+        ).bindparams(fts_query=phrase).columns(rowid=Integer)
+        return UserModel.id.in_(matches)
+    return or_(UserModel.name.contains(q, autoescape=True),
+               UserModel.email_normalized.contains(q.lower(), autoescape=True))
+
+
+def _filter_conditions(filters: UserSearchFilters, use_fts: bool) -> list:
+    conditions = []
+    if filters.q:
+        conditions.append(_keyword_condition(filters.q, use_fts))
+    if filters.name_prefix:
+        conditions.append(UserModel.name >= filters.name_prefix)
+        conditions.append(UserModel.name < filters.name_prefix + _PREFIX_UPPER_BOUND)
+    if filters.email_domain:
+        conditions.append(EMAIL_DOMAIN == normalize_email(filters.email_domain).lstrip("@"))
+    if filters.min_age is not None:
+        conditions.append(UserModel.age >= filters.min_age)
+    if filters.max_age is not None:
+        conditions.append(UserModel.age <= filters.max_age)
+    if filters.is_active is not None:
+        conditions.append(UserModel.is_active == filters.is_active)
+    if filters.created_after is not None:
+        conditions.append(_sort_key(UserModel.created_at) >= _datetime_bound(filters.created_after))
+    if filters.created_before is not None:
+        conditions.append(_sort_key(UserModel.created_at) < _datetime_bound(filters.created_before))
+    return conditions
+
+
+def _datetime_bound(value: datetime) -> str:
+    """
+    把时间筛选条件转成与数据库中存储格式一致的字符串（UTC，不带时区）
+
+    server_default写入的时间形如 "YYYY-MM-DD HH:MM:SS"，直接绑定datetime会多出 ".000000"，
+    按字符串比较时恰好等于边界的行会被算错；没有微秒时省略微秒部分，两种存储格式都能正确比较
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(sep=" ", timespec="microseconds" if value.microsecond else "seconds")
+
+
+def _sort_key(column):
+    """
+    游标中保存的排序键表达式（时间范围筛选也用它比较）
+
+    SQLite中的时间是字符串，且server_default写入的值没有微秒部分，
+    把Python的datetime写回SQL比较会对不上，因此时间列直接按数据库中的原始字符串读写
+    """
+    if isinstance(column.type, DateTime):
+        return type_coerce(column, String())
+    return column
+
+
+def _cursor_position(values: dict, column) -> tuple:
+    """
+    校验游标中的排序键和ID
+
+    游标由客户端传回，内容不可信：排序键只能是None或与排序列类型一致的标量
+    （时间列为数据库中的原始字符串），ID必须是整数，否则直接绑定到SQL会出错
+
+    Returns:
+        (排序键, ID)
+
+    Raises:
+        ValueError: 游标内容无效
+    """
+    last_id = values.get("id")
+    value = values.get("key")
+    expected = str if isinstance(column.type, (String, DateTime)) else int
+    if (
+        type(last_id) is not int
+        or (value is not None and type(value) is not expected)
+        or (column is UserModel.id and value != last_id)
+    ):
+        raise ValueError("无效的分页游标")
+    return value, last_id
+
+
+def _after_cursor(column, value, last_id: int, descending: bool):
+    """
+    位于游标之后的行
+
+    SQLite升序时NULL排在最前、降序时排在最后，排序键为NULL的行也要能翻页
+    """
+    if column is UserModel.id:
+        return UserModel.id < last_id if descending else UserModel.id > last_id
+    if descending:
+        if value is None:
+            return and_(column.is_(None), UserModel.id < last_id)
+        return or_(column < value, and_(column == value, UserModel.id < last_id), column.is_(None))
+    if value is None:
+        return or_(and_(column.is_(None), UserModel.id > last_id), column.is_not(None))
+    return or_(column > value, and_(column == value, UserModel.id > last_id))
+
+
+def build_search_query(
+    filters: UserSearchFilters,
+    sort: str = "id",
+    order: str = "asc",
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    use_fts: bool = config.USER_SEARCH_FTS,
+    columns: Optional[Sequence] = None
+):
+    """
+    构造搜索查询（多取一行用来判断是否还有下一页）
+
+    每行结果为 (UserModel, sort_key)；指定columns时为 (*columns, sort_key)
+
+    Args:
+        filters: 搜索条件
+        sort: 排序键，见 SORT_KEYS
+        order: asc 或 desc
+        cursor: 上一页返回的 next_cursor
+        limit: 每页条数
+        use_fts: 关键字搜索是否使用FTS5索引
+        columns: 只查询这些列，不加载ORM对象
+
+    Returns:
+        SQLAlchemy查询
+
+    Raises:
+        ValueError: 排序键无效，或游标无效/与当前排序不一致
+    """
+    if sort not in SORT_KEYS or order not in SORT_ORDERS:
+        raise ValueError("无效的排序方式")
+    column = SORT_KEYS[sort]
+    descending = order == "desc"
+    key = _sort_key(column)
+
+    entities = tuple(columns) if columns is not None else (UserModel,)
+    query = select(*entities, key.label("sort_key")).where(*_filter_conditions(filters, use_fts))
+    if cursor is not None:
+        values = decode_cursor(cursor)
+        if values.get("sort") != sort or values.get("order") != order:
+            raise ValueError("分页游标与当前排序不一致")
+        last_value, last_id = _cursor_position(values, column)
+        query = query.where(_after_cursor(key, last_value, last_id, descending))
+
+    if sort == "id":
+        order_by = (UserModel.id.desc() if descending else UserModel.id,)
+    elif descending:
+        order_by = (column.desc(), UserModel.id.desc())
+    else:
+        order_by = (column, UserModel.id)
+    return query.order_by(*order_by).limit(limit + 1)
+
+
+async def search_users(
+    db: AsyncSession,
+    filters: UserSearchFilters,
+    sort: str = "id",
+    order: str = "asc",
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    as_dicts: bool = False
+) -> dict:
+    """
+    搜索用户
+
+    Args:
+        db: 数据库会话
+        filters / sort / order / cursor / limit: 见 build_search_query
+        as_dicts: 只查询响应需要的列，本页用户为字典而不是ORM对象
+
+    Returns:
+        {"items": 本页用户, "next_cursor": 下一页游标或None}
+
+    Raises:
+        ValueError: 排序键或游标无效
+    """
+    columns = USER_RESPONSE_COLUMNS if as_dicts else None
+    query = build_search_query(filters, sort, order, cursor, limit, columns=columns)
+    rows = (await db.execute(query)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor({
+            "sort": sort,
+            "order": order,
+            "key": last.sort_key,
+            "id": last.id if as_dicts else last[0].id,
+        })
+    items = user_rows_to_dicts(rows) if as_dicts else [user for user, _ in rows]
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,60 @@
+"""
+列表接口的行投影和快速JSON响应
+
+列表接口（/users、/users/page、/users/search）和按邮箱查找只查询 UserResponse 需要的列，
+把行直接转成字典，不创建ORM对象，也不读取密码哈希。
+默认仍由FastAPI按 response_model 逐条校验（EmailStr 会对每个邮箱重新做一次格式校验）后输出JSON；
+开启 FAST_JSON_RESPONSES 后列表接口直接用orjson编码字典并返回，跳过响应校验
+（数据来自数据库，写入时已经校验过）。
+SQLite返回的时间不带时区，输出与默认路径相同；其他数据库返回带时区的UTC时间时，
+orjson输出 +00:00 而Pydantic输出 Z，两者都是合法的ISO 8601。
+
+注意：当前版本的FastAPI在设置了 response_model 时已经由Pydantic直接输出JSON字节，
+把 default_response_class 设为 ORJSONResponse 反而会关闭这条路径（且该类已被标记为弃用），
+因此只在列表接口上返回预先编码好的响应，其余接口保持不变
+"""
+from typing import Any, List, Sequence
+from fastapi import Response
+from . import config
+from .model import UserModel
+
+try:
+    import orjson
+except ImportError:
+    # 未安装orjson时只能使用默认序列化
+    orjson = None
+
+if config.FAST_JSON_RESPONSES and orjson is None:
+    raise RuntimeError("FAST_JSON_RESPONSES 需要先安装: pip install orjson")
+
+# UserResponse 的字段对应的列（不包含密码哈希）
+# 顺序与 UserResponse 的字段顺序一致，SQLite上编码结果与默认路径逐字节相同
+USER_RESPONSE_COLUMNS = (
+    UserModel.name,
+    UserModel.email,
+    UserModel.age,
+    UserModel.id,
+    UserModel.is_active,
+    UserModel.created_at,
+    UserModel.updated_at,
+)
+USER_RESPONSE_FIELDS = tuple(column.key for column in USER_RESPONSE_COLUMNS)
+
+
+def user_rows_to_dicts(rows: Sequence[Sequence]) -> List[dict]:
+    """
+    把按 USER_RESPONSE_COLUMNS 查询出的行转成响应字典
+
+    行中多出的列（例如搜索的排序键）会被忽略
+    """
+    fields = USER_RESPONSE_FIELDS
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def json_response(content: Any, status_code: int = 200) -> Response:
+    """
+    用orjson编码的JSON响应
+
+    datetime 按 ISO 8601 输出，与Pydantic的输出一致
+    """
+    return Response(content=orjson.dumps(content), status_code=status_code, media_type="application/json")
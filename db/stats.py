@@ -0,0 +1,255 @@
+"""
+用户统计计数器
+
+/stats 不再每次执行 COUNT(*)，而是读取内存中的计数器：
+- 通过Session事件在事务提交时增量更新（新增/修改/删除用户）
+- 启动时和每隔 STATS_RECONCILE_SECONDS 秒用一次聚合查询校准
+
+注意：计数器是进程内的，多进程部署时其他进程的写入要等到下一次校准才会体现
+"""
+import asyncio
+import logging
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import case, event, func, inspect, select
+from sqlalchemy.orm import Session
+from . import config
+from .database import session_scope
+from .model import UserModel
+
+logger = logging.getLogger(__name__)
+
+# 年龄段：(名称, 下限, 上限)，上限为None表示不设上限
+AGE_BANDS = (
+    ("0-17", 0, 17),
+    ("18-24", 18, 24),
+    ("25-34", 25, 34),
+    ("35-44", 35, 44),
+    ("45-54", 45, 54),
+    ("55-64", 55, 64),
+    ("65+", 65, None),
+)
+UNKNOWN_AGE_BAND = "unknown"
+
+
+def age_band(age: Optional[int]) -> str:
+    """返回年龄所属的年龄段名称"""
+    if age is None:
+        return UNKNOWN_AGE_BAND
+    for name, low, high in AGE_BANDS:
+        if age >= low and (high is None or age <= high):
+            return name
+    return UNKNOWN_AGE_BAND
+
+
+def _age_band_expression():
+    """与age_band等价的SQL CASE表达式"""
+    whens = [
+        (UserModel.age <= high if high is not None else UserModel.age >= low, name)
+        for name, low, high in AGE_BANDS
+    ]
+    return case((UserModel.age.is_(None), UNKNOWN_AGE_BAND), *whens, else_=UNKNOWN_AGE_BAND)
+
+
+class UserCounters:
+    """线程安全的用户统计计数器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = False
+        self.total = 0
+        self.active = 0
+        self.age_bands: Counter = Counter()
+        self.created_per_day: Counter = Counter()
+        self.reconciled_at: Optional[datetime] = None
+
+    @property
+    def ready(self) -> bool:
+        """计数器是否可用（未校准或已失效时为False）"""
+        return self._ready
+
+    def invalidate(self) -> None:
+        """标记计数器失效，下次读取前需要重新校准"""
+        self._ready = False
+
+    def apply(self, delta: dict) -> None:
+        """应用一个事务的增量"""
+        with self._lock:
+            self.total += delta["total"]
+            self.active += delta["active"]
+            self.age_bands.update(delta["age_bands"])
+            self.created_per_day.update(delta["created_per_day"])
+
+    def reload(self, db: Session) -> None:
+        """
+        用聚合查询重新校准计数器（同步函数，可通过 run_sync 调用）
+
+        Args:
+            db: 同步数据库会话
+        """
+        total, active = db.execute(
+            select(func.count(), func.coalesce(func.sum(case((UserModel.is_active, 1), else_=0)), 0))
+        ).one()
+        band = _age_band_expression()
+        bands = db.execute(select(band, func.count()).group_by(band)).all()
+        day = func.date(UserModel.created_at)
+        days = db.execute(
+            select(day, func.count()).where(UserModel.created_at.is_not(None)).group_by(day)
+        ).all()
+        with self._lock:
+            self.total = total
+            self.active = active
+            self.age_bands = Counter(dict(bands))
+            self.created_per_day = Counter({str(key): count for key, count in days})
+            self.reconciled_at = datetime.now(timezone.utc)
+            self._ready = True
+
+    async def reconcile_forever(self, interval: float) -> None:
+        """后台任务：立即校准一次，之后每隔interval秒校准一次"""
+        while True:
+            try:
+                async with session_scope() as db:
+                    await db.run_sync(self.reload)
+            except Exception:
+                logger.exception("用户统计校准失败")
+            await asyncio.sleep(interval)
+
+    def snapshot(self, days: int = config.STATS_CREATED_DAYS) -> dict:
+        """
+        返回统计结果
+
+        Args:
+            days: created_per_day 返回最近多少天（UTC）
+        """
+        today = datetime.now(timezone.utc).date()
+        recent = [(today - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+        with self._lock:
+            return {
+                "total_users": self.total,
+                "active_users": self.active,
+                "inactive_users": self.total - self.active,
+                "age_bands": {
+                    name: self.age_bands.get(name, 0)
+                    for name in [band[0] for band in AGE_BANDS] + [UNKNOWN_AGE_BAND]
+                },
+                "created_per_day": {day: self.created_per_day.get(day, 0) for day in recent},
+                "reconciled_at": self.reconciled_at,
+            }
+
+
+# 全局计数器
+user_counters = UserCounters()
+
+
+# ============ Session事件：事务提交时增量更新 ============
+
+def _new_delta() -> dict:
+    return {"total": 0, "active": 0, "age_bands": Counter(), "created_per_day": Counter()}
+
+
+def _session_delta(session: Session) -> dict:
+    return session.info.setdefault("user_counter_delta", _new_delta())
+
+
+def _day_of(value) -> Optional[str]:
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return None
+
+
+def _add_row(delta: dict, values: dict, sign: int, created_day: Optional[str]) -> None:
+    delta["total"] += sign
+    if values.get("is_active", True):
+        delta["active"] += sign
+    delta["age_bands"][age_band(values.get("age"))] += sign
+    if created_day is not None:
+        delta["created_per_day"][created_day] += sign
+
+
+def _old_values(state) -> Optional[dict]:
+    """取is_active和age修改前的值，属性未加载导致无法得知时返回None"""
+    values = {}
+    for key in ("is_active", "age"):
+        history = state.attrs[key].history
+        if history.deleted:
+            values[key] = history.deleted[0]
+        elif history.unchanged:
+            values[key] = history.unchanged[0]
+        else:
+            return None
+    return values
+
+
+def _collect_flush(session: Session, flush_context) -> None:
+    """flush后根据new/dirty/deleted计算增量（此时状态仍是flush前的）"""
+    today = datetime.now(timezone.utc).date().isoformat()
+    for obj in session.new:
+        if isinstance(obj, UserModel):
+            state = inspect(obj)
+            _add_row(_session_delta(session), state.dict, 1, _day_of(state.dict.get("created_at")) or today)
+
+    for obj in session.deleted:
+        if isinstance(obj, UserModel):
+            state = inspect(obj)
+            values = _old_values(state)
+            created_day = _day_of(state.dict.get("created_at"))
+            if values is None or created_day is None:
+                session.info["user_counters_stale"] = True
+                continue
+            _add_row(_session_delta(session), values, -1, created_day)
+
+    for obj in session.dirty:
+        if not isinstance(obj, UserModel):
+            continue
+        state = inspect(obj)
+        changed = [key for key in ("is_active", "age") if state.attrs[key].history.has_changes()]
+        if not changed:
+            continue
+        old = _old_values(state)
+        if old is None:
+            session.info["user_counters_stale"] = True
+            continue
+        new = {key: state.dict.get(key) for key in ("is_active", "age")}
+        delta = _session_delta(session)
+        _add_row(delta, old, -1, None)
+        _add_row(delta, new, 1, None)
+
+
+def _collect_orm_dml(orm_execute_state) -> None:
+    """session.execute(insert(UserModel), rows) 这类批量语句不经过flush，单独统计"""
+    statement = orm_execute_state.statement
+    if getattr(getattr(statement, "table", None), "name", None) != UserModel.__tablename__:
+        return
+    session = orm_execute_state.session
+    if orm_execute_state.is_insert:
+        params = orm_execute_state.parameters
+        rows = params if isinstance(params, list) else [params or {}]
+        today = datetime.now(timezone.utc).date().isoformat()
+        for row in rows:
+            _add_row(_session_delta(session), row, 1, today)
+    elif orm_execute_state.is_update or orm_execute_state.is_delete:
+        # 批量UPDATE/DELETE的影响范围无法在内存中得知，提交后重新校准
+        session.info["user_counters_stale"] = True
+
+
+def _apply_on_commit(session: Session) -> None:
+    delta = session.info.pop("user_counter_delta", None)
+    if session.info.pop("user_counters_stale", False):
+        user_counters.invalidate()
+    elif delta is not None:
+        user_counters.apply(delta)
+
+
+def _discard_on_rollback(session: Session) -> None:
+    session.info.pop("user_counter_delta", None)
+    session.info.pop("user_counters_stale", None)
+
+
+event.listen(Session, "after_flush", _collect_flush)
+event.listen(Session, "do_orm_execute", _collect_orm_dml)
+event.listen(Session, "after_commit", _apply_on_commit)
+event.listen(Session, "after_rollback", _discard_on_rollback)
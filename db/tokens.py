@@ -0,0 +1,147 @@
+"""
+刷新令牌
+
+刷新令牌是不透明的随机字符串，数据库中只保存sha256摘要（令牌本身熵足够高，不需要慢哈希）。
+每次刷新都会轮换：旧令牌被吊销，同一family中签发新令牌。
+已吊销的令牌再次被使用说明它被盗用了，此时吊销整个family，攻击者和合法客户端都需要重新登录。
+"""
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import config
+from .model import RefreshTokenModel
+
+
+class RefreshTokenError(Exception):
+    """刷新令牌无效、已过期或已被吊销"""
+
+
+def _utcnow() -> datetime:
+    # 与 create_access_token 一致，数据库中保存不带时区的UTC时间
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def hash_refresh_token(token: str) -> str:
+    """刷新令牌的sha256摘要（十六进制）"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def create_refresh_token(db: AsyncSession, user_id: int, family_id: Optional[str] = None) -> str:
+    """
+    签发刷新令牌（调用方负责提交事务）
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+        family_id: 轮换时沿用旧令牌的family，登录时为None（新建family）
+
+    Returns:
+        刷新令牌明文（只在这里出现一次）
+    """
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshTokenModel(
+        user_id=user_id,
+        family_id=family_id or uuid.uuid4().hex,
+        token_hash=hash_refresh_token(token),
+        expires_at=_utcnow() + timedelta(days=config.REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return token
+
+
+async def rotate_refresh_token(db: AsyncSession, token: str) -> Tuple[int, str]:
+    """
+    用刷新令牌换一个新的刷新令牌（调用方负责提交事务）
+
+    Args:
+        db: 数据库会话
+        token: 客户端提交的刷新令牌
+
+    Returns:
+        (用户ID, 新的刷新令牌)
+
+    Raises:
+        RefreshTokenError: 令牌不存在、已过期或已被使用过（此时整个family会被吊销并提交）
+    """
+    stored = await db.scalar(
+        select(RefreshTokenModel).where(RefreshTokenModel.token_hash == hash_refresh_token(token))
+    )
+    if stored is None:
+        raise RefreshTokenError("刷新令牌无效")
+
+    now = _utcnow()
+    # 比较并交换：并发使用同一个令牌时只有一个请求能轮换成功
+    result = await db.execute(
+        update(RefreshTokenModel)
+        .where(
+            RefreshTokenModel.id == stored.id,
+            RefreshTokenModel.revoked_at.is_(None),
+            RefreshTokenModel.expires_at > now,
+        )
+        .values(revoked_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        if stored.revoked_at is not None or await _is_revoked(db, stored.id):
+            await revoke_refresh_family(db, stored.family_id)
+            await db.commit()
+            raise RefreshTokenError("刷新令牌已被使用过，该登录会话已全部失效")
+        raise RefreshTokenError("刷新令牌已过期")
+
+    new_token = await create_refresh_token(db, stored.user_id, stored.family_id)
+    return stored.user_id, new_token
+
+
+async def _is_revoked(db: AsyncSession, token_id: int) -> bool:
+    revoked_at = await db.scalar(
+        select(RefreshTokenModel.revoked_at).where(RefreshTokenModel.id == token_id)
+    )
+    return revoked_at is not None
+
+
+async def revoke_refresh_family(db: AsyncSession, family_id: str) -> None:
+    """吊销同一family的所有刷新令牌（调用方负责提交事务）"""
+    await db.execute(
+        update(RefreshTokenModel)
+        .where(RefreshTokenModel.family_id == family_id, RefreshTokenModel.revoked_at.is_(None))
+        .values(revoked_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def revoke_refresh_token(db: AsyncSession, token: str, user_id: int) -> None:
+    """
+    登出：吊销该刷新令牌所在的整个family（调用方负责提交事务）
+
+    只处理属于user_id的令牌，不存在时忽略
+    """
+    family_id = await db.scalar(
+        select(RefreshTokenModel.family_id).where(
+            RefreshTokenModel.token_hash == hash_refresh_token(token),
+            RefreshTokenModel.user_id == user_id,
+        )
+    )
+    if family_id is not None:
+        await revoke_refresh_family(db, family_id)
+
+
+async def revoke_user_refresh_tokens(db: AsyncSession, user_id: int) -> None:
+    """吊销用户的所有刷新令牌（修改密码时，调用方负责提交事务）"""
+    await db.execute(
+        update(RefreshTokenModel)
+        .where(RefreshTokenModel.user_id == user_id, RefreshTokenModel.revoked_at.is_(None))
+        .values(revoked_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def delete_user_refresh_tokens(db: AsyncSession, user_id: int) -> None:
+    """删除用户的所有刷新令牌（删除用户时，SQLite默认不执行外键级联）"""
+    await db.execute(
+        delete(RefreshTokenModel)
+        .where(RefreshTokenModel.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    )
@@ -1,43 +1,108 @@
 """
 FastAPI用户管理系统 - JWT认证版本
 """
-from fastapi import FastAPI, HTTPException, Depends, status
+from contextlib import asynccontextmanager
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Depends, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Dict, List, Optional
+import asyncio
+import json
 import sys
 import os
 
 # 添加父目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from db.database import engine, get_db, Base
-from db.model import UserModel
+from db.database import engine, get_async_db, get_read_db, dispose_engines
+from db.migrations import migrate
+from db.model import USER_SNAPSHOT_FIELDS, UserModel, UserSnapshot, normalize_email
+from db.cache import user_cache, token_cache, token_version_cache
+from db.hashing import password_hasher
+from db.pagination import encode_cursor, decode_cursor
+from db.export import EXPORT_FORMATS, export_users
+from db.bulk import import_users, parse_ndjson
+from db.search import SORT_KEYS, UserSearchFilters, search_users
+from db.serialization import USER_RESPONSE_COLUMNS, json_response, user_rows_to_dicts
+from db.stats import user_counters
+from db.bloom import email_filter
+from db.metrics import MetricsMiddleware, render_metrics
+from db.ratelimit import login_rate_limiter
+from db.keys import key_ring
+from db.revocation import revocation_list
+from db.tokens import (
+    RefreshTokenError,
+    create_refresh_token,
+    rotate_refresh_token,
+    revoke_refresh_token,
+    revoke_user_refresh_tokens,
+    delete_user_refresh_tokens
+)
+from db.config import (
+    BULK_IMPORT_MAX_ROWS,
+    BULK_IMPORT_MAX_BYTES,
+    STATS_RECONCILE_SECONDS,
+    EMAIL_FILTER_ENABLED,
+    EMAIL_FILTER_CHECK_SECONDS,
+    FAST_JSON_RESPONSES,
+    METRICS_ENABLED
+)
 from db.auth import (
-    get_password_hash,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    Principal,
+    get_password_hash_async,
     authenticate_user,
     create_access_token,
-    get_current_user,
-    get_current_active_user
+    access_token_claims,
+    get_access_token_payload,
+    get_current_principal,
+    get_current_active_user,
+    get_user_snapshot
 )
 from schemas import (
     UserRegister,
     UserLogin,
     UserUpdate,
     UserResponse,
+    UserPage,
     Token,
+    RefreshRequest,
+    LogoutRequest,
     MessageResponse,
-    UserStats
+    UserStats,
+    CacheStats,
+    EmailFilterStats,
+    BulkImportResult
 )
 
-# 创建数据库表
-Base.metadata.create_all(bind=engine)
+# 执行数据库结构迁移（创建表和索引，不会删除已有数据）
+migrate(engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动统计校准和邮箱过滤器维护任务，退出时关闭密码哈希执行器和数据库引擎"""
+    tasks = [asyncio.create_task(user_counters.reconcile_forever(STATS_RECONCILE_SECONDS))]
+    if EMAIL_FILTER_ENABLED:
+        tasks.append(asyncio.create_task(email_filter.maintain_forever(EMAIL_FILTER_CHECK_SECONDS)))
+    yield
+    for task in tasks:
+        task.cancel()
+    password_hasher.shutdown()
+    await dispose_engines()
+
 
 app = FastAPI(
     title="用户管理系统（JWT认证版）",
     description="基于SQLite数据库和JWT认证的用户管理API",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # 配置CORS
@@ -49,6 +114,10 @@ app.add_middleware(
     allow_headers=["*"],  # 允许所有请求头
 )
 
+# 请求耗时和SQL次数统计（最后添加，位于最外层，统计包括CORS在内的完整耗时）
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 
 @app.get("/", response_model=MessageResponse)
 def root():
@@ -62,7 +131,7 @@ def root():
 # ============ 认证相关接口 ============
 
 @app.post("/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED, tags=["认证"])
-def register(user: UserRegister, db: Session = Depends(get_db)):
+async def register(user: UserRegister, db: AsyncSession = Depends(get_async_db)):
     """
     用户注册
     
@@ -71,42 +140,90 @@ def register(user: UserRegister, db: Session = Depends(get_db)):
     - **password**: 密码（6-50个字符）
     - **age**: 用户年龄（可选）
     """
-    # 检查邮箱是否已存在
-    existing_user = db.query(UserModel).filter(UserModel.email == user.email).first()
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="该邮箱已被注册"
+    # 检查邮箱是否已存在（布隆过滤器判定一定不存在时跳过查询）
+    email_normalized = normalize_email(user.email)
+    if email_filter.might_contain(email_normalized):
+        existing_user = await db.scalar(
+            select(UserModel.id).where(UserModel.email_normalized == email_normalized)
         )
+        if existing_user:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="该邮箱已被注册"
+            )
     
     # 创建新用户
     db_user = UserModel(
         name=user.name,
         email=user.email,
-        password_hash=get_password_hash(user.password),
+        password_hash=await get_password_hash_async(user.password),
         age=user.age,
         is_active=True
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # 并发注册或其他进程刚注册了同一邮箱，由唯一索引兜底
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="该邮箱已被注册"
+        )
+    # 只刷新响应需要的列，不把刚写入的密码哈希再读回来
+    await db.refresh(db_user, USER_SNAPSHOT_FIELDS)
     
     return db_user
 
 
+def _client_ip(request: Request) -> Optional[str]:
+    """客户端IP（部署在反向代理后面时需要用 uvicorn --proxy-headers 启动）"""
+    return request.client.host if request.client else None
+
+
+async def _issue_tokens(db: AsyncSession, user, refresh_token: Optional[str] = None) -> dict:
+    """
+    签发访问令牌并提交事务，返回Token响应
+
+    Args:
+        db: 数据库会话
+        user: 登录用户
+        refresh_token: 轮换得到的新刷新令牌；为None时（登录）新建一个登录会话
+    """
+    if refresh_token is None:
+        refresh_token = await create_refresh_token(db, user.id)
+    await db.commit()
+    return {
+        "access_token": create_access_token(data=access_token_claims(user)),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "refresh_token": refresh_token,
+        "user": user
+    }
+
+
 @app.post("/auth/login", response_model=Token, tags=["认证"])
-def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(
+    user_credentials: UserLogin,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     用户登录
     
     - **email**: 用户邮箱
     - **password**: 密码
     
-    返回JWT访问令牌
+    返回JWT访问令牌和刷新令牌。同一IP请求过多或同一邮箱尝试过多时返回429
     """
+    # 限流检查在查询数据库和校验密码之前
+    email_normalized = normalize_email(user_credentials.email)
+    await login_rate_limiter.check(_client_ip(request), email_normalized)
+    
     # 验证用户凭证
-    user = authenticate_user(db, user_credentials.email, user_credentials.password)
+    user = await authenticate_user(db, user_credentials.email, user_credentials.password, background_tasks)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -120,20 +237,18 @@ def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
             detail="账号已被禁用"
         )
     
-    # 创建访问令牌
-    access_token = create_access_token(data={"sub": str(user.id)})
+    await login_rate_limiter.record_success(email_normalized)
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": user
-    }
+    # 创建访问令牌和刷新令牌
+    return await _issue_tokens(db, user)
 
 
 @app.post("/auth/login/form", response_model=Token, tags=["认证"])
-def login_form(
+async def login_form(
+    request: Request,
+    background_tasks: BackgroundTasks,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     用户登录（OAuth2表单格式）
@@ -141,8 +256,13 @@ def login_form(
     用于Swagger UI的"Authorize"功能
     - **username**: 用户邮箱
     - **password**: 密码
+    
+    限流规则与 `/auth/login` 相同
     """
-    user = authenticate_user(db, form_data.username, form_data.password)
+    email_normalized = normalize_email(form_data.username)
+    await login_rate_limiter.check(_client_ip(request), email_normalized)
+    
+    user = await authenticate_user(db, form_data.username, form_data.password, background_tasks)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -156,19 +276,82 @@ def login_form(
             detail="账号已被禁用"
         )
     
-    access_token = create_access_token(data={"sub": str(user.id)})
+    await login_rate_limiter.record_success(email_normalized)
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": user
-    }
+    return await _issue_tokens(db, user)
+
+
+@app.post("/auth/refresh", response_model=Token, tags=["认证"])
+async def refresh(
+    body: RefreshRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    用刷新令牌换取新的访问令牌
+    
+    - **refresh_token**: 登录或上次刷新时返回的刷新令牌
+    
+    每次刷新都会返回新的刷新令牌，旧令牌立即失效；
+    已失效的刷新令牌再次被使用时，该登录会话的所有刷新令牌都会被吊销
+    """
+    try:
+        user_id, new_refresh_token = await rotate_refresh_token(db, body.refresh_token)
+    except RefreshTokenError as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    user = await get_user_snapshot(db, user_id)
+    if user is None or not user.is_active:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="用户不存在或已被禁用",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    return await _issue_tokens(db, user, new_refresh_token)
+
+
+@app.post("/auth/logout", status_code=status.HTTP_204_NO_CONTENT, tags=["认证"])
+async def logout(
+    body: Optional[LogoutRequest] = None,
+    payload: dict = Depends(get_access_token_payload),
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    登出
+    
+    需要JWT认证。当前访问令牌立即失效；
+    同时提交 **refresh_token** 时，该刷新令牌所在的登录会话也会被吊销
+    """
+    if payload.get("jti") and payload.get("exp"):
+        revocation_list.revoke(payload["jti"], float(payload["exp"]))
+    if body is not None and body.refresh_token:
+        await revoke_refresh_token(db, body.refresh_token, principal.id)
+        await db.commit()
+    return None
+
+
+@app.get("/.well-known/jwks.json", tags=["认证"])
+async def jwks():
+    """
+    公开的JWT验签公钥（JWK Set）
+    
+    其他服务按令牌头部的kid选择公钥即可在本地验签，不需要共享签名密钥。
+    使用HS*共享密钥时返回空列表
+    """
+    return JSONResponse(key_ring.jwks(), headers={"Cache-Control": "public, max-age=300"})
 
 
 # ============ 用户信息接口 ============
 
 @app.get("/users/me", response_model=UserResponse, tags=["用户"])
-async def get_current_user_info(current_user: UserModel = Depends(get_current_active_user)):
+async def get_current_user_info(current_user: UserSnapshot = Depends(get_current_active_user)):
     """
     获取当前登录用户信息
     
@@ -180,8 +363,8 @@ async def get_current_user_info(current_user: UserModel = Depends(get_current_ac
 @app.put("/users/me", response_model=UserResponse, tags=["用户"])
 async def update_current_user(
     user_update: UserUpdate,
-    current_user: UserModel = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     更新当前用户信息
@@ -189,47 +372,81 @@ async def update_current_user(
     需要JWT认证
     - 可以更新姓名、邮箱、年龄、密码
     - 如果更新邮箱，会检查是否与其他用户重复
+    - 修改邮箱或密码后，此前签发的访问令牌全部失效
     """
-    # 如果更新邮箱，检查是否与其他用户重复
-    if user_update.email and user_update.email != current_user.email:
-        existing_user = db.query(UserModel).filter(
-            UserModel.email == user_update.email,
-            UserModel.id != current_user.id
-        ).first()
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="该邮箱已被其他用户使用"
-            )
+    # 不读取密码哈希（修改密码时直接覆盖）
+    db_user = await db.get(UserModel, principal.id, options=[defer(UserModel.password_hash)])
+    if db_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="用户不存在"
+        )
+    
+    # 如果更新邮箱，检查是否与其他用户重复（布隆过滤器判定一定不存在时跳过查询）
+    email_changed = bool(user_update.email) and user_update.email != db_user.email
+    if email_changed:
+        email_normalized = normalize_email(user_update.email)
+        if email_filter.might_contain(email_normalized):
+            existing_user = await db.scalar(select(UserModel.id).where(
+                UserModel.email_normalized == email_normalized,
+                UserModel.id != db_user.id
+            ))
+            if existing_user:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="该邮箱已被其他用户使用"
+                )
     
     # 更新字段
     if user_update.name is not None:
-        current_user.name = user_update.name
+        db_user.name = user_update.name
     if user_update.email is not None:
-        current_user.email = user_update.email
+        db_user.email = user_update.email
     if user_update.age is not None:
-        current_user.age = user_update.age
+        db_user.age = user_update.age
     if user_update.password is not None:
-        current_user.password_hash = get_password_hash(user_update.password)
+        db_user.password_hash = await get_password_hash_async(user_update.password)
+        # 修改密码后，其他设备上的登录会话全部失效
+        await revoke_user_refresh_tokens(db, db_user.id)
+    if email_changed or user_update.password is not None:
+        # 在数据库中递增，并发修改时不会丢失
+        db_user.token_version = UserModel.token_version + 1
     
-    db.commit()
-    db.refresh(current_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="该邮箱已被其他用户使用"
+        )
+    await db.refresh(db_user, USER_SNAPSHOT_FIELDS)
+    user_cache.invalidate(db_user.id)
+    token_version_cache.set(db_user.id, db_user.token_version)
+    if user_update.password is not None:
+        revocation_list.revoke_user(db_user.id)
     
-    return current_user
+    return db_user
 
 
 @app.delete("/users/me", status_code=status.HTTP_204_NO_CONTENT, tags=["用户"])
 async def delete_current_user(
-    current_user: UserModel = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     删除当前用户账号
     
     需要JWT认证
     """
-    db.delete(current_user)
-    db.commit()
+    db_user = await db.get(UserModel, principal.id, options=[defer(UserModel.password_hash)])
+    if db_user is not None:
+        await delete_user_refresh_tokens(db, principal.id)
+        await db.delete(db_user)
+        await db.commit()
+    user_cache.invalidate(principal.id)
+    token_version_cache.invalidate(principal.id)
+    revocation_list.revoke_user(principal.id)
     return None
 
 
@@ -239,8 +456,8 @@ async def delete_current_user(
 async def get_all_users(
     skip: int = 0,
     limit: int = 100,
-    current_user: UserModel = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     获取所有用户列表（需要认证）
@@ -248,53 +465,276 @@ async def get_all_users(
     - **skip**: 跳过前N条记录
     - **limit**: 最多返回N条记录
     
+    翻页较深时请使用 `/users/page` 游标分页
+    
+    ⚠️ 生产环境应添加管理员权限检查
+    """
+    rows = await db.execute(
+        select(*USER_RESPONSE_COLUMNS).order_by(UserModel.id).offset(skip).limit(limit)
+    )
+    users = user_rows_to_dicts(rows.all())
+    return json_response(users) if FAST_JSON_RESPONSES else users
+
+
+@app.get("/users/page", response_model=UserPage, tags=["管理"])
+async def get_users_page(
+    cursor: Optional[str] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    游标分页获取用户列表（需要认证）
+    
+    按用户ID升序，每页都是一次主键索引定位，翻页深度不影响性能
+    - **cursor**: 上一页返回的 `next_cursor`
+    - **after_id**: 从该用户ID之后开始（与cursor二选一）
+    - **limit**: 每页条数（1-1000）
+    
+    ⚠️ 生产环境应添加管理员权限检查
+    """
+    if cursor is not None:
+        try:
+            after_id = int(decode_cursor(cursor)["id"])
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="无效的分页游标"
+            )
+    
+    query = select(*USER_RESPONSE_COLUMNS).order_by(UserModel.id).limit(limit + 1)
+    if after_id is not None:
+        query = query.where(UserModel.id > after_id)
+    users = user_rows_to_dicts((await db.execute(query)).all())
+    
+    # 多取一条用来判断是否还有下一页
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor({"id": users[-1]["id"]})
+    
+    page = {
+        "items": users,
+        "next_cursor": next_cursor
+    }
+    return json_response(page) if FAST_JSON_RESPONSES else page
+
+
+@app.get("/users/export", tags=["管理"])
+async def export_all_users(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    principal: Principal = Depends(get_current_principal)
+):
+    """
+    流式导出所有用户（需要认证）
+    
+    - **format**: 导出格式，`ndjson`（每行一个JSON对象）或 `csv`
+    
+    数据按批从数据库游标读取并直接写入响应，内存占用与用户总数无关
+    
+    ⚠️ 生产环境应添加管理员权限检查
+    """
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        export_users(format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{extension}"'}
+    )
+
+
+async def _read_body_limited(request: Request, max_bytes: int) -> bytes:
+    """
+    读取请求体，超过max_bytes时返回413
+
+    先按 Content-Length 拒绝，再在读取过程中累计字节数（分块传输没有 Content-Length），
+    超大的请求体不会被完整读入内存
+    """
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"请求体不能超过 {max_bytes} 字节"
+    )
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+        raise too_large
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+@app.post("/users/bulk", response_model=BulkImportResult, tags=["管理"])
+async def bulk_import_users(
+    request: Request,
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    批量导入用户（需要认证）
+    
+    请求体可以是JSON数组，或者 `Content-Type: application/x-ndjson` 的NDJSON（每行一个用户），
+    每个用户的字段与注册接口相同。返回每一行的失败原因
+    
+    请求体超过 BULK_IMPORT_MAX_BYTES 或行数超过 BULK_IMPORT_MAX_ROWS 时返回413
+    
+    ⚠️ 生产环境应添加管理员权限检查
+    """
+    body = await _read_body_limited(request, BULK_IMPORT_MAX_BYTES)
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            records = parse_ndjson(body)
+        else:
+            records = json.loads(body)
+    except ValueError:
+        # JSON格式错误，或NDJSON不是UTF-8编码（UnicodeDecodeError 也是 ValueError）
+        records = None
+    if not isinstance(records, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="请求体必须是JSON数组或NDJSON"
+        )
+    
+    if len(records) > BULK_IMPORT_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"单次最多导入 {BULK_IMPORT_MAX_ROWS} 个用户"
+        )
+    
+    return await import_users(db, records, UserRegister)
+
+
+@app.get("/users/search", response_model=UserPage, tags=["管理"])
+async def search_users_admin(
+    q: Optional[str] = Query(None, min_length=1, max_length=100, description="姓名或邮箱包含的关键字"),
+    name_prefix: Optional[str] = Query(None, min_length=1, max_length=100, description="姓名前缀（区分大小写）"),
+    email_domain: Optional[str] = Query(None, min_length=1, max_length=255, description="邮箱域名，如 example.com"),
+    min_age: Optional[int] = Query(None, ge=0, le=150),
+    max_age: Optional[int] = Query(None, ge=0, le=150),
+    is_active: Optional[bool] = None,
+    created_after: Optional[datetime] = Query(None, description="注册时间下限（包含）"),
+    created_before: Optional[datetime] = Query(None, description="注册时间上限（不包含）"),
+    sort: str = Query("id", pattern=f"^({'|'.join(SORT_KEYS)})$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    按条件搜索用户（需要认证）
+    
+    所有条件可以组合使用，每个条件都能走索引：
+    - **q**: 姓名或邮箱包含的关键字（开启 `USER_SEARCH_FTS` 且不少于3个字符时使用全文索引）
+    - **name_prefix**: 姓名前缀
+    - **email_domain**: 邮箱域名
+    - **min_age** / **max_age**: 年龄范围
+    - **is_active**: 是否激活
+    - **created_after** / **created_before**: 注册时间范围
+    - **sort**: 排序键（id、name、age、created_at）；**order**: asc 或 desc
+    - **cursor**: 上一页返回的 `next_cursor`（必须使用相同的排序）
+    - **limit**: 每页条数（1-1000）
+    
     ⚠️ 生产环境应添加管理员权限检查
     """
-    users = db.query(UserModel).offset(skip).limit(limit).all()
-    return users
+    filters = UserSearchFilters(
+        q=q,
+        name_prefix=name_prefix,
+        email_domain=email_domain,
+        min_age=min_age,
+        max_age=max_age,
+        is_active=is_active,
+        created_after=created_after,
+        created_before=created_before
+    )
+    try:
+        page = await search_users(db, filters, sort, order, cursor, limit, as_dicts=True)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    return json_response(page) if FAST_JSON_RESPONSES else page
 
 
 @app.get("/users/search/by-email", response_model=UserResponse, tags=["管理"])
 async def search_user_by_email(
     email: str,
-    current_user: UserModel = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     根据邮箱搜索用户（需要认证）
     
     ⚠️ 生产环境应添加管理员权限检查
     """
-    user = db.query(UserModel).filter(UserModel.email == email).first()
-    if not user:
+    row = (await db.execute(
+        select(*USER_RESPONSE_COLUMNS).where(UserModel.email_normalized == normalize_email(email))
+    )).first()
+    if row is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="未找到该邮箱对应的用户"
         )
-    return user
+    return user_rows_to_dicts([row])[0]
 
 
 @app.get("/stats", response_model=UserStats, tags=["统计"])
 async def get_user_stats(
-    current_user: UserModel = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     获取用户统计信息（需要认证）
     
-    返回总用户数、活跃用户数、非活跃用户数
+    返回总用户数、活跃用户数、非活跃用户数、各年龄段人数和最近每日注册数
+    
+    数据来自内存计数器，写入时增量更新并定期校准，不扫描用户表
     """
-    total_users = db.query(UserModel).count()
-    active_users = db.query(UserModel).filter(UserModel.is_active == True).count()
-    inactive_users = total_users - active_users
+    if not user_counters.ready:
+        await db.run_sync(user_counters.reload)
+    return user_counters.snapshot()
+
+
+@app.get("/stats/cache", response_model=Dict[str, CacheStats], tags=["统计"])
+async def get_cache_stats(principal: Principal = Depends(get_current_principal)):
+    """
+    获取进程内缓存统计（需要认证）
     
+    返回各缓存的条目数、命中/未命中次数和命中率
+    """
     return {
-        "total_users": total_users,
-        "active_users": active_users,
-        "inactive_users": inactive_users
+        "users": user_cache.stats(),
+        "tokens": token_cache.stats()
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """
+    Prometheus格式的监控指标
+
+    包括按路由的请求耗时直方图、每个请求的SQL条数和数据库耗时、单条SQL耗时，
+    以及密码哈希、JWT解码等热点操作的耗时
+    """
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/stats/email-filter", response_model=EmailFilterStats, tags=["统计"])
+async def get_email_filter_stats(principal: Principal = Depends(get_current_principal)):
+    """
+    获取已注册邮箱布隆过滤器的统计（需要认证）
+    
+    返回容量、元素数、误判率估算、内存占用，以及检查次数和直接判定为未注册的次数
+    """
+    return email_filter.stats()
+
+
 if __name__ == "__main__":
     import uvicorn
     print("=" * 60)
@@ -2,7 +2,7 @@
 Pydantic模型定义（API请求和响应）
 """
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
@@ -45,15 +45,33 @@ class UserResponse(UserBase):
         from_attributes = True
 
 
+class UserPage(BaseModel):
+    """游标分页的用户列表"""
+    items: List[UserResponse] = Field(..., description="本页用户")
+    next_cursor: Optional[str] = Field(None, description="下一页游标，为空表示没有更多数据")
+
+
 # ============ 认证相关 ============
 
 class Token(BaseModel):
     """JWT令牌响应"""
     access_token: str = Field(..., description="访问令牌")
     token_type: str = Field(default="bearer", description="令牌类型")
+    expires_in: Optional[int] = Field(None, description="访问令牌有效秒数")
+    refresh_token: Optional[str] = Field(None, description="刷新令牌（每次刷新后旧令牌失效）")
     user: UserResponse = Field(..., description="用户信息")
 
 
+class RefreshRequest(BaseModel):
+    """刷新令牌请求"""
+    refresh_token: str = Field(..., min_length=1, description="刷新令牌")
+
+
+class LogoutRequest(BaseModel):
+    """登出请求"""
+    refresh_token: Optional[str] = Field(None, description="同时吊销该刷新令牌所在的登录会话")
+
+
 class TokenData(BaseModel):
     """JWT令牌数据"""
     user_id: Optional[int] = None
@@ -72,5 +90,50 @@ class UserStats(BaseModel):
     total_users: int
     active_users: int
     inactive_users: int
+    age_bands: Dict[str, int] = Field(default_factory=dict, description="各年龄段人数")
+    created_per_day: Dict[str, int] = Field(default_factory=dict, description="最近每日注册数（UTC日期）")
+    reconciled_at: Optional[datetime] = Field(None, description="计数器最近一次校准时间")
+
+
+class CacheStats(BaseModel):
+    """缓存统计"""
+    size: int = Field(..., description="当前条目数")
+    max_size: int = Field(..., description="最大条目数")
+    ttl_seconds: float = Field(..., description="条目存活秒数")
+    hits: int = Field(..., description="命中次数")
+    misses: int = Field(..., description="未命中次数")
+    hit_rate: float = Field(..., description="命中率")
+
+
+class EmailFilterStats(BaseModel):
+    """已注册邮箱布隆过滤器统计"""
+    ready: bool = Field(..., description="是否已构建（未构建时所有检查都查数据库）")
+    capacity: int = Field(..., description="容量")
+    count: int = Field(..., description="已加入的邮箱数")
+    stale: int = Field(..., description="已删除或已修改、但仍留在过滤器中的邮箱数")
+    target_error_rate: float = Field(..., description="目标误判率")
+    estimated_error_rate: float = Field(..., description="按当前元素数估算的误判率")
+    num_bits: int = Field(..., description="位数组大小")
+    num_hashes: int = Field(..., description="哈希函数个数")
+    memory_bytes: int = Field(..., description="位数组占用的字节数")
+    checks: int = Field(..., description="检查次数")
+    negatives: int = Field(..., description="判定为一定未注册（跳过数据库查询）的次数")
+
+
+# ============ 批量导入 ============
+
+class BulkImportError(BaseModel):
+    """批量导入中失败的一行"""
+    index: int = Field(..., description="行号（从0开始）")
+    email: Optional[str] = Field(None, description="该行的邮箱")
+    detail: str = Field(..., description="失败原因")
+
+
+class BulkImportResult(BaseModel):
+    """批量导入结果"""
+    total: int = Field(..., description="提交的行数")
+    created: int = Field(..., description="成功创建的用户数")
+    failed: int = Field(..., description="失败的行数")
+    errors: List[BulkImportError] = Field(default_factory=list, description="失败明细")
 
 
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+批量导入用户脚本
+
+用法:
+    python import_users.py users.json      # JSON数组
+    python import_users.py users.ndjson    # 每行一个JSON对象
+
+每个用户的字段与注册接口相同: name, email, password, age（可选）
+"""
+import asyncio
+import json
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db.database import engine, session_scope
+from db.migrations import migrate
+from db.bulk import import_users, parse_ndjson
+from db.hashing import password_hasher
+from schemas import UserRegister
+
+
+def load_records(path: str) -> list:
+    """按文件扩展名读取JSON数组或NDJSON"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.endswith((".ndjson", ".jsonl")):
+        return parse_ndjson(data)
+    records = json.loads(data)
+    if not isinstance(records, list):
+        raise ValueError("JSON文件内容必须是数组")
+    return records
+
+
+async def run_import(records: list) -> dict:
+    """在一个会话中执行导入"""
+    async with session_scope() as db:
+        return await import_users(db, records, UserRegister)
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    path = sys.argv[1]
+
+    print("=" * 60)
+    print(f"正在从 {path} 导入用户...")
+
+    # 确保表结构是最新版本
+    migrate(engine)
+
+    records = load_records(path)
+    print(f"读取到 {len(records)} 条记录")
+
+    started = time.perf_counter()
+    try:
+        result = asyncio.run(run_import(records))
+    finally:
+        password_hasher.shutdown()
+    elapsed = time.perf_counter() - started
+
+    print(f"成功创建: {result['created']}")
+    print(f"失败: {result['failed']}")
+    for error in result["errors"][:20]:
+        print(f"  - 第{error['index']}行 | {error['email']} | {error['detail']}")
+    if result["failed"] > 20:
+        print(f"  ... 另有 {result['failed'] - 20} 条失败未显示")
+    print(f"耗时: {elapsed:.2f} 秒")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
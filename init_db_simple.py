@@ -7,7 +7,8 @@ import os
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from db.database import engine, SessionLocal, Base
+from db.database import engine, SessionLocal
+from db.migrations import reset_database
 from db.model import UserModel
 from db.auth import get_password_hash
 
@@ -16,13 +17,10 @@ def init_database():
     print("=" * 60)
     print("正在初始化数据库(JWT认证版本)...")
     
-    # 删除所有表
-    Base.metadata.drop_all(bind=engine)
+    # 删除所有表，再按迁移从头创建
+    versions = reset_database(engine)
     print("已删除旧表结构")
-    
-    # 创建所有表
-    Base.metadata.create_all(bind=engine)
-    print("数据库表创建成功!")
+    print(f"数据库表创建成功!（结构版本 {versions[-1]}）")
     
     # 创建会话
     db = SessionLocal()
@@ -166,8 +166,23 @@ def test_jwt_authentication():
     print_response(response, "使用新密码登录")
     
     if response.status_code == 200:
+        # 修改密码后旧的访问令牌已失效，改用新令牌
+        access_token = response.json()["access_token"]
+        refresh_token = response.json()["refresh_token"]
         print("✅ 新密码有效")
     
+    # ============ 测试12.1: 刷新访问令牌 ============
+    if response.status_code == 200:
+        print("\n\n🔄 测试12.1: 用刷新令牌换取新的访问令牌")
+        response = requests.post(f"{BASE_URL}/auth/refresh", json={"refresh_token": refresh_token})
+        print_response(response, "刷新令牌")
+        if response.status_code == 200:
+            access_token = response.json()["access_token"]
+        
+        # 旧的刷新令牌只能使用一次
+        response = requests.post(f"{BASE_URL}/auth/refresh", json={"refresh_token": refresh_token})
+        print_response(response, "重复使用旧的刷新令牌（应该返回401）")
+    
     # ============ 测试13: 尝试重复注册 ============
     print("\n\n❌ 测试13: 尝试重复注册（应该失败）")
     response = requests.post(f"{BASE_URL}/auth/register", json=register_data)
@@ -0,0 +1,478 @@
+# -*- coding: utf-8 -*-
+"""
+认证安全测试
+
+在临时数据库上通过ASGI直接调用应用（不启动服务），检查：
+- 登录限流在并发请求下仍然有效
+- 刷新令牌轮换、重放检测，登出和修改密码后旧访问令牌失效
+- 邮箱布隆过滤器只用来跳过查询：判定可能存在时仍以数据库为准
+- JWT密钥环：按kid签发和验签、轮换期间接受旧密钥、JWKS只公开公钥
+- 登录后升级过时的密码哈希（比较并交换，不修改updated_at）
+需要在导入 db 之前设置环境变量，请单独运行或放在其他测试之前:
+    python -m pytest test_auth_security.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "fastapi-user-main"))
+sys.path.insert(0, ROOT)
+
+# 必须在导入应用模块之前设置：临时数据库、低成本bcrypt、关闭请求级指标
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='fastapi-user-test-'), 'test.db')}")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from fastapi import HTTPException
+from jose import ExpiredSignatureError, JWTError, jwt
+from sqlalchemy import select, update
+from datetime import datetime
+
+import main
+from db import config
+from db.bloom import email_filter
+from db.database import engine, session_scope
+from db import hashing
+from db.hashing import build_crypt_context, password_hasher
+from db.keys import KeyRing, pem_key, secret_key
+from db.model import UserModel
+from db.ratelimit import MemoryBackend, login_rate_limiter
+from db.revocation import RevocationList
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+
+
+async def _register(client: httpx.AsyncClient, email: str, password: str = "secret1") -> None:
+    r = await client.post("/auth/register", json={"name": "测试", "email": email, "password": password})
+    assert r.status_code == 201, r.text
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limiter(monkeypatch):
+    """每个测试使用新的限流计数，IP限制放宽到不影响邮箱限流"""
+    monkeypatch.setattr(login_rate_limiter, "backend", MemoryBackend())
+    monkeypatch.setattr(login_rate_limiter, "ip_limit", 1000)
+
+
+@pytest.fixture
+def verify_calls(monkeypatch):
+    """记录到达密码校验的次数"""
+    calls = []
+    original = password_hasher.verify_needs_update
+
+    async def counting(plain_password, hashed_password):
+        calls.append(plain_password)
+        return await original(plain_password, hashed_password)
+
+    monkeypatch.setattr(password_hasher, "verify_needs_update", counting)
+    return calls
+
+
+def test_concurrent_bad_logins_limited_before_hashing(verify_calls):
+    limit = login_rate_limiter.email_limit
+    attempts = limit * 4
+
+    async def scenario():
+        async with _client() as client:
+            await _register(client, "ratelimit@example.com")
+            return await asyncio.gather(*(
+                client.post("/auth/login", json={"email": "RateLimit@example.com", "password": f"wrong{i}"})
+                for i in range(attempts)
+            ))
+
+    responses = _run(scenario())
+    codes = sorted(r.status_code for r in responses)
+    assert len(verify_calls) <= limit
+    assert codes == [401] * len(verify_calls) + [429] * (attempts - len(verify_calls))
+    assert all(int(r.headers["retry-after"]) >= 1 for r in responses if r.status_code == 429)
+
+
+def test_successful_login_resets_email_attempts(verify_calls):
+    limit = login_rate_limiter.email_limit
+
+    async def scenario():
+        async with _client() as client:
+            await _register(client, "reset@example.com")
+            for i in range(limit - 1):
+                r = await client.post("/auth/login", json={"email": "reset@example.com", "password": f"wrong{i}"})
+                assert r.status_code == 401
+            r = await client.post("/auth/login", json={"email": "reset@example.com", "password": "secret1"})
+            assert r.status_code == 200, r.text
+            # 清零后又有完整的次数
+            for i in range(limit):
+                r = await client.post("/auth/login", json={"email": "reset@example.com", "password": f"again{i}"})
+                assert r.status_code == 401
+            r = await client.post("/auth/login", json={"email": "reset@example.com", "password": "secret1"})
+            assert r.status_code == 429
+
+    _run(scenario())
+    assert len(verify_calls) == 2 * limit
+
+
+async def _login(client: httpx.AsyncClient, email: str, password: str = "secret1") -> dict:
+    r = await client.post("/auth/login", json={"email": email, "password": password})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _auth(tokens: dict) -> dict:
+    return {"Authorization": "Bearer " + tokens["access_token"]}
+
+
+def test_refresh_rotates_and_invalidates_old_token():
+    async def scenario():
+        async with _client() as client:
+            await _register(client, "rotate@example.com")
+            first = await _login(client, "rotate@example.com")
+            r = await client.post("/auth/refresh", json={"refresh_token": first["refresh_token"]})
+            assert r.status_code == 200, r.text
+            second = r.json()
+            assert second["refresh_token"] != first["refresh_token"]
+            assert (await client.get("/users/me", headers=_auth(second))).status_code == 200
+            # 新令牌可以继续轮换
+            r = await client.post("/auth/refresh", json={"refresh_token": second["refresh_token"]})
+            assert r.status_code == 200, r.text
+            r = await client.post("/auth/refresh", json={"refresh_token": "not-a-token"})
+            assert r.status_code == 401
+
+    _run(scenario())
+
+
+def test_replayed_refresh_token_revokes_family():
+    async def scenario():
+        async with _client() as client:
+            await _register(client, "replay@example.com")
+            first = await _login(client, "replay@example.com")
+            other = await _login(client, "replay@example.com")
+            r = await client.post("/auth/refresh", json={"refresh_token": first["refresh_token"]})
+            assert r.status_code == 200, r.text
+            rotated = r.json()["refresh_token"]
+            # 已轮换的令牌被重放：整个family吊销，合法客户端手里的新令牌也失效
+            r = await client.post("/auth/refresh", json={"refresh_token": first["refresh_token"]})
+            assert r.status_code == 401
+            r = await client.post("/auth/refresh", json={"refresh_token": rotated})
+            assert r.status_code == 401
+            # 其他登录会话不受影响
+            r = await client.post("/auth/refresh", json={"refresh_token": other["refresh_token"]})
+            assert r.status_code == 200, r.text
+
+    _run(scenario())
+
+
+def test_logout_rejects_access_token_and_refresh_token():
+    async def scenario():
+        async with _client() as client:
+            await _register(client, "logout@example.com")
+            tokens = await _login(client, "logout@example.com")
+            other = await _login(client, "logout@example.com")
+            r = await client.post("/auth/logout", headers=_auth(tokens), json={"refresh_token": tokens["refresh_token"]})
+            assert r.status_code == 204, r.text
+            # 登出令牌的jti已吊销
+            assert (await client.get("/users/me", headers=_auth(tokens))).status_code == 401
+            r = await client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+            assert r.status_code == 401
+            assert (await client.get("/users/me", headers=_auth(other))).status_code == 200
+
+    _run(scenario())
+
+
+def test_password_change_rejects_earlier_tokens():
+    async def scenario():
+        async with _client() as client:
+            await _register(client, "password@example.com")
+            before = await _login(client, "password@example.com")
+            r = await client.put("/users/me", headers=_auth(before), json={"password": "secret2"})
+            assert r.status_code == 200, r.text
+            # 修改密码之前签发的访问令牌和刷新令牌全部失效
+            assert (await client.get("/users/me", headers=_auth(before))).status_code == 401
+            r = await client.post("/auth/refresh", json={"refresh_token": before["refresh_token"]})
+            assert r.status_code == 401
+            after = await _login(client, "password@example.com", "secret2")
+            assert (await client.get("/users/me", headers=_auth(after))).status_code == 200
+
+    _run(scenario())
+
+
+def test_revocation_list_by_jti_and_user_cutoff():
+    revoked = RevocationList(user_cutoff_ttl=60)
+    now = time.time()
+    revoked.revoke("jti-1", exp=now + 60)
+    # 已过期的令牌不需要记录
+    revoked.revoke("jti-expired", exp=now - 1)
+    assert revoked.is_revoked({"jti": "jti-1", "sub": "1", "iat": now})
+    assert not revoked.is_revoked({"jti": "jti-2", "sub": "1", "iat": now})
+    assert len(revoked) == 1
+
+    revoked.revoke_user(7, before=now)
+    assert revoked.is_revoked({"jti": "a", "sub": "7", "iat": now - 10})
+    assert revoked.is_revoked({"jti": "b", "sub": "7", "iat": now})
+    assert not revoked.is_revoked({"jti": "c", "sub": "7", "iat": now + 1})
+    assert not revoked.is_revoked({"jti": "d", "sub": "8", "iat": now - 10})
+
+
+@pytest.fixture
+def built_email_filter():
+    """从数据库构建邮箱过滤器（ASGI测试不运行lifespan中的后台构建任务）"""
+    if not config.EMAIL_FILTER_ENABLED:
+        pytest.skip("EMAIL_FILTER_ENABLED=0")
+    async def build():
+        async with session_scope() as db:
+            await db.run_sync(email_filter.rebuild)
+
+    _run(build())
+    assert email_filter.ready
+    return email_filter
+
+
+def test_bloom_positive_falls_through_to_database(built_email_filter):
+    # 模拟误判：过滤器中有、数据库中没有
+    built_email_filter.add("false-positive@example.com")
+    built_email_filter.add("false-positive-2@example.com")
+    assert built_email_filter.might_contain("false-positive@example.com")
+
+    async def scenario():
+        async with _client() as client:
+            await _register(client, "false-positive@example.com")
+            # 真正已注册的邮箱仍然被拒绝
+            r = await client.post("/auth/register", json={
+                "name": "测试", "email": "False-Positive@example.com", "password": "secret1"
+            })
+            assert r.status_code == 400
+            # 修改邮箱走同样的检查
+            await _register(client, "changer@example.com")
+            tokens = await _login(client, "changer@example.com")
+            r = await client.put("/users/me", headers=_auth(tokens), json={"email": "false-positive-2@example.com"})
+            assert r.status_code == 200, r.text
+            # 修改邮箱后旧令牌失效，重新登录
+            tokens = await _login(client, "false-positive-2@example.com")
+            r = await client.put("/users/me", headers=_auth(tokens), json={"email": "false-positive@example.com"})
+            assert r.status_code == 400
+
+    _run(scenario())
+
+
+def test_rolled_back_insert_does_not_block_registration(built_email_filter):
+    async def rolled_back_insert():
+        async with session_scope() as db:
+            db.add(UserModel(name="回滚", email="rollback@example.com", email_normalized="rollback@example.com",
+                             password_hash="x", is_active=True))
+            await db.flush()
+            await db.rollback()
+
+    _run(rolled_back_insert())
+    # flush时已经加入过滤器，回滚后只会变成误判
+    assert built_email_filter.might_contain("rollback@example.com")
+
+    async def scenario():
+        async with _client() as client:
+            await _register(client, "rollback@example.com")
+
+    _run(scenario())
+
+
+def test_bloom_negative_is_backed_by_unique_index(built_email_filter):
+    # 绕过Session事件写入（相当于其他进程注册），过滤器不知道这个邮箱
+    with engine.begin() as conn:
+        conn.execute(UserModel.__table__.insert(), [{
+            "name": "其他进程", "email": "elsewhere@example.com", "email_normalized": "elsewhere@example.com",
+            "password_hash": "x", "is_active": True,
+        }])
+    assert not built_email_filter.might_contain("elsewhere@example.com")
+
+    async def scenario():
+        async with _client() as client:
+            r = await client.post("/auth/register", json={
+                "name": "测试", "email": "elsewhere@example.com", "password": "secret1"
+            })
+            assert r.status_code == 400
+
+    _run(scenario())
+
+
+def _private_pem(private_key) -> bytes:
+    return private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+
+
+def _public_pem(private_key) -> bytes:
+    return private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+
+def test_key_ring_rotation_with_shared_secrets():
+    old, new = secret_key("old-secret"), secret_key("new-secret")
+    old_token = KeyRing([old], old.kid).encode({"sub": "1"})
+    ring = KeyRing([new, old], new.kid)
+
+    token = ring.encode({"sub": "2"})
+    assert jwt.get_unverified_header(token)["kid"] == new.kid
+    assert ring.decode(token)["sub"] == "2"
+    # 轮换期间旧密钥签发的令牌仍然有效，移除旧密钥后失效
+    assert ring.decode(old_token)["sub"] == "1"
+    with pytest.raises(JWTError):
+        KeyRing([new], new.kid).decode(old_token)
+    # 没有kid的旧令牌按相同算法的密钥依次尝试
+    legacy = jwt.encode({"sub": "3"}, "old-secret", algorithm="HS256")
+    assert ring.decode(legacy)["sub"] == "3"
+    with pytest.raises(JWTError):
+        ring.decode(jwt.encode({"sub": "3"}, "old-secret", algorithm="HS384"))
+    with pytest.raises(JWTError):
+        ring.decode(jwt.encode({"sub": "3"}, "unknown-secret", algorithm="HS256"))
+    # 未知kid，或kid对应的密钥算法与头部不一致
+    with pytest.raises(JWTError):
+        ring.decode(jwt.encode({"sub": "4"}, "new-secret", algorithm="HS256", headers={"kid": "nope"}))
+    with pytest.raises(JWTError):
+        ring.decode(jwt.encode({"sub": "4"}, "new-secret", algorithm="HS512", headers={"kid": new.kid}))
+    # 签名匹配但已过期
+    with pytest.raises(ExpiredSignatureError):
+        ring.decode(ring.encode({"sub": "5", "exp": int(time.time()) - 60}))
+
+
+@pytest.mark.parametrize("algorithm, private_key", [
+    ("RS256", rsa.generate_private_key(public_exponent=65537, key_size=2048)),
+    ("ES256", ec.generate_private_key(ec.SECP256R1())),
+])
+def test_key_ring_asymmetric_round_trip(algorithm, private_key):
+    signing = pem_key(_private_pem(private_key), algorithm)
+    assert signing.algorithm == algorithm
+    ring = KeyRing([signing], signing.kid)
+    token = ring.encode({"sub": "1"})
+    assert ring.decode(token)["sub"] == "1"
+
+    # 只有公钥的节点：kid与签名节点一致，可以验签，不能签发
+    verifier = KeyRing([pem_key(_public_pem(private_key), algorithm)])
+    assert verifier.get(signing.kid) is not None
+    assert verifier.decode(token)["sub"] == "1"
+    with pytest.raises(RuntimeError):
+        verifier.encode({"sub": "1"})
+    with pytest.raises(ValueError):
+        KeyRing([pem_key(_public_pem(private_key), algorithm)], signing.kid)
+
+    # 其他私钥签发、冒用同一kid的令牌被拒绝
+    other = ec.generate_private_key(ec.SECP256R1()) if algorithm == "ES256" else \
+        rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    forged = jwt.encode({"sub": "1"}, _private_pem(other).decode(), algorithm=algorithm,
+                        headers={"kid": signing.kid})
+    with pytest.raises(JWTError):
+        verifier.decode(forged)
+
+
+def test_jwks_publishes_only_public_keys(monkeypatch):
+    rsa_key = pem_key(_private_pem(rsa.generate_private_key(public_exponent=65537, key_size=2048)))
+    ec_old = ec.generate_private_key(ec.SECP256R1())
+    ring = KeyRing([rsa_key, pem_key(_public_pem(ec_old)), secret_key("shared-secret")], rsa_key.kid)
+    monkeypatch.setattr(main, "key_ring", ring)
+
+    async def fetch():
+        async with _client() as client:
+            return await client.get("/.well-known/jwks.json")
+
+    r = _run(fetch())
+    assert r.status_code == 200
+    keys = r.json()["keys"]
+    assert {key["kty"] for key in keys} == {"RSA", "EC"}
+    assert {key["kid"] for key in keys} == {key.kid for key in ring.keys if not key.is_symmetric}
+    for key in keys:
+        # 不包含RSA/EC私钥成员和共享密钥
+        assert not {"d", "p", "q", "dp", "dq", "qi", "k"} & set(key), key
+        assert key["use"] == "sig"
+    assert "shared-secret" not in r.text
+
+
+LEGACY_UPDATED_AT = datetime(2020, 1, 1, 8, 0, 0)
+
+
+def _insert_legacy_user(email: str, password_hash: str) -> int:
+    """直接写入一个带旧哈希和旧 updated_at 的用户"""
+    users = UserModel.__table__
+    with engine.begin() as conn:
+        return conn.execute(users.insert().values(
+            name="旧用户", email=email, email_normalized=email, password_hash=password_hash,
+            is_active=True, updated_at=LEGACY_UPDATED_AT,
+        )).inserted_primary_key[0]
+
+
+def _stored(user_id: int):
+    users = UserModel.__table__
+    with engine.connect() as conn:
+        return conn.execute(select(users.c.password_hash, users.c.updated_at).where(users.c.id == user_id)).one()
+
+
+@pytest.fixture
+def stronger_hashing(monkeypatch):
+    """当前配置的bcrypt成本提高到5，成本为4的已有哈希变为过时"""
+    monkeypatch.setattr(hashing, "pwd_context", build_crypt_context(["bcrypt"], bcrypt_rounds=5))
+    return build_crypt_context(["bcrypt"], bcrypt_rounds=4)
+
+
+def test_login_upgrades_outdated_hash(stronger_hashing):
+    old_hash = stronger_hashing.hash("legacy1")
+    user_id = _insert_legacy_user("legacy@example.com", old_hash)
+
+    async def scenario():
+        async with _client() as client:
+            # 后台任务在响应发送后、ASGI调用返回前执行
+            await _login(client, "legacy@example.com", "legacy1")
+            return await _login(client, "legacy@example.com", "legacy1")
+
+    _run(scenario())
+    password_hash, updated_at = _stored(user_id)
+    assert password_hash != old_hash and password_hash.startswith("$2b$05$")
+    assert hashing.pwd_context.verify("legacy1", password_hash)
+    assert updated_at == LEGACY_UPDATED_AT
+
+
+def test_rehash_skipped_when_password_changed_meanwhile(stronger_hashing, monkeypatch):
+    old_hash = stronger_hashing.hash("legacy1")
+    changed_hash = stronger_hashing.hash("changed1")
+    user_id = _insert_legacy_user("raced@example.com", old_hash)
+    original = password_hasher.hash
+
+    async def change_password_first(password):
+        # 校验通过之后、写回之前，密码在别处被修改
+        users = UserModel.__table__
+        with engine.begin() as conn:
+            conn.execute(update(users).where(users.c.id == user_id).values(password_hash=changed_hash))
+        return await original(password)
+
+    monkeypatch.setattr(password_hasher, "hash", change_password_first)
+
+    async def scenario():
+        async with _client() as client:
+            await _login(client, "raced@example.com", "legacy1")
+
+    _run(scenario())
+    # 比较并交换失败，不覆盖新密码
+    assert _stored(user_id).password_hash == changed_hash
+
+
+def test_rehash_gives_up_when_hasher_is_busy(stronger_hashing, monkeypatch):
+    old_hash = stronger_hashing.hash("legacy1")
+    user_id = _insert_legacy_user("busy@example.com", old_hash)
+
+    async def busy(password):
+        raise HTTPException(status_code=503, detail="服务繁忙，请稍后重试")
+
+    monkeypatch.setattr(password_hasher, "hash", busy)
+
+    async def scenario():
+        async with _client() as client:
+            await _login(client, "busy@example.com", "legacy1")
+
+    _run(scenario())
+    assert _stored(user_id).password_hash == old_hash
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+压测工具的统计函数测试
+
+    python -m pytest test_benchmarks.py
+"""
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+from load import percentile
+
+
+def test_percentile_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 0.50) == 50
+    assert percentile(values, 0.95) == 95
+    assert percentile(values, 0.99) == 99
+    assert percentile(values, 0.07) == 7
+    assert percentile(values, 1.0) == 100
+
+    ten = [float(i) for i in range(1, 11)]
+    assert percentile(ten, 0.50) == 5
+    assert percentile(ten, 0.95) == 10
+    assert percentile(ten, 0.0) == 1
+    assert percentile([3.0], 0.99) == 3
+    assert percentile([], 0.5) == 0.0
+
+
+if __name__ == "__main__":
+    test_percentile_nearest_rank()
+    print("测试完成!")
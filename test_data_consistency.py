@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+数据一致性测试
+
+在临时数据库上通过ASGI直接调用应用（不启动服务），检查：
+- 批量导入：批次内重复、已注册邮箱、并发写入冲突时的逐行回退，以及请求体大小限制
+- 用户统计计数器：每次写入后增量更新的结果与聚合查询重新校准的结果一致
+- 只读副本路由：写后读粘滞只作用于写入者本人，刷新令牌的簿记写入不触发粘滞
+需要在导入 db 之前设置环境变量，请单独运行或放在其他测试之前:
+    python -m pytest test_data_consistency.py
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "fastapi-user-main"))
+sys.path.insert(0, ROOT)
+
+# 必须在导入应用模块之前设置：临时数据库、低成本bcrypt、关闭请求级指标
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='fastapi-user-test-'), 'test.db')}")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+import httpx
+import pytest
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+
+import main
+from db.bloom import email_filter
+from db import config, database, stats
+from db.bulk import import_users
+from db.database import ReadSessionRouter, create_db_engine, session_scope
+from db.migrations import migrate
+from db.model import UserModel
+from db.ratelimit import login_rate_limiter
+from db.tokens import create_refresh_token
+from schemas import UserRegister
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+
+
+async def _login(client: httpx.AsyncClient, email: str, password: str = "secret1") -> dict:
+    r = await client.post("/auth/login", json={"email": email, "password": password})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _auth(tokens: dict) -> dict:
+    return {"Authorization": "Bearer " + tokens["access_token"]}
+
+
+async def _register_and_login(client: httpx.AsyncClient, email: str, password: str = "secret1") -> dict:
+    r = await client.post("/auth/register", json={"name": "测试", "email": email, "password": password})
+    assert r.status_code == 201, r.text
+    return _auth(await _login(client, email, password))
+
+
+async def _count_emails(emails) -> int:
+    async with session_scope() as db:
+        return await db.scalar(
+            select(func.count()).select_from(UserModel).where(UserModel.email_normalized.in_(emails))
+        )
+
+
+@pytest.fixture(autouse=True)
+def no_login_rate_limit(monkeypatch):
+    monkeypatch.setattr(login_rate_limiter, "enabled", False)
+
+
+def _row(email: str) -> dict:
+    return {"name": "导入", "email": email, "password": "secret1"}
+
+
+def test_bulk_import_reports_duplicates_per_row():
+    async def scenario():
+        async with _client() as client:
+            headers = await _register_and_login(client, "bulk-admin@example.com")
+            rows = [
+                _row("bulk-a@example.com"),
+                _row("Bulk-A@example.com"),        # 批次内重复（规范化后相同）
+                _row("bulk-admin@example.com"),    # 已注册
+                _row("bulk-b@example.com"),
+                {"name": "", "email": "bad", "password": "1"},
+            ]
+            r = await client.post("/users/bulk", json=rows, headers=headers)
+            assert r.status_code == 200, r.text
+            return r.json()
+
+    result = _run(scenario())
+    assert (result["total"], result["created"], result["failed"]) == (5, 2, 3)
+    errors = {error["index"]: error for error in result["errors"]}
+    assert sorted(errors) == [1, 2, 4]
+    assert errors[1]["detail"] == "批次内邮箱重复" and errors[1]["email"] == "Bulk-A@example.com"
+    assert errors[2]["detail"] == "该邮箱已被注册"
+    assert _run(_count_emails(["bulk-a@example.com", "bulk-b@example.com"])) == 2
+
+
+def test_bulk_import_falls_back_to_single_rows_on_conflict(monkeypatch):
+    async def existing():
+        async with _client() as client:
+            await _register_and_login(client, "conflict@example.com")
+
+    _run(existing())
+    # 模拟查重之后被其他请求抢先写入：跳过查重，插入时由唯一索引发现冲突
+    monkeypatch.setattr(email_filter, "might_contain", lambda email: False)
+    records = [
+        _row("fallback-1@example.com"),
+        _row("conflict@example.com"),
+        _row("fallback-2@example.com"),
+        _row("fallback-3@example.com"),
+    ]
+
+    async def scenario():
+        async with session_scope() as db:
+            return await import_users(db, records, UserRegister, chunk_size=2)
+
+    result = _run(scenario())
+    # 第一批（含冲突行）逐行插入，第二批整批插入
+    assert (result["created"], result["failed"]) == (3, 1)
+    assert result["errors"] == [{"index": 1, "email": "conflict@example.com", "detail": "该邮箱已被注册"}]
+    emails = ["fallback-1@example.com", "fallback-2@example.com", "fallback-3@example.com"]
+    assert _run(_count_emails(emails)) == 3
+
+
+def test_bulk_import_rejects_oversized_body_before_parsing(monkeypatch):
+    rows = [_row(f"big-{i}@example.com") for i in range(20)]
+    body = json.dumps(rows).encode()
+    monkeypatch.setattr(main, "BULK_IMPORT_MAX_BYTES", len(body) - 1)
+
+    async def chunks():
+        for start in range(0, len(body), 64):
+            yield body[start:start + 64]
+
+    async def scenario():
+        async with _client() as client:
+            headers = await _register_and_login(client, "bulk-size@example.com")
+            headers["Content-Type"] = "application/json"
+            by_length = await client.post("/users/bulk", content=body, headers=headers)
+            # 分块传输没有 Content-Length，读取过程中超出限制
+            chunked = await client.post("/users/bulk", content=chunks(), headers=headers)
+            return by_length, chunked
+
+    by_length, chunked = _run(scenario())
+    assert by_length.status_code == 413
+    assert chunked.status_code == 413
+    assert _run(_count_emails([row["email"] for row in rows])) == 0
+
+
+# ============ 用户统计计数器 ============
+
+@pytest.fixture
+def counter_db(monkeypatch, tmp_path):
+    """独立的临时数据库 + 已校准的全局计数器，返回同步Session工厂"""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'stats.db'}")
+    migrate(engine)
+    factory = sessionmaker(bind=engine)
+    counters = stats.UserCounters()
+    with factory() as db:
+        counters.reload(db)
+    monkeypatch.setattr(stats, "user_counters", counters)
+    yield factory
+    engine.dispose()
+
+
+def _counts(counters: stats.UserCounters) -> dict:
+    snapshot = counters.snapshot()
+    snapshot.pop("reconciled_at")
+    return snapshot
+
+
+def _assert_matches_reload(factory) -> dict:
+    """增量维护的计数器必须与重新聚合的结果完全一致"""
+    assert stats.user_counters.ready
+    expected = stats.UserCounters()
+    with factory() as db:
+        expected.reload(db)
+    assert _counts(stats.user_counters) == _counts(expected)
+    return _counts(expected)
+
+
+def _user(email: str, age=None, is_active: bool = True) -> UserModel:
+    return UserModel(name="统计", email=email, password_hash="x", age=age, is_active=is_active)
+
+
+def test_user_counters_follow_insert_update_delete(counter_db):
+    with counter_db() as db:
+        db.add_all([_user("s1@example.com", 20), _user("s2@example.com", 30), _user("s3@example.com")])
+        db.commit()
+        ids = [user.id for user in db.scalars(select(UserModel).order_by(UserModel.id))]
+    counts = _assert_matches_reload(counter_db)
+    assert (counts["total_users"], counts["active_users"]) == (3, 3)
+    assert counts["age_bands"]["18-24"] == 1 and counts["age_bands"]["unknown"] == 1
+
+    # 年龄段迁移 + 停用
+    with counter_db() as db:
+        user = db.get(UserModel, ids[0])
+        user.age = 40
+        user.is_active = False
+        db.commit()
+    counts = _assert_matches_reload(counter_db)
+    assert counts["age_bands"]["18-24"] == 0 and counts["age_bands"]["35-44"] == 1
+    assert (counts["active_users"], counts["inactive_users"]) == (2, 1)
+
+    # 只改与统计无关的字段
+    with counter_db() as db:
+        db.get(UserModel, ids[1]).name = "改名"
+        db.commit()
+    _assert_matches_reload(counter_db)
+
+    with counter_db() as db:
+        db.delete(db.get(UserModel, ids[0]))
+        db.commit()
+    counts = _assert_matches_reload(counter_db)
+    assert (counts["total_users"], counts["inactive_users"]) == (2, 0)
+    assert counts["age_bands"]["35-44"] == 0
+
+
+def test_user_counters_discard_rolled_back_changes(counter_db):
+    with counter_db() as db:
+        db.add(_user("kept@example.com", 50))
+        db.commit()
+    before = _assert_matches_reload(counter_db)
+
+    with counter_db() as db:
+        db.add(_user("rolled-back@example.com", 20))
+        user = db.scalar(select(UserModel))
+        user.is_active = False
+        db.flush()
+        db.rollback()
+    assert _assert_matches_reload(counter_db) == before
+
+    # 回滚后同一个会话里的新事务只计入自己的增量
+    with counter_db() as db:
+        db.add(_user("first@example.com", 20))
+        db.flush()
+        db.rollback()
+        db.add(_user("second@example.com", 70))
+        db.commit()
+    counts = _assert_matches_reload(counter_db)
+    assert counts["total_users"] == 2 and counts["age_bands"]["18-24"] == 0
+
+
+def test_user_counters_bulk_statements(counter_db):
+    rows = [
+        {"name": "批量", "email": f"b{i}@example.com", "email_normalized": f"b{i}@example.com",
+         "password_hash": "x", "age": 18 + i, "is_active": i % 2 == 0}
+        for i in range(4)
+    ]
+    with counter_db() as db:
+        db.execute(insert(UserModel), rows)
+        db.commit()
+    counts = _assert_matches_reload(counter_db)
+    assert (counts["total_users"], counts["active_users"]) == (4, 2)
+
+    # 批量UPDATE无法在内存中算出增量，只能标记失效等待校准
+    with counter_db() as db:
+        db.execute(update(UserModel).where(UserModel.age < 20).values(age=None))
+        db.commit()
+    assert not stats.user_counters.ready
+    with counter_db() as db:
+        stats.user_counters.reload(db)
+    counts = _assert_matches_reload(counter_db)
+    assert counts["age_bands"]["unknown"] == 2
+
+
+# ============ 只读副本路由 ============
+
+@pytest.fixture
+def replica(monkeypatch, tmp_path):
+    """
+    把主库当前内容复制到一个只读打开的SQLite文件作为副本，并让读请求路由到它
+
+    副本之后不再同步，主库上的新写入在副本里看不到，据此判断读请求走了哪个库
+    """
+    def attach(read_after_write_seconds: float = 30) -> ReadSessionRouter:
+        path = tmp_path / "replica.db"
+        source = sqlite3.connect(make_url(config.DATABASE_URL).database)
+        target = sqlite3.connect(path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        replica_engine = create_db_engine(f"sqlite:///file:{path}?mode=ro&uri=true")
+        engines.append(replica_engine)
+        router = ReadSessionRouter(
+            [sessionmaker(autoflush=False, bind=replica_engine)],
+            read_after_write_seconds=read_after_write_seconds,
+        )
+        monkeypatch.setattr(database, "read_router", router)
+        return router
+
+    engines = []
+    yield attach
+    for replica_engine in engines:
+        replica_engine.dispose()
+
+
+async def _name_seen_by(client: httpx.AsyncClient, tokens: dict, email: str) -> str:
+    r = await client.get("/users/search/by-email", params={"email": email}, headers=_auth(tokens))
+    assert r.status_code == 200, r.text
+    return r.json()["name"]
+
+
+async def _user_id(email: str) -> int:
+    async with session_scope() as db:
+        return await db.scalar(select(UserModel.id).where(UserModel.email_normalized == email))
+
+
+def test_read_after_write_is_sticky_only_for_the_writer(replica):
+    async def scenario():
+        async with _client() as client:
+            for email in ("writer@example.com", "reader@example.com"):
+                r = await client.post("/auth/register", json={"name": "原名", "email": email, "password": "secret1"})
+                assert r.status_code == 201, r.text
+            writer = await _login(client, "writer@example.com")
+            reader = await _login(client, "reader@example.com")
+            reader_other_session = await _login(client, "reader@example.com")
+            router = replica()
+
+            r = await client.put("/users/me", json={"name": "新名"}, headers=_auth(writer))
+            assert r.status_code == 200, r.text
+            # 写入者本人读主库，能看到自己的修改；其他用户仍读副本
+            assert await _name_seen_by(client, writer, "writer@example.com") == "新名"
+            assert await _name_seen_by(client, reader, "writer@example.com") == "原名"
+
+            # 登出只写刷新令牌（已认证的写入），不应让该用户粘滞到主库
+            r = await client.post(
+                "/auth/logout",
+                json={"refresh_token": reader_other_session["refresh_token"]},
+                headers=_auth(reader_other_session),
+            )
+            assert r.status_code == 204, r.text
+            r = await client.post("/auth/refresh", json={"refresh_token": reader["refresh_token"]})
+            assert r.status_code == 200, r.text
+            reader = r.json()
+            assert await _name_seen_by(client, reader, "writer@example.com") == "原名"
+            return router
+
+    router = _run(scenario())
+    writer_id = _run(_user_id("writer@example.com"))
+    reader_id = _run(_user_id("reader@example.com"))
+    assert router.use_primary(writer_id)
+    assert not router.use_primary(reader_id)
+    assert not router.use_primary(None)
+
+
+def test_refresh_token_writes_do_not_mark_principal(replica):
+    async def scenario():
+        async with _client() as client:
+            await _register_and_login(client, "token-writer@example.com")
+        user_id = await _user_id("token-writer@example.com")
+        router = replica()
+        token = database.current_principal_id.set(user_id)
+        try:
+            async with session_scope() as db:
+                await create_refresh_token(db, user_id)
+                await db.commit()
+            sticky_after_token = router.use_primary(user_id)
+            async with session_scope() as db:
+                user = await db.get(UserModel, user_id)
+                user.name = "改名"
+                await db.commit()
+            sticky_after_user_write = router.use_primary(user_id)
+        finally:
+            database.current_principal_id.reset(token)
+        return sticky_after_token, sticky_after_user_write
+
+    assert _run(scenario()) == (False, True)
+
+
+def test_read_after_write_window_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(database, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    router = ReadSessionRouter([object()], read_after_write_seconds=5)
+
+    router.mark_write(1)
+    assert router.use_primary(1) and not router.use_primary(2)
+    now[0] += 4.9
+    router.mark_write(2)
+    assert router.use_primary(1) and router.use_primary(2)
+    now[0] += 0.2
+    assert not router.use_primary(1) and router.use_primary(2)
+    # 过期的记录在下次写入时清理
+    router.mark_write(3)
+    assert list(router._last_writes) == [2, 3]
+    router.mark_write(None)
+    assert not router.use_primary(None)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+查询计划测试
+
+在内存数据库上执行全部迁移并建立FTS5索引，然后用 EXPLAIN QUERY PLAN 检查热点查询都走了索引。
+可以直接运行，也可以用 pytest 运行:
+    python test_query_plan.py
+    python -m pytest test_query_plan.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine, func, select, text
+from db.migrations import migrate, current_version, MIGRATIONS
+from db.model import USER_SNAPSHOT_COLUMNS, UserModel
+from db.pagination import encode_cursor
+from db.search import UserSearchFilters, build_search_query, ensure_fts_index
+
+# 热点查询：名称 -> (查询, 期望计划中出现的索引)
+HOT_QUERIES = {
+    "登录按规范化邮箱查找": (
+        select(*USER_SNAPSHOT_COLUMNS, UserModel.password_hash)
+        .where(UserModel.email_normalized == "zhangsan@example.com"),
+        "ix_users_email_normalized",
+    ),
+    "按ID加载当前用户": (
+        select(*USER_SNAPSHOT_COLUMNS).where(UserModel.id == 1),
+        "INTEGER PRIMARY KEY",
+    ),
+    "游标分页": (
+        select(UserModel).where(UserModel.id > 100).order_by(UserModel.id).limit(100),
+        "INTEGER PRIMARY KEY",
+    ),
+    "统计激活用户数": (
+        select(func.count()).select_from(UserModel).where(UserModel.is_active == True),
+        "ix_users_is_active_id",
+    ),
+    "按ID列出激活用户": (
+        select(UserModel).where(UserModel.is_active == True, UserModel.id > 100)
+        .order_by(UserModel.id).limit(100),
+        "ix_users_is_active_id",
+    ),
+    "按注册时间筛选": (
+        select(UserModel).where(UserModel.created_at >= datetime(2024, 1, 1)),
+        "ix_users_created_at",
+    ),
+    "按年龄段筛选": (
+        select(UserModel).where(UserModel.age.between(18, 30)),
+        "ix_users_age",
+    ),
+    "搜索：姓名前缀": (
+        build_search_query(UserSearchFilters(name_prefix="张"), sort="name"),
+        "ix_users_name",
+    ),
+    "搜索：邮箱域名": (
+        build_search_query(UserSearchFilters(email_domain="Example.com")),
+        "ix_users_email_domain",
+    ),
+    "搜索：按注册时间倒序": (
+        build_search_query(UserSearchFilters(), sort="created_at", order="desc"),
+        "ix_users_created_at",
+    ),
+    "搜索：注册时间范围": (
+        build_search_query(UserSearchFilters(created_after=datetime(2024, 1, 1), created_before=datetime(2025, 1, 1))),
+        "ix_users_created_at",
+    ),
+    "搜索：关键字（FTS5）": (
+        build_search_query(UserSearchFilters(q="zhang"), use_fts=True),
+        "VIRTUAL TABLE",
+    ),
+}
+
+
+def _engine():
+    engine = create_engine("sqlite://")
+    migrate(engine)
+    with engine.begin() as conn:
+        ensure_fts_index(conn)
+    return engine
+
+
+def _plan(conn, query) -> str:
+    """返回查询计划的文本（多行合并）"""
+    sql = query.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+def test_migrations_reach_latest_version():
+    engine = _engine()
+    with engine.connect() as conn:
+        assert current_version(conn) == MIGRATIONS[-1].version
+    # 再执行一次不会重复迁移
+    assert migrate(engine) == []
+
+
+def test_hot_queries_use_indexes():
+    engine = _engine()
+    with engine.connect() as conn:
+        for name, (query, index) in HOT_QUERIES.items():
+            plan = _plan(conn, query)
+            assert index in plan, f"{name} 没有使用 {index}:\n{plan}"
+            full_scans = [
+                line for line in plan.splitlines()
+                if line.startswith("SCAN users") and "INDEX" not in line
+            ]
+            assert not full_scans, f"{name} 出现全表扫描:\n{plan}"
+
+
+def test_fts_index_follows_writes():
+    engine = _engine()
+    with engine.begin() as conn:
+        conn.execute(UserModel.__table__.insert(), [
+            {"name": "张三丰", "email": "zsf@example.com", "email_normalized": "zsf@example.com",
+             "password_hash": "x", "is_active": True},
+            {"name": "Bob Smith", "email": "bob@test.org", "email_normalized": "bob@test.org",
+             "password_hash": "x", "is_active": True},
+        ])
+
+    def names(q):
+        query = build_search_query(UserSearchFilters(q=q), use_fts=True)
+        with engine.connect() as conn:
+            return [row.name for row in conn.execute(query)]
+
+    assert names("smi") == ["Bob Smith"]
+    assert names("张三丰") == ["张三丰"]
+    assert names("EXAMPLE.COM") == ["张三丰"]
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET name = 'Robert' WHERE name = 'Bob Smith'"))
+        conn.execute(text("DELETE FROM users WHERE name = '张三丰'"))
+    assert names("smi") == []
+    assert names("rob") == ["Robert"]
+    assert names("example") == []
+    # 再次执行不会重建索引
+    with engine.begin() as conn:
+        assert ensure_fts_index(conn) is False
+
+
+def test_created_at_bounds_match_stored_timestamps():
+    engine = _engine()
+    with engine.begin() as conn:
+        # server_default 写入的时间没有微秒部分
+        conn.execute(UserModel.__table__.insert(), [
+            {"name": "边界", "email": "edge@example.com", "email_normalized": "edge@example.com",
+             "password_hash": "x", "is_active": True},
+        ])
+        stored = conn.execute(text("SELECT created_at FROM users")).scalar()
+    bound = datetime.fromisoformat(stored)
+
+    def names(**kwargs):
+        query = build_search_query(UserSearchFilters(**kwargs))
+        with engine.connect() as conn:
+            return [row.name for row in conn.execute(query)]
+
+    # 下限包含、上限不包含恰好等于边界的行
+    assert names(created_after=bound) == ["边界"]
+    assert names(created_before=bound) == []
+    assert names(created_before=bound + timedelta(microseconds=1)) == ["边界"]
+    assert names(created_after=bound + timedelta(microseconds=1)) == []
+    # 带时区的边界按UTC比较
+    shanghai = timezone(timedelta(hours=8))
+    assert names(created_after=bound.replace(tzinfo=timezone.utc).astimezone(shanghai)) == ["边界"]
+    assert names(created_before=bound.replace(tzinfo=timezone.utc).astimezone(shanghai)) == []
+
+
+def test_search_rejects_tampered_cursors():
+    def build(sort, **values):
+        cursor = encode_cursor({"sort": sort, "order": "asc", **values})
+        return build_search_query(UserSearchFilters(), sort=sort, cursor=cursor)
+
+    # 合法的游标（排序键可以为NULL）
+    build("id", key=5, id=5)
+    build("name", key="张三", id=5)
+    build("age", key=None, id=5)
+    build("created_at", key="2024-01-01 00:00:00", id=5)
+    for sort, values in (
+        ("name", {"key": {"a": 1}, "id": 5}),
+        ("name", {"key": 1, "id": 5}),
+        ("age", {"key": "30", "id": 5}),
+        ("age", {"key": True, "id": 5}),
+        ("created_at", {"key": [2024], "id": 5}),
+        ("id", {"key": 4, "id": 5}),
+        ("name", {"key": "张三", "id": "abc"}),
+        ("name", {"key": "张三", "id": 1.5}),
+        ("name", {"key": "张三"}),
+    ):
+        try:
+            build(sort, **values)
+        except ValueError as exc:
+            assert str(exc) == "无效的分页游标", (values, exc)
+        else:
+            raise AssertionError(f"游标没有被拒绝: {values}")
+
+
+if __name__ == "__main__":
+    engine = _engine()
+    print("=" * 60)
+    with engine.connect() as conn:
+        print(f"结构版本: {current_version(conn)}")
+        for name, (query, index) in HOT_QUERIES.items():
+            plan = _plan(conn, query)
+            status = "✅" if index in plan else "❌"
+            print(f"{status} {name}: {plan}")
+    print("=" * 60)
+    test_migrations_reach_latest_version()
+    test_hot_queries_use_indexes()
+    test_fts_index_follows_writes()
+    test_created_at_bounds_match_stored_timestamps()
+    test_search_rejects_tampered_cursors()
+    print("测试完成!")